@@ -1,35 +1,113 @@
 # database.py
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
+from app.utils.log import get_logger
+from app.utils.metrics import instrument_engine
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 # Pegar URL do banco
 DATABASE_URL = os.getenv("DATABASE_URL")
-print(f"📌 DATABASE_URL carregada: {DATABASE_URL}")
 
-# Criar conexão com o banco
+logger = get_logger(__name__)
+# Sem a senha: a URL completa não vai para os logs
+logger.debug("DATABASE_URL carregada: %s", make_url(DATABASE_URL).render_as_string(hide_password=True))
+
+# URL assíncrona (asyncpg). Se não for informada, é derivada da DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    make_url(DATABASE_URL).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+)
+
+# Tamanho do pool de conexões assíncronas
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Criar conexão com o banco (síncrona: init_db, testes e scripts)
 engine = create_engine(DATABASE_URL)
 
+# Criar conexão assíncrona com o banco (rotas async)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
+
+# Duração e quantidade de comandos SQL por requisição (métricas em `GET /metrics`)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 # Criar sessão
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Criar sessão assíncrona
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Criar base para os modelos
 Base = declarative_base()
 
+# Alterações idempotentes para bancos criados antes de novas colunas
+SCHEMA_UPGRADES = [
+    "ALTER TABLE servers ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE servers ADD COLUMN IF NOT EXISTS offline_threshold_seconds INTEGER",
+    # Uma leitura por (server_ulid, timestamp): remove duplicatas antigas antes de criar a restrição
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_sensor_data_server_ulid_timestamp') THEN
+            DELETE FROM sensor_data a USING sensor_data b
+            WHERE a.server_ulid = b.server_ulid AND a.timestamp = b.timestamp AND a.id > b.id;
+            ALTER TABLE sensor_data
+                ADD CONSTRAINT uq_sensor_data_server_ulid_timestamp UNIQUE (server_ulid, timestamp);
+        END IF;
+    END $$
+    """,
+    # Substituído pelo índice da restrição única acima
+    "DROP INDEX IF EXISTS ix_sensor_data_server_ulid_timestamp",
+    # Keyset de `GET /data` (ORDER BY timestamp, id); criado em cada partição pelo PostgreSQL
+    "CREATE INDEX IF NOT EXISTS ix_sensor_data_timestamp_id ON sensor_data (timestamp, id)",
+]
+
 # 🚀 Adicione essa linha para criar tabelas automaticamente
 def init_db():
     Base.metadata.create_all(bind=engine)
 
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+
+    # Partições de `sensor_data`: atual, futuras e retenção
+    from app.utils.partitions import maintain_partitions
+    with engine.begin() as connection:
+        maintain_partitions(connection)
+
+    # create_all não altera tabelas existentes: cria os índices novos que ainda faltarem
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 # 🚀 Função para obter conexão com o banco
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 🚀 Função para obter conexão assíncrona com o banco (rotas `async def`)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# 🚀 Libera as conexões do pool assíncrono (shutdown da aplicação)
+async def close_async_db():
+    await async_engine.dispose()
@@ -0,0 +1,39 @@
+"""
+Consumidor do buffer de ingestão (INGEST_MODE=buffered): lê as leituras do
+Redis Stream e as grava em `sensor_data` em lotes.
+
+Também roda dentro da aplicação (ver app/main.py), a menos que
+INGEST_CONSUMER_ENABLED=false; nesse caso rode um ou mais consumidores à parte.
+
+Uso:
+    python -m app.jobs.flush_ingest_buffer
+"""
+import asyncio
+
+from app.database import close_async_db
+from app.utils.cache import close_redis, init_redis
+from app.utils.ingest_buffer import CONSUMER_NAME, INGEST_STREAM, consume_forever
+from app.utils.log import get_logger
+
+logger = get_logger("app.jobs.flush_ingest_buffer")
+
+
+async def run():
+    await init_redis()
+    try:
+        await consume_forever()
+    finally:
+        await close_redis()
+        await close_async_db()
+
+
+def main():
+    logger.info("Consumidor '%s' gravando o stream '%s' em sensor_data", CONSUMER_NAME, INGEST_STREAM)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Mantém as partições de `sensor_data`: cria as partições futuras e remove
+as que saíram da janela de retenção (SENSOR_DATA_RETENTION_DAYS).
+
+Também roda periodicamente dentro da aplicação (ver app/main.py).
+
+Uso:
+    python -m app.jobs.maintain_partitions
+"""
+from app.database import engine
+from app.utils.log import get_logger
+from app.utils.partitions import maintain_partitions
+
+logger = get_logger("app.jobs.maintain_partitions")
+
+
+def run():
+    with engine.begin() as connection:
+        return maintain_partitions(connection)
+
+
+def main():
+    created, dropped = run()
+    logger.info("Partições criadas: %s | removidas: %s", created or "nenhuma", dropped or "nenhuma")
+
+
+if __name__ == "__main__":
+    main()
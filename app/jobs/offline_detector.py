@@ -0,0 +1,41 @@
+"""
+Detector de servidores offline: consome o stream de atividade da ingestão, mantém
+os prazos numa roda de timers e publica as transições online/offline.
+
+Também roda dentro da aplicação (ver app/main.py), a menos que
+OFFLINE_DETECTOR_ENABLED=false; nesse caso rode-o à parte. Várias instâncias podem
+rodar ao mesmo tempo: só a que detém o lease no Redis processa.
+
+Uso:
+    python -m app.jobs.offline_detector
+"""
+import asyncio
+
+from app.database import close_async_db
+from app.utils.cache import close_redis, init_redis
+from app.utils.health_events import ACTIVITY_STREAM
+from app.utils.log import get_logger
+from app.utils.offline_detector import detect_forever
+
+logger = get_logger("app.jobs.offline_detector")
+
+
+async def run():
+    await init_redis()
+    try:
+        await detect_forever()
+    finally:
+        await close_redis()
+        await close_async_db()
+
+
+def main():
+    logger.info("Detector de offline consumindo o stream '%s'", ACTIVITY_STREAM)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Reconstrói `servers.last_seen_at` a partir da tabela `sensor_data`.
+
+Use após restaurar um backup ou carregar leituras por fora da API.
+
+Uso:
+    python -m app.jobs.reconcile_last_seen
+"""
+from app.database import SessionLocal, init_db
+from app.utils.heartbeat import reconcile_last_seen
+from app.utils.log import get_logger
+
+logger = get_logger("app.jobs.reconcile_last_seen")
+
+
+def main():
+    init_db()
+    db = SessionLocal()
+    try:
+        updated = reconcile_last_seen(db)
+        logger.info("last_seen_at reconstruído para %d servidores", updated)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Atualiza as tabelas de rollup de `sensor_data` (minuto, hora e dia).
+
+Também roda periodicamente dentro da aplicação (ver app/main.py).
+
+Uso:
+    python -m app.jobs.refresh_rollups
+"""
+import asyncio
+
+from app.database import engine
+from app.utils.cache import close_redis, init_redis
+from app.utils.log import get_logger
+from app.utils.rollups import refresh_rollups
+from app.utils.sensor_cache import invalidate_rollup_servers
+
+logger = get_logger("app.jobs.refresh_rollups")
+
+
+def run():
+    with engine.begin() as connection:
+        return refresh_rollups(connection)
+
+
+# Atualiza os rollups (numa thread) e, depois do commit, invalida o cache dos servidores com buckets recalculados
+async def run_async():
+    windows, servers = await asyncio.to_thread(run)
+    await invalidate_rollup_servers(servers)
+    return windows
+
+
+async def _run_once():
+    await init_redis()
+    try:
+        return await run_async()
+    finally:
+        await close_redis()
+
+
+def main():
+    for granularity, window in asyncio.run(_run_once()).items():
+        if window:
+            logger.info("Rollup '%s' recalculado de %s até %s", granularity, window[0], window[1])
+        else:
+            logger.info("Rollup '%s' já está atualizado", granularity)
+
+
+if __name__ == "__main__":
+    main()
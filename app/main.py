@@ -1,10 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routes import auth, servers ,sensor_data, health
-from app.database import engine, Base, init_db
-from app.routes import cache
+from app.database import engine, Base, init_db, close_async_db
+from app.routes import admin, cache, metrics
+from app.utils.cache import init_redis, close_redis, listen_for_invalidations
+from app.utils.background import start_background_task, start_periodic_task, stop_background_tasks
+from app.utils.partitions import MAINTENANCE_INTERVAL
+from app.utils.rollups import REFRESH_INTERVAL
+from app.utils.ingest_buffer import INGEST_CONSUMER_ENABLED, consume_forever, is_buffered
+from app.utils.server_registry import warm_registry
+from app.utils.health_events import listen_for_health_events
+from app.utils.offline_detector import OFFLINE_DETECTOR_ENABLED, detect_forever
+from app.utils.metrics import METRICS_ENABLED, MetricsMiddleware
+from app.utils.profiling import PROFILING_ENABLED, ProfilingMiddleware, instrument_response_serialization
+from app.jobs import maintain_partitions, refresh_rollups
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cria o pool de conexões Redis compartilhado pela aplicação
+    await init_redis()
+    # Invalidação do cache L1 (em memória) disparada por outros workers
+    start_background_task(listen_for_invalidations, "cache_invalidation_listener")
+    # Carrega o registro de servidores (ULID -> nome, dono) em memória e no Redis
+    await warm_registry()
+    # Transições online/offline: repassa os eventos às conexões de `/health/stream` deste worker
+    start_background_task(listen_for_health_events, "health_events_listener")
+    # Detector de offline (roda de timers); um único worker ativo por vez, os demais de reserva
+    if OFFLINE_DETECTOR_ENABLED:
+        start_background_task(detect_forever, "offline_detector")
+    # Cria partições futuras de `sensor_data` e aplica a retenção periodicamente
+    start_periodic_task(lambda: asyncio.to_thread(maintain_partitions.run), MAINTENANCE_INTERVAL, "maintain_partitions")
+    # Consolida os rollups de minuto/hora/dia usados nas consultas agregadas
+    start_periodic_task(refresh_rollups.run_async, REFRESH_INTERVAL, "refresh_rollups")
+    # Grava em lotes as leituras aceitas no buffer de ingestão (INGEST_MODE=buffered)
+    if is_buffered() and INGEST_CONSUMER_ENABLED:
+        start_background_task(consume_forever, "ingest_consumer")
+    yield
+    await stop_background_tasks()
+    # Fecha as conexões dos pools (Redis e banco assíncrono) ao encerrar a aplicação
+    await close_redis()
+    await close_async_db()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Profiling opt-in por requisição (`X-Profile: 1` ou amostragem), consultado em `/admin/profiles`
+if PROFILING_ENABLED:
+    instrument_response_serialization()
+    app.add_middleware(ProfilingMiddleware)
+
+# Latência por rota e uso de banco/Redis por requisição, expostos em `GET /metrics`
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 init_db()
 
@@ -14,6 +63,9 @@ app.include_router(sensor_data.router)
 app.include_router(servers.router)
 app.include_router(health.router)
 app.include_router(cache.router)
+if METRICS_ENABLED:
+    app.include_router(metrics.router)
+app.include_router(admin.router)
 
 
 
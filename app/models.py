@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Enum, UniqueConstraint, func
+from sqlalchemy import Column, String, Float, DateTime, BigInteger, Integer, ForeignKey, Enum, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 import datetime
@@ -17,6 +17,12 @@ class Server(Base):
     ulid = Column(String, primary_key=True, nullable=False, unique=True, index=True)
     name = Column(String, unique=True, nullable=False)
 
+    # Timestamp da leitura mais recente, atualizado a cada ingestão (evita varrer sensor_data)
+    last_seen_at = Column(DateTime, nullable=True)
+
+    # Segundos sem leituras para o servidor ser considerado offline (NULL: HEALTH_OFFLINE_THRESHOLD)
+    offline_threshold_seconds = Column(Integer, nullable=True)
+
     user_id = Column(String, ForeignKey("users.id"), nullable=False)  # Relacionamento com usuário
     user = relationship("User", back_populates="servers")  # Relacionamento ORM
 
@@ -30,7 +36,7 @@ class SensorData(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(ulid.new()), index=True)  
     server_ulid = Column(String, ForeignKey("servers.ulid"), nullable=False)
-    timestamp = Column(DateTime, nullable=False) 
+    timestamp = Column(DateTime, primary_key=True, nullable=False)  # Chave de partição: precisa fazer parte da PK
     temperature = Column(Float, nullable=True)
     humidity = Column(Float, nullable=True)
     voltage = Column(Float, nullable=True)
@@ -38,6 +44,88 @@ class SensorData(Base):
 
     server = relationship("Server", back_populates="sensor_data")
 
+    __table_args__ = (
+        # Uma leitura por servidor e instante: reenvios do coletor caem no ON CONFLICT da ingestão.
+        # O índice único também atende a busca da última leitura de cada servidor (varredura reversa).
+        UniqueConstraint(server_ulid, timestamp, name="uq_sensor_data_server_ulid_timestamp"),
+        # Paginação por keyset sem filtro de servidor: `(timestamp, id) > cursor ORDER BY timestamp, id`
+        Index("ix_sensor_data_timestamp_id", timestamp, id),
+        # Particionamento nativo por intervalo de tempo (ver app/utils/partitions.py)
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+# -------------------------------
+# Rollups de sensor_data (minuto, hora e dia)
+# -------------------------------
+
+# Métricas numéricas lidas pelos sensores
+METRICS = ("temperature", "humidity", "voltage", "current")
+
+
+class SensorDataRollup:
+    """
+    Colunas comuns das tabelas de rollup.
+    Cada bucket guarda count, sum, min e max por métrica (e não a média), para que
+    buckets possam ser combinados corretamente (minuto -> hora -> dia, rollup + dados brutos).
+    """
+    server_ulid = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Início do bucket (date_trunc)
+    count = Column(BigInteger, nullable=False)  # Número de leituras no bucket
+
+    temperature_count = Column(BigInteger, nullable=False)  # Leituras com a métrica preenchida
+    temperature_sum = Column(Float, nullable=True)
+    temperature_min = Column(Float, nullable=True)
+    temperature_max = Column(Float, nullable=True)
+
+    humidity_count = Column(BigInteger, nullable=False)
+    humidity_sum = Column(Float, nullable=True)
+    humidity_min = Column(Float, nullable=True)
+    humidity_max = Column(Float, nullable=True)
+
+    voltage_count = Column(BigInteger, nullable=False)
+    voltage_sum = Column(Float, nullable=True)
+    voltage_min = Column(Float, nullable=True)
+    voltage_max = Column(Float, nullable=True)
+
+    current_count = Column(BigInteger, nullable=False)
+    current_sum = Column(Float, nullable=True)
+    current_min = Column(Float, nullable=True)
+    current_max = Column(Float, nullable=True)
+
+
+class SensorDataRollupMinute(SensorDataRollup, Base):
+    __tablename__ = "sensor_data_rollup_minute"
+
+
+class SensorDataRollupHour(SensorDataRollup, Base):
+    __tablename__ = "sensor_data_rollup_hour"
+
+
+class SensorDataRollupDay(SensorDataRollup, Base):
+    __tablename__ = "sensor_data_rollup_day"
+
+
+class RollupWatermark(Base):
+    """
+    Até onde cada rollup está consolidado: buckets anteriores a `refreshed_until`
+    estão completos; dados a partir dele são lidos da tabela bruta.
+    """
+    __tablename__ = "rollup_watermarks"
+
+    granularity = Column(String, primary_key=True)  # minute, hour ou day
+    refreshed_until = Column(DateTime, nullable=False)
+
+
+class RollupDirtyBucket(Base):
+    """
+    Minutos com leituras gravadas (ou atualizadas) depois que a janela de atraso dos rollups já os
+    tinha deixado para trás: a próxima atualização recalcula esses buckets em todos os níveis.
+    """
+    __tablename__ = "rollup_dirty_buckets"
+
+    server_ulid = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Início do minuto (date_trunc)
+
 # -------------------------------
 class User(Base):
     """
@@ -0,0 +1,43 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.utils.profiling import find_profile, recent_profiles
+from app.utils.security import require_admin
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profiles", summary="List recent request profiles",
+            description="Profiles kept by this worker (requests sent with `X-Profile: 1` or sampled by PROFILE_SAMPLE_RATE), "
+                        "newest first. Requires the `X-Admin-Token` header.")
+async def list_profiles(
+    route: Optional[str] = Query(None, description="Route template, e.g. /health/all"),
+    min_duration_ms: float = Query(0, ge=0),
+    n_plus_one: bool = Query(False, description="Only profiles with N+1 query candidates"),
+    limit: int = Query(50, ge=1, le=1000),
+) -> List[dict]:
+    """
+    Lista os perfis recentes deste worker (resumo por requisição).
+    """
+    summaries = []
+    for profile in recent_profiles():
+        if route and profile.route != route:
+            continue
+        summary = profile.summary()
+        if summary["duration_ms"] < min_duration_ms or (n_plus_one and not summary["n_plus_one"]):
+            continue
+        summaries.append(summary)
+        if len(summaries) == limit:
+            break
+    return summaries
+
+
+@router.get("/profiles/{profile_id}", summary="Get a request profile",
+            description="Timing breakdown of one profiled request: SQL statements, slow queries, N+1 candidates, "
+                        "Redis round trips, cache lookups, password hashing and serialization time.")
+async def get_profile(profile_id: str) -> dict:
+    """
+    Relatório completo de uma requisição perfilada (o id vem no header `X-Profile-Id` da resposta).
+    """
+    profile = find_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.report()
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.database import get_db
+from app.database import get_async_db
 from app.models import User
 from app.schemas import UserCreate, UserLogin, UserResponse, TokenResponse
-from app.utils.security import hash_password, verify_password, create_access_token
+from app.utils.security import (
+    hash_password_async, verify_password_async, create_user_access_token, get_current_user, revoke_token, Principal
+)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -14,11 +17,12 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
                             description="Registers a new user in the system. The password must be at least 8 characters long.")
 
 
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     username_normalized = user.username.strip().lower()
 
     # Check if the user already exists
-    existing_user = db.query(User).filter(User.username == username_normalized).first()
+    result = await db.execute(select(User.id).where(User.username == username_normalized))
+    existing_user = result.first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -29,11 +33,11 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     if len(user.password) < 8:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password must be at least 8 characters long")
 
-    #  Create user
-    new_user = User(username=username_normalized, password_hash=hash_password(user.password))
+    #  Create user (bcrypt runs in the dedicated password pool, off the event loop)
+    new_user = User(username=username_normalized, password_hash=await hash_password_async(user.password))
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return UserResponse(id=new_user.id, username=new_user.username)
 
@@ -43,21 +47,40 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
                        description="Authenticates the user and provides a JWT token for further requests.")
 
 
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     username_normalized = user.username.strip().lower()
 
     #  Look for the user in the database
-    db_user = db.query(User).filter(User.username == username_normalized).first()
+    result = await db.execute(select(User).where(User.username == username_normalized))
+    db_user = result.scalar_one_or_none()
 
     #  Check credentials
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+    valid, new_hash = (False, None)
+    if db_user:
+        valid, new_hash = await verify_password_async(user.password, db_user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
 
+    #  Transparently upgrade hashes created with a different bcrypt work factor
+    if new_hash:
+        db_user.password_hash = new_hash
+        await db.commit()
+
     #  Create JWT token
     access_token_expires = timedelta(minutes=30)
-    token = create_access_token({"sub": db_user.username}, expires_delta=access_token_expires)
+    token = create_user_access_token(db_user, expires_delta=access_token_expires)
 
     return {"access_token": token, "token_type": "bearer"}
+
+#  Revoke the current token (logout)
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT,
+                        summary="Logout from the system",
+                        description="Revokes the current JWT token in every worker. Requests using it afterwards get 401.")
+
+
+async def logout(user: Principal = Depends(get_current_user)):
+    await revoke_token(user)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
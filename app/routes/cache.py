@@ -1,12 +1,14 @@
-from fastapi import APIRouter, HTTPException, status
-from app.utils.cache import set_cache_key, get_cache_key
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.utils.cache import set_cache_key, get_cache_key, get_cache_stats
+from app.utils.security import require_admin
 
 router = APIRouter(prefix="/cache", tags=["Cache"])
 
-@router.post("/set", status_code=status.HTTP_200_OK)
+# 🔐 Leitura e escrita de chaves arbitrárias no Redis compartilhado: só com o token de admin
+@router.post("/set", status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
 async def set_cache_data(key: str, value: str):
     """
-    Armazena dados no Redis (cache).
+    Armazena dados no Redis (cache). Exige o header `X-Admin-Token`.
     - key: Chave para armazenar os dados
     - value: Valor a ser armazenado
     """
@@ -16,10 +18,10 @@ async def set_cache_data(key: str, value: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/get/{key}", status_code=status.HTTP_200_OK)
+@router.get("/get/{key}", status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
 async def get_cache_data(key: str):
     """
-    Recupera dados armazenados no Redis (cache).
+    Recupera dados armazenados no Redis (cache). Exige o header `X-Admin-Token`.
     - key: Chave do dado armazenado no Redis
     """
     cached_value = await get_cache_key(key)
@@ -27,3 +29,9 @@ async def get_cache_data(key: str):
         return {"key": key, "value": cached_value}
     else:
         raise HTTPException(status_code=404, detail="Cache not found")
+
+@router.get("/stats", status_code=status.HTTP_200_OK,
+            summary="Cache statistics",
+            description="Returns hit/miss counters per cache tier (in-process L1 and Redis L2) for this worker.")
+async def get_cache_statistics():
+    return get_cache_stats()
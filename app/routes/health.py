@@ -1,21 +1,64 @@
+import asyncio
+import json
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
 from typing import List
-from app.database import get_db
-from app.models import Server, SensorData
+from app.database import AsyncSessionLocal
+from app.models import Server
 from app.schemas import ServerHealthResponse
 from app.utils.security import get_current_user
-from app.utils.cache import get_cache_key, set_cache_key
-import json  # Import necessário para manipulação do cache
+from app.utils.cache import get_or_compute
+from app.utils.server_registry import get_server
+from app.utils.health_events import OVERFLOW, get_statuses, subscribe, unsubscribe
+from app.utils.log import get_logger
+from app.utils.profiling import profile_span
 
-OFFLINE_THRESHOLD = timedelta(seconds=10)
 CACHE_EXPIRATION = timedelta(minutes=5)
+# Comentário SSE enviado em conexões ociosas (mantém proxies e balanceadores sem encerrar a conexão)
+STREAM_KEEPALIVE_INTERVAL = 15
+
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/health", tags=["Server Health"])
 
+def user_servers_cache_key(user_id: str) -> str:
+    return f"user_servers:{user_id}"
+
+async def load_user_servers(db: AsyncSession, user_id: str) -> List[dict]:
+    # 🔹 Obtém apenas os servidores do usuário autenticado
+    result = await db.execute(
+        select(Server.ulid, Server.name)
+        .where(Server.user_id == user_id)
+    )
+    servers = result.all()
+
+    logger.debug("Servidores encontrados para o usuário %s: %d", user_id, len(servers))
+    return [{"server_ulid": server.ulid, "server_name": server.name} for server in servers]
+
+# O status vem do detector de offline (hash no Redis); servidores que ele ainda não viu são considerados online
+async def with_statuses(servers: List[dict]) -> List[dict]:
+    statuses = await get_statuses([server["server_ulid"] for server in servers])
+    with profile_span("serialization"):
+        return [
+            ServerHealthResponse(
+                server_ulid=server["server_ulid"],
+                status=statuses.get(server["server_ulid"]) or "online",
+                server_name=server["server_name"]
+            ).dict()
+            for server in servers
+        ]
+
+async def load_user_health_statuses(db: AsyncSession, user_id: str) -> List[dict]:
+    return await with_statuses(await load_user_servers(db, user_id))
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @router.get("/all", response_model=List[ServerHealthResponse])
-async def get_all_servers_health(db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def get_all_servers_health(user=Depends(get_current_user)):
     """
     Retorna o status de todos os servidores pertencentes ao usuário autenticado.
     - Requer autenticação JWT.
@@ -24,104 +67,77 @@ async def get_all_servers_health(db: Session = Depends(get_db), user=Depends(get
     if not user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    print(f"🔍 DEBUG - Buscando servidores do usuário {user.id}")
-
-    # Tenta obter os dados do cache primeiro
-    cache_key = f"user_servers_health_status:{user.id}"
-    cached_data = await get_cache_key(cache_key)
-
-    if cached_data:
-        try:
-            cached_list = json.loads(cached_data)  # Convertendo JSON para lista de dicionários
-            print(f"✅ DEBUG - Dados do cache recuperados para {user.id}: {cached_list}")
-            return [ServerHealthResponse.parse_obj(item) for item in cached_list]
-        except Exception:
-            print(f"⚠️ WARNING - Cache inválido: {cached_data}")
-
-    # 🔹 Obtém apenas os servidores do usuário autenticado
-    servers = db.query(Server).filter(Server.user_id == user.id).all()
-
-    print(f"🔍 DEBUG - Servidores encontrados: {len(servers)}")
-
-    if not servers:
-        print("⚠️ WARNING - Usuário não possui servidores cadastrados.")
-        return []  # Retorna lista vazia ao invés de erro 404
-
-    now = datetime.utcnow()
-    health_statuses = []
-
-    for server in servers:
-        print(f"🖥️ Servidor encontrado -> ULID: {server.ulid}, Nome: {server.name}")
-
-        last_data = (
-            db.query(SensorData)
-            .filter(SensorData.server_ulid == server.ulid)
-            .order_by(SensorData.timestamp.desc())
-            .first()
-        )
-
-        status = "online" if not last_data or now - last_data.timestamp <= OFFLINE_THRESHOLD else "offline"
+    # Sessão própria: o cálculo roda numa task compartilhada (single flight) que pode sobreviver a esta requisição
+    async def load_servers() -> List[dict]:
+        async with AsyncSessionLocal() as db:
+            return await load_user_servers(db, user.id)
 
-        health_statuses.append(ServerHealthResponse(
-            server_ulid=server.ulid,
-            status=status,
-            server_name=server.name
-        ))
-
-    print("✅ DEBUG - Todos os servidores processados com sucesso!")
-
-    # 🔹 Salvando no cache corretamente como JSON
-    health_statuses_dict = [item.dict() for item in health_statuses]
-    await set_cache_key(cache_key, json.dumps(health_statuses_dict), expire=int(CACHE_EXPIRATION.total_seconds()))
+    # 🔹 Só a lista de servidores do usuário vai para o cache em dois níveis (L1 em memória, depois Redis);
+    # o status é lido a cada requisição do hash mantido pelo detector, sempre atual.
+    servers = await get_or_compute(
+        user_servers_cache_key(user.id), load_servers, expire=int(CACHE_EXPIRATION.total_seconds())
+    )
+    return await with_statuses(servers)
 
-    return health_statuses
 
+@router.get("/stream", summary="Stream server status changes (Server-Sent Events)",
+            description="Sends a `snapshot` event with the status of all of the user's servers, then a `status` event "
+                        "for each online/offline transition. Replaces polling `/health/all`.")
+async def stream_servers_health(user=Depends(get_current_user)):
+    """
+    Envia o status atual dos servidores do usuário e, depois, apenas as transições online/offline.
+    - Requer autenticação JWT.
+    - As transições chegam por pub/sub no Redis, então qualquer worker atende qualquer conexão.
+    - Conexões ociosas custam uma fila em memória: nenhuma consulta ao banco ou ao Redis por conexão.
+    """
+    # Assina antes do snapshot: uma transição que ocorra entre os dois não se perde
+    queue = subscribe(user.id)
+    try:
+        # Sessão própria e curta: a conexão com o banco não fica presa durante o stream
+        async with AsyncSessionLocal() as db:
+            snapshot = await load_user_health_statuses(db, user.id)
+    except BaseException:
+        unsubscribe(user.id, queue)
+        raise
+
+    async def events():
+        try:
+            yield sse_event("snapshot", snapshot)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is OVERFLOW:
+                    return  # Cliente lento: ao reconectar, recebe um novo snapshot
+                yield sse_event("status", event)
+        finally:
+            unsubscribe(user.id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{server_ulid}", response_model=ServerHealthResponse)
-async def get_server_health_by_id(server_ulid: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def get_server_health_by_id(server_ulid: str, user=Depends(get_current_user)):
     """
     Retorna o status de um servidor específico pelo ULID.
     - Requer autenticação JWT.
+    - Apenas o dono do servidor tem acesso (404 para os demais).
     """
     if not user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    cache_key = f"server_health_status:{server_ulid}"
-    cached_data = await get_cache_key(cache_key)
-
-    if cached_data:
-        try:
-            cached_obj = ServerHealthResponse(**json.loads(cached_data))  # Convertendo JSON -> Pydantic
-            return cached_obj
-        except Exception:
-            print(f"WARNING - Cache inválido: {cached_data}")  # Log apenas se der erro
-
-    server = db.query(Server).filter(Server.ulid == server_ulid).first()
-    if not server:
+    # Existência e dono vêm do registro de servidores e o status, do detector (sem consulta ao banco).
+    # Servidores de outros usuários respondem 404, sem revelar que existem.
+    server = await get_server(server_ulid)
+    if server is None or server.user_id != user.id:
         raise HTTPException(status_code=404, detail="Server not found")
 
-    last_data = (
-        db.query(SensorData)
-        .filter(SensorData.server_ulid == server.ulid)
-        .order_by(SensorData.timestamp.desc())
-        .first()
-    )
-
-    now = datetime.utcnow()
-    status = "online" if not last_data or now - last_data.timestamp <= OFFLINE_THRESHOLD else "offline"
-
-    try:
-        server_health = ServerHealthResponse(
-            server_ulid=server.ulid,
-            status=status,
-            server_name=server.name
-        )
-        print(f"DEBUG - Server Health Response: {server_health.dict()}")
-
-        # Salvando no cache como JSON
-        await set_cache_key(cache_key, json.dumps(server_health.dict()), expire=int(CACHE_EXPIRATION.total_seconds()))
-        return server_health
-    except Exception as e:
-        print(f"ERROR - Failed to serialize response: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+    server_health = (await with_statuses([{"server_ulid": server.ulid, "server_name": server.name}]))[0]
+    logger.debug("Status do servidor %s: %s", server_ulid, server_health["status"])
+    return server_health
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter(tags=["Monitoring"])
+
+@router.get("/metrics", summary="Prometheus metrics",
+            description="Request latency per route template, in-flight requests, SQL and Redis usage per request, "
+                        "cache hit/miss counters and ingested rows, in the Prometheus text format.")
+def get_metrics():
+    """
+    Métricas do worker que atende a requisição, no formato de exposição do Prometheus.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,161 +1,547 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime
-from app.database import get_db
-from app.models import SensorData, Server
-from app.schemas import SensorDataResponse, SensorDataCreate
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from app.database import AsyncSessionLocal, get_async_db
+from app.models import METRICS, SensorData
+from app.schemas import SensorDataResponse, SensorDataCreate, SensorDataBatchCreate, SensorDataBatchResponse, SensorDataBatchItemResult, SensorSeriesResponse, SensorAggregateResponse, MetricAggregate, to_naive_utc
+import asyncio
+import csv
+import io
+import json
+import numpy as np
 import ulid
-from typing import List, Optional, Union
-from app.utils.cache import set_cache_key, get_cache_key
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple, Union
+from app.utils.cache import get_or_compute
+from app.utils.sensor_cache import query_cache_key, invalidate_servers, serialize_page, cached_json_response
+from app.utils.heartbeat import touch_last_seen
+from app.utils.health_events import report_activity
+from app.utils.metrics import INGEST_ROWS_WRITTEN
+from app.utils.ingest_buffer import is_buffered, enqueue_readings, buffer_stats, upsert_readings, INGEST_MAX_CLOCK_SKEW
+from app.utils.rollups import mark_late_readings
+from app.utils.server_registry import get_server, get_servers, forget_servers
+from app.utils.aggregation import fetch_statistics, parse_bucket_width, parse_statistics, GRANULARITY_WIDTHS
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.columnar import negotiate_format, rows_to_table, columns_to_table, columnar_response, READING_SCHEMA, SERIES_SCHEMA, aggregate_schema
+from app.utils.downsampling import downsample_series
 
 router = APIRouter(prefix="/data", tags=["Sensor Data"])
 
-# Função para criar o timestamp no formato ISO 8601
-def generate_iso_timestamp():
-    return datetime.utcnow().isoformat()
+# Limite de leituras aceitas em um único `POST /data/batch`
+MAX_BATCH_SIZE = 5000
 
-@router.post("/", response_model=SensorDataResponse, status_code=status.HTTP_201_CREATED)
-async def register_sensor_data(data: SensorDataCreate, db: Session = Depends(get_db)):
+# Leituras com timestamp além de INGEST_MAX_CLOCK_SKEW no futuro: 422 em `POST /data`, "rejected" no lote
+FUTURE_TIMESTAMP_DETAIL = "timestamp is in the future (check the collector clock)"
+
+# Paginação de `GET /data`: tamanho padrão e máximo de página
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+MAX_COLUMNAR_PAGE_SIZE = 500000  # Respostas Arrow/Parquet não passam pelo Pydantic e aceitam páginas maiores
+
+# Linhas lidas por vez do cursor do servidor em `GET /data/export`
+EXPORT_CHUNK_SIZE = 5000
+
+# Buckets por servidor aceitos em uma agregação (ex.: 5s em um ano seriam 6 milhões). Sem intervalo de
+# tempo, o limite vale para o período ocupado pelas leituras filtradas.
+MAX_AGGREGATE_BUCKETS = 100000
+TOO_MANY_BUCKETS_DETAIL = f"Too many buckets. Use a wider bucket or a shorter range (max {MAX_AGGREGATE_BUCKETS})."
+
+# Séries reduzidas (`GET /data?points=N`): máximo de pontos por série e linhas lidas por vez do cursor
+MAX_DOWNSAMPLE_POINTS = 10000
+DOWNSAMPLE_CHUNK_SIZE = 50000
+# Leituras de origem aceitas em uma redução (~40 bytes por leitura em memória; 10 milhões ~ 116 dias a 1 Hz)
+MAX_DOWNSAMPLE_ROWS = 10000000
+
+# Colunas das leituras brutas, na ordem usada por `GET /data`, pela exportação e pelo esquema Arrow
+READING_COLUMNS = ("id", "server_ulid", "timestamp", "temperature", "humidity", "voltage", "current")
+
+# Aplica os filtros comuns às consultas de leituras (servidor e intervalo de tempo)
+def apply_filters(query, server_ulid: Optional[str], start_time: Optional[datetime], end_time: Optional[datetime]):
+    # Filtra por servidor, se informado
+    if server_ulid:
+        query = query.where(SensorData.server_ulid == server_ulid)
+
+    # Filtra por intervalo de tempo, se informado
+    if start_time and end_time:
+        query = query.where(SensorData.timestamp.between(start_time, end_time))
+
+    return query
+
+@router.post("/", response_model=SensorDataResponse, status_code=status.HTTP_201_CREATED,
+                  responses={202: {"description": "Reading accepted into the write-behind buffer (INGEST_MODE=buffered)"},
+                             503: {"description": "Write-behind buffer is full"}})
+async def register_sensor_data(data: SensorDataCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
     """
     Registra uma nova leitura de sensores de um servidor no banco de dados.
-        E, automaticamente, armazena os dados no cache Redis.
-
+    - INGEST_MODE=buffered: a leitura vai para o buffer no Redis e a rota responde 202;
+      o consumidor grava no banco em lotes.
     """
 
-    # Verifica se o servidor existe
-    server = db.query(Server).filter(Server.ulid == data.server_ulid).first()
-    if not server:
+    # Verifica se o servidor existe (registro em memória; sem consulta ao banco)
+    if await get_server(data.server_ulid) is None:
         raise HTTPException(status_code=404, detail="Server not found")
 
-    # Verifica se já existe um registro com o mesmo servidor e timestamp
-    existing_data = db.query(SensorData).filter(
-        SensorData.server_ulid == data.server_ulid,
-        SensorData.timestamp == generate_iso_timestamp()
-    ).first()
-
-    if existing_data:
-        raise HTTPException(status_code=400, detail="Duplicate data entry for the same timestamp.")
-
-    # Cria um novo registro de leitura dos sensores
-    sensor_data = SensorData(
-        id=str(ulid.new()),
-        server_ulid=data.server_ulid,
-        timestamp=datetime.utcnow(),  # Passa o timestamp atual para o banco de dados
-        temperature=data.temperature,
-        humidity=data.humidity,
-        voltage=data.voltage,
-        current=data.current
-    )
+    now = datetime.utcnow()
+    if data.timestamp and data.timestamp > now + INGEST_MAX_CLOCK_SKEW:
+        raise HTTPException(status_code=422, detail=FUTURE_TIMESTAMP_DETAIL)
+
+    # Timestamp informado pelo coletor ou, na falta dele, o instante do recebimento
+    reading = dict(data.dict(), id=str(ulid.new()), timestamp=data.timestamp or now)
+
+    if is_buffered():
+        await enqueue_readings([reading])
+        response.status_code = status.HTTP_202_ACCEPTED
+        return SensorDataResponse(**reading)
+
+    # Grava a leitura; um reenvio do mesmo (server_ulid, timestamp) atualiza a existente no mesmo comando
+    try:
+        result = await db.execute(upsert_readings(READING_COLUMNS).values(reading))
+    except IntegrityError:
+        # Servidor removido e ainda presente no registro: descarta a entrada desatualizada
+        await db.rollback()
+        await forget_servers(data.server_ulid)
+        raise HTTPException(status_code=404, detail="Server not found")
+    stored = result.one()
+    await mark_late_readings(db, [reading])
+    await touch_last_seen(db, {stored.server_ulid: stored.timestamp})
+    await db.commit()
+    INGEST_ROWS_WRITTEN.inc()
+
+    # Invalida as consultas em cache de `GET /data` para este servidor
+    await invalidate_servers({stored.server_ulid: stored.timestamp})
+    # Renova o prazo de offline do servidor (e publica a transição se ele estava offline)
+    await report_activity({stored.server_ulid: stored.timestamp})
+
+    # 201 para uma leitura nova; 200 com o id original para um reenvio (retry idempotente do coletor)
+    if stored.id != reading["id"]:
+        response.status_code = status.HTTP_200_OK
+    return SensorDataResponse(**stored._mapping)
 
-    db.add(sensor_data)
-    db.commit()
-    db.refresh(sensor_data)
+@router.post("/batch", response_model=SensorDataBatchResponse, status_code=status.HTTP_200_OK,
+                       summary="Register sensor readings in batch",
+                       description="Registers many sensor readings, possibly from many servers, in a single transaction and returns one result per item.",
+                       responses={202: {"description": "Readings accepted into the write-behind buffer (INGEST_MODE=buffered)"},
+                                  503: {"description": "Write-behind buffer is full"}})
+async def register_sensor_data_batch(batch: SensorDataBatchCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """
+    Registra um lote de leituras de sensores.
+    - Valida todos os ULIDs de servidor em uma única consulta.
+    - Grava todas as leituras válidas com um único INSERT ... ON CONFLICT e um único commit:
+      leituras já existentes para o mesmo (server_ulid, timestamp) são atualizadas ("updated").
+    - Leituras repetidas dentro do lote: vale a última; as anteriores ficam como "duplicate".
+    - Leituras de servidores inexistentes ou com timestamp no futuro (além de INGEST_MAX_CLOCK_SKEW)
+      são rejeitadas individualmente, sem abortar o lote.
+    - INGEST_MODE=buffered: as leituras válidas vão para o buffer no Redis (status "accepted") e a rota responde 202.
+    """
+    if len(batch.items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Maximum is {MAX_BATCH_SIZE} items.")
+
+    # Todos os servidores do lote validados no registro (memória, Redis e, só para o que faltar, o banco)
+    known_ulids = await get_servers(item.server_ulid for item in batch.items)
+
+    now = datetime.utcnow()
+    rows = {}  # (server_ulid, timestamp) -> leitura
+    item_results = {}  # (server_ulid, timestamp) -> resultado do item que prevaleceu
+    untimed = {}  # leituras sem timestamp por servidor
+    results = []
+
+    for index, item in enumerate(batch.items):
+        if item.server_ulid not in known_ulids:
+            results.append(SensorDataBatchItemResult(index=index, status="rejected", detail="Server not found"))
+            continue
+
+        if item.timestamp and item.timestamp > now + INGEST_MAX_CLOCK_SKEW:
+            results.append(SensorDataBatchItemResult(index=index, status="rejected", detail=FUTURE_TIMESTAMP_DETAIL))
+            continue
 
-    # Armazena os dados no cache Redis após a inserção no banco de dados
-    await set_cache_key(sensor_data.id, str(sensor_data.__dict__))  
+        timestamp = item.timestamp
+        if timestamp is None:
+            # Leituras sem timestamp do mesmo servidor recebem instantes distintos, na ordem do lote
+            offset = untimed.get(item.server_ulid, 0)
+            untimed[item.server_ulid] = offset + 1
+            timestamp = now + timedelta(microseconds=offset)
+
+        key = (item.server_ulid, timestamp)
+        if key in item_results:
+            superseded = item_results[key]
+            superseded.status, superseded.id, superseded.detail = "duplicate", None, f"Superseded by item {index}"
+
+        rows[key] = dict(item.dict(), id=str(ulid.new()), timestamp=timestamp)
+        item_results[key] = SensorDataBatchItemResult(index=index, status="accepted" if is_buffered() else "created", id=rows[key]["id"])
+        results.append(item_results[key])
+
+    rejected = sum(1 for item_result in results if item_result.status == "rejected")
+
+    if is_buffered():
+        if rows:
+            await enqueue_readings(list(rows.values()))
+        response.status_code = status.HTTP_202_ACCEPTED
+        return SensorDataBatchResponse(
+            created=0,
+            accepted=len(rows),
+            rejected=rejected,
+            results=results
+        )
 
+    if rows:
+        # INSERT ... ON CONFLICT em uma única transação; o RETURNING traz o id gravado de cada leitura
+        try:
+            result = await db.execute(upsert_readings(READING_COLUMNS), list(rows.values()))
+        except IntegrityError:
+            # Algum servidor foi removido e ainda estava no registro: o reenvio do lote revalida no banco
+            await db.rollback()
+            await forget_servers(*known_ulids)
+            raise HTTPException(status_code=409, detail="One or more servers no longer exist. Retry the batch.")
+        stored_ids = {(row.server_ulid, row.timestamp): row.id for row in result}
+        await mark_late_readings(db, rows.values())
 
-    return SensorDataResponse.from_orm(sensor_data)
+        last_seen, oldest = {}, {}
+        for server_ulid, timestamp in rows:
+            last_seen[server_ulid] = max(timestamp, last_seen.get(server_ulid, timestamp))
+            oldest[server_ulid] = min(timestamp, oldest.get(server_ulid, timestamp))
 
-@router.get("/", response_model=Union[List[SensorDataResponse], List[SensorDataResponse]])
+        await touch_last_seen(db, last_seen)
+        await db.commit()
+        INGEST_ROWS_WRITTEN.inc(len(rows))
+
+        # Invalida as consultas em cache de `GET /data` dos servidores do lote
+        await invalidate_servers(oldest)
+        await report_activity(last_seen)
+
+        # Um id diferente do gerado indica que a leitura já existia e foi atualizada
+        for key, item_result in item_results.items():
+            stored_id = stored_ids[key]
+            if stored_id != item_result.id:
+                item_result.status, item_result.id = "updated", stored_id
+
+    return SensorDataBatchResponse(
+        created=sum(1 for item_result in results if item_result.status == "created"),
+        updated=sum(1 for item_result in results if item_result.status == "updated"),
+        rejected=rejected,
+        results=results
+    )
+
+@router.get("/ingest/stats", summary="Write-behind ingest buffer statistics",
+            description="Returns the buffer length, pending readings, lag of the oldest unflushed reading and this worker's consumer counters.")
+async def get_ingest_stats():
+    return await buffer_stats()
+
+@router.get("/", response_model=Union[List[SensorDataResponse], List[SensorAggregateResponse], List[SensorSeriesResponse]])
 async def get_sensor_data(
     server_ulid: Optional[str] = Query(None, description="Filter by server ULID"),
     start_time: Optional[datetime] = Query(None, description="Start time for filtering"),
     end_time: Optional[datetime] = Query(None, description="End time for filtering"),
     aggregation: Optional[str] = Query(None, description="Aggregation level: minute, hour, day. Default is no aggregation."),
-    db: Session = Depends(get_db)
+    bucket: Optional[str] = Query(None, description="Arbitrary aggregation bucket width, e.g. 5s, 15m, 2h, 1d. Alternative to aggregation."),
+    stats: Optional[str] = Query(None, description="Comma-separated statistics per metric: avg, min, max, count, stddev, p50, p95, p99. Default: avg,min,max,count."),
+    group_by: str = Query("server", regex="^(server|none)$", description="Aggregate per server (default) or across all matching servers"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_COLUMNAR_PAGE_SIZE, description="Maximum number of readings per page (10000 for JSON, 500000 for Arrow/Parquet)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned in the X-Next-Cursor header of the previous page"),
+    points: Optional[int] = Query(None, ge=3, le=MAX_DOWNSAMPLE_POINTS, description="Downsample to at most this many points per server and metric (for charts)"),
+    downsample: str = Query("lttb", regex="^(lttb|minmax)$", description="Downsampling method used with points: lttb or minmax"),
+    format: Optional[str] = Query(None, regex="^(json|arrow|parquet)$", description="Response format. Defaults to content negotiation on the Accept header."),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtém os dados dos sensores, podendo ser filtrado por servidor e intervalo de tempo.
-    Se a agregação for informada, calcula a média dos valores dentro do intervalo especificado.
+    Com `aggregation` ou `bucket`, retorna estatísticas por bucket em vez das leituras.
 
-    Esta rota também verifica o cache Redis para os dados.
+    Respostas JSON são cacheadas no Redis: janelas abertas com TTL curto e janelas históricas
+    fechadas com TTL longo, invalidadas por servidor a cada ingestão.
 
 
     Parâmetros:
     - aggregation: Opcional. Define a granularidade da agregação de dados. Valores possíveis: "minute", "hour", "day".
+    - bucket: Opcional. Largura arbitrária dos buckets ("5s", "15m", "2h", "1d"), alinhados à época Unix.
+    - stats: Opcional. Estatísticas por métrica: avg, min, max, count, stddev, p50, p95, p99 (padrão: avg,min,max,count).
+      Minuto, hora e dia com as estatísticas padrão vêm dos rollups; o restante é calculado em uma passada sobre os dados.
+    - group_by: Opcional. "server" (padrão) agrega por servidor; "none" junta todos os servidores filtrados.
+    - limit: Opcional. Leituras por página (padrão 1000, máximo 10000). Não se aplica à agregação.
+    - cursor: Opcional. Continua a partir da página anterior; o próximo cursor vem no header `X-Next-Cursor`
+      (ausente na última página).
+    - points: Opcional. Reduz cada série (servidor x métrica) a no máximo N pontos, para gráficos.
+      Retorna uma lista de séries em vez de leituras; exige `server_ulid` e não se combina com `aggregation` nem `cursor`.
+    - downsample: Método usado com `points`: "lttb" (forma da série, padrão) ou "minmax" (mínimo e máximo por bucket).
+    - format / Accept: `application/vnd.apache.arrow.stream` (ou `format=arrow`) retorna um stream Arrow IPC;
+      `application/vnd.apache.parquet` (ou `format=parquet`) retorna um arquivo Parquet. Padrão: JSON.
     """
+    # Limites com fuso (ex.: "...Z") viram UTC sem fuso, como os timestamps gravados
+    start_time, end_time = to_naive_utc(start_time), to_naive_utc(end_time)
+    response_format = negotiate_format(accept, format)
 
-     # Verificação de cache
-    cache_key = f"sensor_data:{server_ulid}:{start_time}:{end_time}:{aggregation}"  # Gerar chave para cache
-    cached_data = await get_cache_key(cache_key)
+    if response_format == "json" and limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be at most {MAX_PAGE_SIZE} for JSON responses")
 
-    if cached_data:
-        # Caso os dados estejam no cache, retornamos imediatamente
-        return cached_data
+    if aggregation and aggregation not in ["minute", "hour", "day"]:
+        raise HTTPException(status_code=400, detail="Invalid aggregation type. Use 'minute', 'hour', or 'day'.")
 
-    # Caso os dados não estejam no cache, vamos acessar o banco de dados
-    query = db.query(SensorData)
+    if aggregation and bucket:
+        raise HTTPException(status_code=400, detail="Use either aggregation or bucket, not both")
 
+    try:
+        width = parse_bucket_width(bucket) if bucket else GRANULARITY_WIDTHS.get(aggregation)
+        statistics = parse_statistics(stats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Filtra por servidor, se informado
-    if server_ulid:
-        query = query.filter(SensorData.server_ulid == server_ulid)
+    if width and start_time and end_time and (end_time - start_time) / width > MAX_AGGREGATE_BUCKETS:
+        raise HTTPException(status_code=400, detail=TOO_MANY_BUCKETS_DETAIL)
 
-    # Filtra por intervalo de tempo, se informado
-    if start_time and end_time:
-        query = query.filter(SensorData.timestamp.between(start_time, end_time))
-
-    if aggregation:
-        if aggregation not in ["minute", "hour", "day"]:
-            raise HTTPException(status_code=400, detail="Invalid aggregation type. Use 'minute', 'hour', or 'day'.")
-
-        # Define o agrupamento de acordo com o tipo de agregação
-        time_format = {
-            "minute": func.date_trunc("minute", SensorData.timestamp),
-            "hour": func.date_trunc("hour", SensorData.timestamp),
-            "day": func.date_trunc("day", SensorData.timestamp)
-        }[aggregation]
-
-        # Agrega os dados por timestamp truncado (minute, hour, day) e calcula a média
-        query = (
-            query.with_entities(
-                SensorData.server_ulid,
-                time_format.label("timestamp"),
-                func.avg(SensorData.temperature).label("average_temperature"),
-                func.avg(SensorData.humidity).label("average_humidity"),
-                func.avg(SensorData.voltage).label("average_voltage"),
-                func.avg(SensorData.current).label("average_current"),
-            )
-            .group_by(SensorData.server_ulid, time_format)  # Adiciona server_ulid ao GROUP BY
-            .order_by(time_format)
+    if points and (width or cursor):
+        raise HTTPException(status_code=400, detail="points cannot be combined with aggregation or cursor")
+
+    if points and not server_ulid:
+        raise HTTPException(status_code=400, detail="points requires server_ulid")
+
+    if response_format != "json":
+        if points:
+            columns = {"server_ulid": [], "metric": [], "timestamp": [], "value": []}
+            for server, metric, source_points, timestamps, values in await load_downsampled(
+                db, server_ulid, start_time, end_time, points, downsample
+            ):
+                columns["server_ulid"] += [server] * len(values)
+                columns["metric"] += [metric] * len(values)
+                columns["timestamp"] += timestamps
+                columns["value"] += values
+            return await columnar_response(lambda: columns_to_table(columns, SERIES_SCHEMA), response_format)
+
+        if width:
+            aggregated_data = await load_aggregates(db, width, statistics, group_by, server_ulid, start_time, end_time)
+            columns = {
+                "server_ulid": [data.server_ulid for data in aggregated_data],
+                "bucket": [data.timestamp for data in aggregated_data],
+                "count": [data.count for data in aggregated_data],
+            }
+            for metric in METRICS:
+                for stat in statistics:
+                    columns[f"{metric}_{stat}"] = [data.statistic(metric, stat) for data in aggregated_data]
+            return await columnar_response(lambda: columns_to_table(columns, aggregate_schema(statistics)), response_format)
+
+        # Colunas montadas direto das linhas do cursor, sem um SensorDataResponse por leitura
+        sensor_data, next_cursor = await load_page(db, server_ulid, start_time, end_time, limit, cursor)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return await columnar_response(lambda: rows_to_table(sensor_data, READING_SCHEMA), response_format, headers=headers)
+
+    async def serialize_json_page() -> str:
+        # Sessão própria: o cálculo roda numa task compartilhada (single flight) que pode sobreviver a esta requisição
+        async with AsyncSessionLocal() as db:
+            if points:
+                return serialize_page([
+                    SensorSeriesResponse(
+                        server_ulid=server,
+                        metric=metric,
+                        method=downsample,
+                        source_points=source_points,
+                        timestamps=timestamps,
+                        values=values
+                    )
+                    for server, metric, source_points, timestamps, values in await load_downsampled(
+                        db, server_ulid, start_time, end_time, points, downsample
+                    )
+                ])
+
+            if width:
+                aggregated_data = await load_aggregates(db, width, statistics, group_by, server_ulid, start_time, end_time)
+
+                # Retorna os dados agregados, apenas com as estatísticas pedidas
+                return serialize_page([
+                    SensorAggregateResponse(
+                        server_ulid=data.server_ulid,
+                        bucket=data.timestamp,
+                        count=data.count,
+                        **{
+                            metric: MetricAggregate(**{stat: data.statistic(metric, stat) for stat in statistics})
+                            for metric in METRICS
+                        }
+                    )
+                    for data in aggregated_data
+                ], exclude_unset=True)
+
+            sensor_data, next_cursor = await load_page(db, server_ulid, start_time, end_time, limit, cursor)
+            return serialize_page([
+                SensorDataResponse(
+                    id=str(data.id),
+                    server_ulid=data.server_ulid,
+                    timestamp=data.timestamp.isoformat(),
+                    temperature=data.temperature,
+                    humidity=data.humidity,
+                    voltage=data.voltage,
+                    current=data.current
+                )
+                for data in sensor_data
+            ], next_cursor)
+
+    # Cache no Redis (a chave inclui a geração do servidor, incrementada a cada ingestão).
+    # Em um miss, requisições concorrentes com a mesma chave aguardam uma única consulta ao banco.
+    cache_key, cache_ttl = await query_cache_key(
+        server_ulid, start_time, end_time, width and int(width.total_seconds()), ",".join(statistics), group_by,
+        limit, cursor, points, downsample
+    )
+    cached_data = await get_or_compute(cache_key, serialize_json_page, expire=cache_ttl, loads=str, dumps=str, local=False)
+    return cached_json_response(cached_data)
+
+
+# Minuto, hora e dia com estatísticas simples vêm dos rollups (só a cauda recente sai dos dados brutos);
+# demais larguras e estatísticas são calculadas em uma passada sobre `sensor_data`
+async def load_aggregates(db: AsyncSession, width: timedelta, statistics: Tuple[str, ...], group_by: str,
+                          server_ulid: Optional[str], start_time: Optional[datetime], end_time: Optional[datetime]):
+    # Sem intervalo, o limite de buckets é aplicado ao período entre a primeira e a última leitura filtrada
+    if not (start_time and end_time):
+        result = await db.execute(
+            apply_filters(select(func.min(SensorData.timestamp), func.max(SensorData.timestamp)), server_ulid, None, None)
         )
+        first, last = result.one()
+        if first is not None and (last - first) / width > MAX_AGGREGATE_BUCKETS:
+            raise HTTPException(status_code=400, detail=TOO_MANY_BUCKETS_DETAIL)
+
+    aggregated_data = await fetch_statistics(
+        db, width, statistics, group_by == "server", server_ulid, start_time, end_time
+    )
+    if not aggregated_data:
+        raise HTTPException(status_code=404, detail="No sensor data found")
+    return aggregated_data
 
-        aggregated_data = query.all()
-
-        if not aggregated_data:
-            raise HTTPException(status_code=404, detail="No sensor data found")
-
-        # Retorna os dados agregados
-        return [
-            SensorDataResponse(
-                id=str(ulid.new()),  # Gerar um novo id para dados agregados
-                server_ulid=data.server_ulid,
-                timestamp=data.timestamp.isoformat(),
-                temperature=data.average_temperature,
-                humidity=data.average_humidity,
-                voltage=data.average_voltage,
-                current=data.average_current
+# Séries reduzidas: as colunas de cada servidor são lidas em blocos do cursor do servidor para arrays
+# NumPy e reduzidas de forma vetorizada. Retorna (servidor, métrica, leituras, timestamps, valores).
+# A conversão dos blocos e a redução rodam numa thread, fora do event loop; a leitura para em MAX_DOWNSAMPLE_ROWS.
+async def load_downsampled(db: AsyncSession, server_ulid: Optional[str], start_time: Optional[datetime],
+                           end_time: Optional[datetime], points: int, method: str) -> List[Tuple]:
+    query = (
+        apply_filters(select(SensorData.server_ulid, SensorData.timestamp, *(getattr(SensorData, metric) for metric in METRICS)),
+                      server_ulid, start_time, end_time)
+        .order_by(SensorData.server_ulid, SensorData.timestamp)
+        .limit(MAX_DOWNSAMPLE_ROWS + 1)
+        .execution_options(yield_per=DOWNSAMPLE_CHUNK_SIZE)
+    )
+
+    chunks: Dict[str, List[Tuple]] = {}
+    rows_read = 0
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        rows_read += len(partition)
+        if rows_read > MAX_DOWNSAMPLE_ROWS:
+            await result.close()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many readings to downsample (max {MAX_DOWNSAMPLE_ROWS}). Use a shorter time range.",
             )
-            for data in aggregated_data
-        ]
-    
-    # Caso não seja solicitado agregação, retorna os dados originais
-    sensor_data = query.all()
+        for server, timestamps, metrics in await asyncio.to_thread(_partition_arrays, partition):
+            chunks.setdefault(server, []).append((timestamps, metrics))
+
+    if not chunks:
+        raise HTTPException(status_code=404, detail="No sensor data found")
+
+    return await asyncio.to_thread(_downsample_chunks, chunks, points, method)
+
+# Colunas de um bloco do cursor como arrays NumPy, por servidor
+def _partition_arrays(partition) -> List[Tuple]:
+    arrays = []
+    for server, rows in groupby(partition, key=itemgetter(0)):
+        _, timestamps, *metrics = zip(*rows)
+        arrays.append((
+            server,
+            np.array(timestamps, dtype="datetime64[us]"),
+            [np.array(values, dtype=np.float64) for values in metrics],  # None -> NaN
+        ))
+    return arrays
+
+# Junta os blocos de cada servidor e reduz cada métrica
+def _downsample_chunks(chunks: Dict[str, List[Tuple]], points: int, method: str) -> List[Tuple]:
+    downsampled = []
+    # Os blocos de cada servidor são liberados assim que ele é reduzido
+    for server in list(chunks):
+        server_chunks = chunks.pop(server)
+        timestamps = np.concatenate([chunk[0] for chunk in server_chunks])
+        columns = {
+            metric: np.concatenate([chunk[1][position] for chunk in server_chunks])
+            for position, metric in enumerate(METRICS)
+        }
+        series = downsample_series(timestamps, columns, points, method)
+        for metric, (source_points, series_timestamps, values) in series.items():
+            downsampled.append((server, metric, source_points, series_timestamps, values))
+    return downsampled
+
+# Leituras originais, paginadas por keyset em (timestamp, id)
+async def load_page(db: AsyncSession, server_ulid: Optional[str], start_time: Optional[datetime],
+                    end_time: Optional[datetime], limit: int, cursor: Optional[str]):
+    query = apply_filters(select(*(getattr(SensorData, column) for column in READING_COLUMNS)), server_ulid, start_time, end_time)
+
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor)
+        query = query.where(tuple_(SensorData.timestamp, SensorData.id) > tuple_(last_timestamp, last_id))
+
+    # Busca uma leitura a mais para saber se existe próxima página
+    query = query.order_by(SensorData.timestamp, SensorData.id).limit(limit + 1)
+    result = await db.execute(query)
+    sensor_data = result.all()
 
     if not sensor_data:
         raise HTTPException(status_code=404, detail="No sensor data found")
 
-    return [
-        SensorDataResponse(
-            id=str(data.id),
-            server_ulid=data.server_ulid,
-            timestamp=data.timestamp.isoformat(),
-            temperature=data.temperature,
-            humidity=data.humidity,
-            voltage=data.voltage,
-            current=data.current
-        )
-        for data in sensor_data
-    ]
+    next_cursor = None
+    if len(sensor_data) > limit:
+        sensor_data = sensor_data[:limit]
+        next_cursor = encode_cursor(sensor_data[-1].timestamp, sensor_data[-1].id)
+
+    return sensor_data, next_cursor
+
+@router.get("/export", summary="Export raw sensor data",
+                       description="Streams raw sensor readings as NDJSON or CSV using a server-side cursor, with constant memory regardless of the number of rows.")
+async def export_sensor_data(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Output format: ndjson or csv"),
+    server_ulid: Optional[str] = Query(None, description="Filter by server ULID"),
+    start_time: Optional[datetime] = Query(None, description="Start time for filtering"),
+    end_time: Optional[datetime] = Query(None, description="End time for filtering"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Exporta as leituras brutas em streaming (NDJSON ou CSV), para cargas em massa.
+    - As linhas são lidas em blocos de um cursor do servidor e escritas na resposta conforme chegam.
+    - Aceita os mesmos filtros de `GET /data` (servidor e intervalo de tempo).
+    """
+    start_time, end_time = to_naive_utc(start_time), to_naive_utc(end_time)
+    query = (
+        apply_filters(select(*(getattr(SensorData, column) for column in READING_COLUMNS)), server_ulid, start_time, end_time)
+        .order_by(SensorData.timestamp, SensorData.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+
+    async def stream_rows():
+        result = await db.stream(query)
+
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(READING_COLUMNS)
+            async for partition in result.partitions():
+                for row in partition:
+                    writer.writerow((row.id, row.server_ulid, row.timestamp.isoformat(),
+                                     row.temperature, row.humidity, row.voltage, row.current))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+            return
+
+        async for partition in result.partitions():
+            yield "".join(
+                json.dumps({
+                    "id": row.id,
+                    "server_ulid": row.server_ulid,
+                    "timestamp": row.timestamp.isoformat(),
+                    "temperature": row.temperature,
+                    "humidity": row.humidity,
+                    "voltage": row.voltage,
+                    "current": row.current,
+                }) + "\n"
+                for row in partition
+            )
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_rows(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="sensor_data.{format}"'})
@@ -1,27 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models import Server
 from app.schemas import ServerCreate, ServerResponse
 from app.utils.security import get_current_user
+from app.utils.cache import invalidate_cached_objects
+from app.routes.health import user_servers_cache_key
+from app.utils import server_registry as registry
+from app.utils.server_registry import ServerInfo
+from app.utils.log import get_logger
 import ulid
 
 router = APIRouter(prefix="/servers", tags=["Servers"])
 
+logger = get_logger(__name__)
+
 @router.post("/", response_model=ServerResponse, status_code=status.HTTP_201_CREATED,
                   summary="Register a new server", 
                   description="Registers a new server in the system. Ensures the server name is unique and generates a ULID.")
 
 
-async def register_server(server_data: ServerCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def register_server(server_data: ServerCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
     
     if not user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    print(f"🔍 DEBUG - Criando servidor para usuário {user.id}")
     
     # Check if a server with the same name already exists
-    existing_server = db.query(Server).filter(Server.name == server_data.name).first()
+    result = await db.execute(select(Server.ulid).where(Server.name == server_data.name))
+    existing_server = result.first()
     if existing_server:
         raise HTTPException(status_code=400, detail="Server with this name already exists")
 
@@ -29,13 +37,22 @@ async def register_server(server_data: ServerCreate, db: Session = Depends(get_d
     new_server = Server(
         ulid=str(ulid.new()),
         name=server_data.name,
+        offline_threshold_seconds=server_data.offline_threshold_seconds,
         user_id=user.id  # 🔹 Associamos o servidor ao usuário autenticado
     )
 
     db.add(new_server)
-    db.commit()
-    db.refresh(new_server)
+    await db.commit()
+    await db.refresh(new_server)
+
+    # Publica o servidor no registro usado pela ingestão e pelas verificações de dono
+    await registry.register_server(
+        ServerInfo(new_server.ulid, new_server.name, new_server.user_id, new_server.offline_threshold_seconds)
+    )
+
+    # A lista de status do usuário em cache (Redis e L1 de todos os workers) deixa de incluir todos os servidores
+    await invalidate_cached_objects(user_servers_cache_key(user.id))
 
-    print(f"✅ DEBUG - Servidor criado: {new_server.ulid}, Usuário: {user.id}")
+    logger.info("Servidor criado", extra={"server_ulid": new_server.ulid, "user_id": user.id})
 
     return new_server
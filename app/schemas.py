@@ -1,9 +1,15 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 
 
+# Datas com fuso são convertidas para UTC sem fuso, como as gravadas pela API
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 
 # -------------------------------
 # 🔹 Server Schema 
@@ -11,12 +17,17 @@ from enum import Enum
 
 class ServerCreate(BaseModel):
     name: str = Field(..., title="Server Name", description="The name of the server")
+    offline_threshold_seconds: Optional[int] = Field(
+        None, ge=1, le=86400,
+        description="Seconds without readings before the server is reported offline. Defaults to HEALTH_OFFLINE_THRESHOLD."
+    )
 
 # 🔹 Schema to Responder with a Server created
 
 class ServerResponse(BaseModel):
     ulid: str
     name: str
+    offline_threshold_seconds: Optional[int] = None
 
     class Config:
         orm_mode = True #
@@ -26,11 +37,20 @@ class ServerResponse(BaseModel):
 # 🔹 Schema para o payload do `POST /data`
 class SensorDataCreate(BaseModel):
     server_ulid: str = Field(..., title="Server ULID", description="Unique identifier of the server")
+    timestamp: Optional[datetime] = Field(
+        None, description="Reading time measured by the collector. Defaults to the time the API receives it. "
+                          "Resending the same (server_ulid, timestamp) updates the existing reading."
+    )
     temperature: Optional[float] = None
     humidity: Optional[float] = None
     voltage: Optional[float] = None
     current: Optional[float] = None
 
+    # Timestamps com fuso são convertidos para UTC sem fuso, como os gravados pela API
+    @validator("timestamp")
+    def normalize_timestamp(cls, value):
+        return to_naive_utc(value)
+
     class Config:
         orm_mode = True
         
@@ -47,6 +67,55 @@ class SensorDataResponse(BaseModel):
     class Config:
         orm_mode = True
 
+# 🔹 Estatísticas de uma métrica em um bucket (só as pedidas em `stats` aparecem na resposta)
+class MetricAggregate(BaseModel):
+    avg: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    count: Optional[int]  # Leituras do bucket com a métrica preenchida
+    stddev: Optional[float]
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+
+# 🔹 Schema para resposta do `GET /data` com `aggregation` ou `bucket`: um item por bucket (e servidor)
+class SensorAggregateResponse(BaseModel):
+    server_ulid: Optional[str]  # None com group_by=none (todos os servidores no mesmo bucket)
+    bucket: datetime
+    count: int
+    temperature: MetricAggregate
+    humidity: MetricAggregate
+    voltage: MetricAggregate
+    current: MetricAggregate
+
+# 🔹 Schema para resposta do `GET /data?points=N`: uma série reduzida por servidor e métrica
+class SensorSeriesResponse(BaseModel):
+    server_ulid: str
+    metric: str
+    method: str  # lttb | minmax
+    source_points: int  # Leituras da série antes da redução
+    timestamps: List[datetime]
+    values: List[float]
+
+# 🔹 Schema para o payload do `POST /data/batch`
+class SensorDataBatchCreate(BaseModel):
+    items: List[SensorDataCreate] = Field(..., min_items=1, description="Sensor readings, possibly from many servers")
+
+# 🔹 Resultado individual de cada leitura do lote
+class SensorDataBatchItemResult(BaseModel):
+    index: int
+    status: str  # created | updated | duplicate | accepted | rejected
+    id: Optional[str] = None
+    detail: Optional[str] = None
+
+# 🔹 Schema para resposta do `POST /data/batch`
+class SensorDataBatchResponse(BaseModel):
+    created: int
+    updated: int = 0  # Leituras que já existiam para o mesmo (server_ulid, timestamp)
+    accepted: int = 0  # Leituras aceitas no buffer de escrita (INGEST_MODE=buffered)
+    rejected: int
+    results: List[SensorDataBatchItemResult]
+
 # -------------------------------
 # 🔹 Users Schema  
 # -------------------------------
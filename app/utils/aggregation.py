@@ -0,0 +1,145 @@
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from sqlalchemy import Float, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import METRICS, SensorData
+from app.utils.rollups import fetch_aggregates
+
+# 🔹 Agregação de `GET /data` com buckets de largura arbitrária e várias estatísticas por métrica
+
+STATISTICS = ("avg", "min", "max", "count", "stddev", "p50", "p95", "p99")
+DEFAULT_STATISTICS = ("avg", "min", "max", "count")
+# Estatísticas que os rollups (count/sum/min/max) conseguem responder sem ler os dados brutos
+ROLLUP_STATISTICS = {"avg", "min", "max", "count"}
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+# Larguras servidas pelas tabelas de rollup
+ROLLUP_WIDTHS = {
+    timedelta(minutes=1): "minute",
+    timedelta(hours=1): "hour",
+    timedelta(days=1): "day",
+}
+GRANULARITY_WIDTHS = {granularity: width for width, granularity in ROLLUP_WIDTHS.items()}
+
+BUCKET_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+BUCKET_PATTERN = re.compile(r"^(\d+)([smhd])$")
+
+
+# "5s", "15m", "1h", "1d" -> timedelta
+def parse_bucket_width(value: str) -> timedelta:
+    match = BUCKET_PATTERN.match(value)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError("Invalid bucket width. Use a positive integer followed by s, m, h or d (e.g. 5s, 15m).")
+    return timedelta(**{BUCKET_UNITS[match.group(2)]: int(match.group(1))})
+
+
+# "avg,p95" -> ("avg", "p95"), na ordem de STATISTICS e sem repetições
+def parse_statistics(value: Optional[str]) -> Tuple[str, ...]:
+    if not value:
+        return DEFAULT_STATISTICS
+    requested = {stat.strip() for stat in value.split(",") if stat.strip()}
+    unknown = requested - set(STATISTICS)
+    if unknown or not requested:
+        raise ValueError(f"Invalid statistics. Use a comma-separated list of: {', '.join(STATISTICS)}.")
+    return tuple(stat for stat in STATISTICS if stat in requested)
+
+
+class AggregateRow:
+    """Bucket agregado com as estatísticas pedidas por métrica."""
+
+    __slots__ = ("server_ulid", "timestamp", "count", "stats")
+
+    def __init__(self, server_ulid: Optional[str], timestamp: datetime, count: int, stats: Dict[str, Dict]):
+        self.server_ulid = server_ulid
+        self.timestamp = timestamp
+        self.count = count
+        self.stats = stats
+
+    def statistic(self, metric: str, stat: str):
+        return self.stats[metric][stat]
+
+    @classmethod
+    def from_rollup(cls, bucket, statistics: Sequence[str]) -> "AggregateRow":
+        stats = {
+            metric: {stat: bucket.average(metric) if stat == "avg" else bucket.stats[metric][stat] for stat in statistics}
+            for metric in METRICS
+        }
+        return cls(bucket.server_ulid, bucket.timestamp, bucket.count, stats)
+
+
+# Início do bucket de largura `width` que contém `column`, alinhado à época Unix (UTC).
+# Equivalente ao date_bin do PostgreSQL 14, mas também roda no PostgreSQL 13 do docker-compose.
+# A largura é um inteiro validado: vai literal no SQL para o GROUP BY reconhecer a mesma expressão.
+def bucket_start(column, width: timedelta):
+    seconds = literal_column(str(int(width.total_seconds())), Float)
+    return func.timezone("UTC", func.to_timestamp(func.floor(func.extract("epoch", column) / seconds) * seconds))
+
+
+def _metric_columns(metric: str, statistics: Sequence[str]) -> list:
+    column = SensorData.__table__.c[metric]
+    aggregates = {
+        "avg": func.avg(column),
+        "min": func.min(column),
+        "max": func.max(column),
+        "count": func.count(column),
+        "stddev": func.stddev_samp(column),
+    }
+    columns = [aggregates[stat].label(f"{metric}_{stat}") for stat in statistics if stat in aggregates]
+
+    # Todos os percentis da métrica em um único agregado ordenado (uma ordenação por grupo)
+    percentiles = [stat for stat in statistics if stat in PERCENTILES]
+    if percentiles:
+        fractions = literal_column(f"ARRAY[{', '.join(str(PERCENTILES[stat]) for stat in percentiles)}]")
+        columns.append(func.percentile_cont(fractions).within_group(column).label(f"{metric}_percentiles"))
+    return columns
+
+
+def _row_stats(row: Mapping, statistics: Sequence[str]) -> Dict[str, Dict]:
+    percentiles = [stat for stat in statistics if stat in PERCENTILES]
+    stats = {}
+    for metric in METRICS:
+        values = {stat: row[f"{metric}_{stat}"] for stat in statistics if stat not in PERCENTILES}
+        if percentiles:
+            values.update(zip(percentiles, row[f"{metric}_percentiles"] or [None] * len(percentiles)))
+        stats[metric] = values
+    return stats
+
+
+async def fetch_statistics(
+    db: AsyncSession,
+    width: timedelta,
+    statistics: Sequence[str],
+    group_by_server: bool = True,
+    server_ulid: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> List[AggregateRow]:
+    """
+    Agrega as leituras em buckets de `width`, com as estatísticas pedidas para cada métrica.
+    - Larguras de minuto, hora e dia com avg/min/max/count, por servidor: servidas pelos rollups.
+    - Demais casos: um único GROUP BY sobre `sensor_data`, calculando todas as estatísticas na mesma passada.
+    """
+    granularity = ROLLUP_WIDTHS.get(width)
+    if granularity and group_by_server and set(statistics) <= ROLLUP_STATISTICS:
+        buckets = await fetch_aggregates(db, granularity, server_ulid, start_time, end_time)
+        return [AggregateRow.from_rollup(bucket, statistics) for bucket in buckets]
+
+    bucket = bucket_start(SensorData.timestamp, width).label("bucket")
+    group = [SensorData.server_ulid, bucket] if group_by_server else [bucket]
+    columns = [func.count().label("count")]
+    for metric in METRICS:
+        columns += _metric_columns(metric, statistics)
+
+    query = select(*group, *columns).group_by(*group).order_by(bucket, *group[:-1])
+    if server_ulid:
+        query = query.where(SensorData.server_ulid == server_ulid)
+    # Mesma regra de `GET /data`: o filtro de tempo só vale com início e fim informados
+    if start_time and end_time:
+        query = query.where(SensorData.timestamp.between(start_time, end_time))
+
+    result = await db.execute(query)
+    return [
+        AggregateRow(row.get("server_ulid"), row["bucket"], row["count"], _row_stats(row, statistics))
+        for row in result.mappings().all()
+    ]
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Awaitable, Callable, List
+from app.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Tarefas em segundo plano iniciadas no lifespan da aplicação
+_tasks: List[asyncio.Task] = []
+
+
+async def _run_periodically(fn: Callable[[], Awaitable], interval: float, name: str):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await fn()
+        except Exception:
+            logger.warning("Tarefa periódica '%s' falhou", name, exc_info=True)
+
+# Executa `fn` a cada `interval` segundos até o shutdown da aplicação
+def start_periodic_task(fn: Callable[[], Awaitable], interval: float, name: str) -> asyncio.Task:
+    task = asyncio.create_task(_run_periodically(fn, interval, name), name=name)
+    _tasks.append(task)
+    return task
+
+async def _run_forever(fn: Callable[[], Awaitable], name: str, retry_delay: float):
+    while True:
+        try:
+            await fn()
+        except Exception:
+            logger.warning("Tarefa '%s' falhou, reiniciando em %ss", name, retry_delay, exc_info=True)
+        await asyncio.sleep(retry_delay)
+
+# Mantém uma tarefa de longa duração (ex.: assinatura pub/sub) rodando, reiniciando-a se falhar
+def start_background_task(fn: Callable[[], Awaitable], name: str, retry_delay: float = 1.0) -> asyncio.Task:
+    task = asyncio.create_task(_run_forever(fn, name, retry_delay), name=name)
+    _tasks.append(task)
+    return task
+
+# Cancela todas as tarefas em segundo plano (shutdown)
+async def stop_background_tasks():
+    tasks = list(_tasks)
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
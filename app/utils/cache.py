@@ -1,9 +1,14 @@
 import redis.asyncio as redis  # Usando o módulo async do redis-py
-from fastapi import HTTPException
+import asyncio
+import json
 import os
+import time
+import uuid
+from collections import OrderedDict
 from dotenv import load_dotenv
-from typing import Optional
-import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.utils.metrics import instrumented_connection_class, register_cache_collector
+from app.utils.profiling import record_cache_lookup
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -15,25 +20,286 @@ REDIS_URL = os.getenv("REDIS_URL")  # URL padrão se não encontrar a variável
 if not REDIS_URL:
     raise ValueError("REDIS_URL environment variable is not set")
 
-# Função para criar a conexão Redis assíncrona
-async def get_redis_connection():
-    try:
-        return await redis.from_url(REDIS_URL)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error connecting to Redis: {str(e)}")
+# Configuração do pool de conexões
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))  # Espera máxima por uma conexão livre
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "5"))
+
+# Cliente compartilhado pela aplicação (criado no startup, fechado no shutdown)
+_redis_client: Optional[redis.Redis] = None
+
+
+# Cria o pool de conexões e o cliente compartilhado
+async def init_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        pool = redis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            decode_responses=True,
+        )
+        # Conta as idas ao Redis (métrica `redis_round_trips_total`)
+        pool.connection_class = instrumented_connection_class(pool.connection_class)
+        _redis_client = redis.Redis(connection_pool=pool)
+    return _redis_client
+
+# Fecha o cliente e desconecta todas as conexões do pool
+async def close_redis():
+    global _redis_client
+    if _redis_client is not None:
+        client, _redis_client = _redis_client, None
+        await client.close()
+        await client.connection_pool.disconnect()
+
+# Dependência FastAPI: retorna o cliente compartilhado (criado sob demanda fora do lifespan)
+async def get_redis() -> redis.Redis:
+    return _redis_client or await init_redis()
 
 # Função para armazenar um valor no cache
 async def set_cache_key(key: str, value: str, expire: int = 3600):
-    redis_conn = await get_redis_connection()
-    
-    # Serializa a lista em uma string JSON antes de armazenar no Redis
-    value = json.dumps(value)  # Converte a lista para string JSON
+    redis_conn = await get_redis()
     await redis_conn.setex(key, expire, value)  # Armazena o valor com tempo de expiração
-    await redis_conn.close()
 
 # Função para pegar um valor do cache
 async def get_cache_key(key: str) -> Optional[str]:
-    redis_conn = await get_redis_connection()
-    value = await redis_conn.get(key)
-    await redis_conn.close()
-    return value.decode('utf-8') if value else None
+    redis_conn = await get_redis()
+    return await redis_conn.get(key)
+
+
+# -------------------------------
+# 🔹 Cache em dois níveis: L1 em memória (por worker) + L2 no Redis
+# -------------------------------
+
+# L1: LRU limitado com TTL curto, guardando objetos já decodificados (sem ida ao Redis nem json.loads)
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000"))
+L1_TTL = float(os.getenv("CACHE_L1_TTL", "2"))  # segundos
+
+# Canal pub/sub usado para invalidar o L1 dos outros workers
+INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+
+# Identifica este worker nas mensagens de invalidação (ignora as próprias mensagens)
+_WORKER_ID = uuid.uuid4().hex
+
+
+class LocalCache:
+    """LRU em memória com TTL por entrada. Não é compartilhado entre workers."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Caches em memória do worker, todos invalidados pelo canal pub/sub
+_local_caches: List[LocalCache] = []
+
+def create_local_cache(max_entries: int, ttl: float) -> LocalCache:
+    cache = LocalCache(max_entries, ttl)
+    _local_caches.append(cache)
+    return cache
+
+local_cache = create_local_cache(L1_MAX_ENTRIES, L1_TTL)
+
+# Contadores de acerto/erro por nível
+cache_stats = {
+    "l1": {"hits": 0, "misses": 0},
+    "l2": {"hits": 0, "misses": 0},
+}
+
+def get_cache_stats() -> dict:
+    stats = {tier: dict(counters) for tier, counters in cache_stats.items()}
+    stats["l1"].update(size=len(local_cache), max_entries=local_cache.max_entries, evictions=local_cache.evictions)
+    return stats
+
+register_cache_collector(get_cache_stats)
+
+
+# Busca um objeto no L1 e, se não estiver lá, no Redis (decodificando uma única vez por worker)
+# `local=False` ignora o L1 (valores grandes ou que não valem a memória do worker)
+async def get_cached_object(key: str, loads: Callable[[str], Any] = json.loads, local: bool = True) -> Optional[Any]:
+    if local:
+        found, value = local_cache.get(key)
+        if found:
+            cache_stats["l1"]["hits"] += 1
+            record_cache_lookup(key, "l1_hit")
+            return value
+        cache_stats["l1"]["misses"] += 1
+
+    cached_data = await get_cache_key(key)
+    if cached_data is None:
+        cache_stats["l2"]["misses"] += 1
+        record_cache_lookup(key, "miss")
+        return None
+    cache_stats["l2"]["hits"] += 1
+    record_cache_lookup(key, "l2_hit")
+
+    value = loads(cached_data)
+    if local:
+        local_cache.set(key, value)
+    return value
+
+# Grava o objeto nos dois níveis e avisa os outros workers para descartarem a cópia local
+async def set_cached_object(key: str, value: Any, expire: int = 3600, dumps: Callable[[Any], str] = json.dumps,
+                            local: bool = True):
+    await set_cache_key(key, dumps(value), expire=expire)
+    if local:
+        local_cache.set(key, value, ttl=min(L1_TTL, expire))
+        await _publish_invalidation([key])
+
+# Remove as chaves dos dois níveis em todos os workers
+async def invalidate_cached_objects(*keys: str):
+    if not keys:
+        return
+    redis_conn = await get_redis()
+    await redis_conn.delete(*keys)
+    await invalidate_local(*keys)
+
+# Remove as chaves dos caches em memória deste e dos outros workers
+async def invalidate_local(*keys: str):
+    if not keys:
+        return
+    _delete_local(keys)
+    await _publish_invalidation(list(keys))
+
+
+
+# -------------------------------
+# 🔹 Single-flight: uma única recomputação por chave em caso de miss
+# -------------------------------
+
+# Lock no Redis que elege um único worker para recalcular a chave
+COMPUTE_LOCK_TTL = float(os.getenv("CACHE_COMPUTE_LOCK_TTL", "10"))  # segundos; libera o lock se o worker cair
+COMPUTE_WAIT_TIMEOUT = float(os.getenv("CACHE_COMPUTE_WAIT_TIMEOUT", "5"))  # espera máxima pelo resultado de outro worker
+COMPUTE_POLL_INTERVAL = 0.05  # segundos entre verificações enquanto outro worker recalcula
+
+# Apaga o lock apenas se ele ainda pertence a quem o adquiriu (pode ter expirado e sido tomado por outro)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Recomputações em andamento neste worker, por chave
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+
+# Chamadas concorrentes com a mesma chave compartilham uma única execução de `fn`
+async def single_flight(key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fn())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: uma requisição cancelada não cancela a recomputação que as outras aguardam
+    return await asyncio.shield(task)
+
+
+# Lê a chave do cache; num miss, recalcula uma única vez entre todas as requisições e workers:
+# - no worker, as requisições concorrentes aguardam a mesma tarefa (`single_flight`);
+# - entre workers, só quem obtém o lock no Redis executa `compute`; os demais aguardam o valor aparecer no Redis.
+async def get_or_compute(key: str, compute: Callable[[], Awaitable[Any]], expire: int = 3600,
+                         loads: Callable[[str], Any] = json.loads, dumps: Callable[[Any], str] = json.dumps,
+                         local: bool = True) -> Any:
+    value = await get_cached_object(key, loads, local=local)
+    if value is not None:
+        return value
+    return await single_flight(key, lambda: _compute_once(key, compute, expire, loads, dumps, local))
+
+async def _compute_once(key: str, compute: Callable[[], Awaitable[Any]], expire: int,
+                        loads: Callable[[str], Any], dumps: Callable[[Any], str], local: bool) -> Any:
+    redis_conn = await get_redis()
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+
+    if not await redis_conn.set(lock_key, token, nx=True, px=int(COMPUTE_LOCK_TTL * 1000)):
+        # Outro worker está recalculando: aguarda o resultado dele
+        deadline = time.monotonic() + COMPUTE_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(COMPUTE_POLL_INTERVAL)
+            cached_data = await get_cache_key(key)
+            if cached_data is not None:
+                value = loads(cached_data)
+                if local:
+                    local_cache.set(key, value)
+                return value
+        # O outro worker demorou demais (ou caiu): recalcula aqui mesmo
+
+    try:
+        value = await compute()
+        await set_cached_object(key, value, expire=expire, dumps=dumps, local=local)
+        return value
+    finally:
+        await redis_conn.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+
+async def _publish_invalidation(keys: List[str]):
+    redis_conn = await get_redis()
+    await redis_conn.publish(INVALIDATION_CHANNEL, json.dumps({"worker": _WORKER_ID, "keys": keys}))
+
+def _handle_invalidation(data: str):
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return
+    if message.get("worker") != _WORKER_ID:
+        _delete_local(message.get("keys", []))
+
+def _delete_local(keys):
+    for cache in _local_caches:
+        cache.delete(*keys)
+
+def _clear_local():
+    for cache in _local_caches:
+        cache.clear()
+
+# Escuta o canal de invalidação (tarefa em segundo plano iniciada no lifespan).
+# Mensagens perdidas enquanto a assinatura esteve fora não são reenviadas: os caches locais são limpos a cada (re)conexão.
+async def listen_for_invalidations():
+    redis_conn = await get_redis()
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        _clear_local()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None:
+                _handle_invalidation(message["data"])
+    finally:
+        _clear_local()
+        await pubsub.close()
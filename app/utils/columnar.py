@@ -0,0 +1,107 @@
+import asyncio
+import io
+from typing import Callable, Dict, List, Optional, Sequence
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import Response
+from app.models import METRICS
+
+# 🔹 Tipos de mídia das respostas colunares
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ACCEPT_FORMATS = {
+    ARROW_STREAM_MEDIA_TYPE: "arrow",
+    PARQUET_MEDIA_TYPE: "parquet",
+    "application/json": "json",
+}
+
+# Colunas das leituras brutas e tipos Arrow correspondentes
+READING_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("server_ulid", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+    ("temperature", pa.float64()),
+    ("humidity", pa.float64()),
+    ("voltage", pa.float64()),
+    ("current", pa.float64()),
+])
+
+# Colunas das leituras agregadas: uma por métrica e estatística pedida (ex.: temperature_p95)
+def aggregate_schema(statistics: Sequence[str]) -> pa.Schema:
+    fields = [("server_ulid", pa.string()), ("bucket", pa.timestamp("us")), ("count", pa.int64())]
+    for metric in METRICS:
+        fields += [(f"{metric}_{stat}", pa.int64() if stat == "count" else pa.float64()) for stat in statistics]
+    return pa.schema(fields)
+
+# Séries reduzidas (`points=N`), em formato longo: uma linha por ponto
+SERIES_SCHEMA = pa.schema([
+    ("server_ulid", pa.string()),
+    ("metric", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+    ("value", pa.float64()),
+])
+
+
+def _accept_quality(params: Sequence[str]) -> float:
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+# Escolhe o formato da resposta: parâmetro `format` explícito ou header Accept.
+# Vale o tipo suportado com maior `q` (no empate, o primeiro listado); `q=0` exclui o tipo.
+def negotiate_format(accept: Optional[str], format: Optional[str] = None) -> str:
+    if format:
+        return format
+    best, best_quality = "json", 0.0
+    for entry in (accept or "").split(","):
+        media_type, *params = entry.split(";")
+        candidate = ACCEPT_FORMATS.get(media_type.strip().lower())
+        if candidate is None:
+            continue
+        quality = _accept_quality(params)
+        if quality > best_quality:
+            best, best_quality = candidate, quality
+    return best
+
+
+# Monta uma tabela Arrow diretamente das linhas do banco (sem objetos Pydantic por linha)
+def rows_to_table(rows: Sequence[Sequence], schema: pa.Schema) -> pa.Table:
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+def columns_to_table(columns: Dict[str, List], schema: pa.Schema) -> pa.Table:
+    return pa.Table.from_arrays([pa.array(columns[field.name], type=field.type) for field in schema], schema=schema)
+
+
+def encode_table(table: pa.Table, format: str, batch_size: int = 65536) -> bytes:
+    sink = io.BytesIO()
+    if format == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=batch_size):
+                writer.write_batch(batch)
+    return sink.getvalue()
+
+
+# Monta a tabela (`build_table`) e a serializa no formato pedido (Arrow IPC stream ou Parquet).
+# Páginas colunares chegam a centenas de milhares de linhas: as duas etapas rodam numa thread para não travar o event loop.
+async def columnar_response(build_table: Callable[[], pa.Table], format: str,
+                            headers: Optional[Dict[str, str]] = None) -> Response:
+    content = await asyncio.to_thread(lambda: encode_table(build_table(), format))
+
+    headers = dict(headers or {})
+    if format == "parquet":
+        headers["Content-Disposition"] = 'attachment; filename="sensor_data.parquet"'
+        media_type = PARQUET_MEDIA_TYPE
+    else:
+        media_type = ARROW_STREAM_MEDIA_TYPE
+    return Response(content=content, media_type=media_type, headers=headers)
@@ -0,0 +1,89 @@
+from typing import Dict, List, Tuple
+import numpy as np
+
+# 🔹 Redução de séries para gráficos (`GET /data?points=N`)
+# Um gráfico de ~1.500 pixels não precisa de semanas de leituras a 1 Hz: cada série (servidor x métrica)
+# é reduzida a no máximo N pontos, mantendo picos visíveis (ao contrário da média por bucket).
+# - "lttb": Largest-Triangle-Three-Buckets, preserva a forma visual da série
+# - "minmax": mínimo e máximo de cada bucket, garante que nenhum extremo desaparece
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+# Limites de `buckets` intervalos de tamanho (quase) igual em [start, stop)
+def _bucket_edges(start: int, stop: int, buckets: int) -> np.ndarray:
+    return np.linspace(start, stop, buckets + 1).astype(np.int64)
+
+
+# Índices escolhidos pelo LTTB. O primeiro e o último ponto sempre entram; os demais são
+# divididos em `points - 2` buckets e de cada um fica o ponto que forma o maior triângulo com o
+# ponto escolhido no bucket anterior e a média do bucket seguinte.
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    buckets = points - 2
+    edges = _bucket_edges(1, n - 1, buckets)
+    sizes = np.diff(edges)
+
+    # Médias de todos os buckets de uma vez (o "terceiro vértice" de cada triângulo)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / sizes
+    avg_x = np.append(avg_x[1:], x[n - 1])
+    avg_y = np.append(avg_y[1:], y[n - 1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    # O ponto escolhido depende do anterior: o laço é por bucket, o cálculo dentro dele é vetorizado
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - avg_x[bucket]) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y[bucket] - ay))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+# Índices do mínimo e do máximo de cada um de `points // 2` buckets, em ordem de tempo
+def minmax_indices(y: np.ndarray, points: int) -> np.ndarray:
+    n = len(y)
+    if points >= n or points < 2:
+        return np.arange(n)
+
+    edges = _bucket_edges(0, n, points // 2)
+    bucket_of = np.repeat(np.arange(len(edges) - 1), np.diff(edges))
+
+    selected = []
+    for reduce in (np.minimum, np.maximum):
+        extremes = reduce.reduceat(y, edges[:-1])
+        # Primeira ocorrência do extremo em cada bucket
+        hits = np.flatnonzero(y == extremes[bucket_of])
+        _, first = np.unique(bucket_of[hits], return_index=True)
+        selected.append(hits[first])
+    return np.unique(np.concatenate(selected))
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, points: int, method: str) -> np.ndarray:
+    if method == "minmax":
+        return minmax_indices(y, points)
+    return lttb_indices(x, y, points)
+
+
+# Reduz cada métrica de uma série. `timestamps` é datetime64[us] em ordem crescente e `columns`
+# mapeia métrica -> float64 (NaN para leituras sem a métrica, que são ignoradas).
+# Retorna métrica -> (leituras com a métrica, timestamps, valores) com no máximo `points` pontos.
+def downsample_series(timestamps: np.ndarray, columns: Dict[str, np.ndarray], points: int,
+                      method: str) -> Dict[str, Tuple[int, List, List[float]]]:
+    # Eixo x em microssegundos desde a primeira leitura (float64 é exato para séries de séculos)
+    x = (timestamps - timestamps[0]).astype(np.int64).astype(np.float64) if len(timestamps) else np.empty(0)
+
+    series = {}
+    for metric, values in columns.items():
+        present = np.flatnonzero(~np.isnan(values))
+        if not len(present):
+            continue
+        selected = present[downsample_indices(x[present], values[present], points, method)]
+        series[metric] = (len(present), timestamps[selected].tolist(), values[selected].tolist())
+    return series
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from app.utils.cache import get_redis
+from app.utils.server_registry import get_servers
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Transições de status (online/offline) dos servidores, publicadas para `GET /health/stream`
+# Limite padrão: servidor sem leituras há mais de OFFLINE_THRESHOLD é considerado offline
+# (ajustável por servidor em `servers.offline_threshold_seconds`)
+OFFLINE_THRESHOLD = timedelta(seconds=int(os.getenv("HEALTH_OFFLINE_THRESHOLD", "10")))
+# Canal pub/sub em que as transições são publicadas (qualquer worker atende qualquer assinante)
+HEALTH_EVENTS_CHANNEL = os.getenv("HEALTH_EVENTS_CHANNEL", "health:events")
+# Eventos pendentes por conexão; um cliente lento demais é desconectado (e reconecta com um novo snapshot)
+HEALTH_STREAM_QUEUE_SIZE = int(os.getenv("HEALTH_STREAM_QUEUE_SIZE", "100"))
+
+# Stream com o último contato dos servidores, consumido pelo detector de offline (app/utils/offline_detector.py).
+# Limitado a ACTIVITY_STREAM_MAX_LEN entradas: o detector só precisa do que ainda não leu.
+ACTIVITY_STREAM = os.getenv("HEALTH_ACTIVITY_STREAM", "health:activity")
+ACTIVITY_STREAM_MAX_LEN = int(os.getenv("HEALTH_ACTIVITY_STREAM_MAX_LEN", "100000"))
+
+# Status atual de cada servidor, mantido pelo detector e lido pelas rotas de saúde
+STATUS_KEY = "health:status"
+
+STATUS_WRITE_CHUNK_SIZE = 10000
+
+
+def epoch(moment: datetime) -> float:
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+# Chamado pela ingestão após gravar as leituras: `last_seen_by_server` mapeia servidor -> leitura mais recente.
+# Uma única entrada no stream por requisição ou lote, qualquer que seja o número de servidores.
+async def report_activity(last_seen_by_server: Dict[str, datetime]):
+    if not last_seen_by_server:
+        return
+    redis_conn = await get_redis()
+    await redis_conn.xadd(
+        ACTIVITY_STREAM,
+        {server_ulid: epoch(last_seen) for server_ulid, last_seen in last_seen_by_server.items()},
+        maxlen=ACTIVITY_STREAM_MAX_LEN,
+        approximate=True,
+    )
+
+
+# Status dos servidores (None para os que o detector ainda não viu enviar leituras)
+async def get_statuses(server_ulids: List[str]) -> Dict[str, Optional[str]]:
+    if not server_ulids:
+        return {}
+    redis_conn = await get_redis()
+    return dict(zip(server_ulids, await redis_conn.hmget(STATUS_KEY, server_ulids)))
+
+
+# Grava o status de vários servidores; com `replace`, descarta os status antigos (carga inicial do detector)
+async def write_statuses(statuses: Dict[str, str], replace: bool = False):
+    redis_conn = await get_redis()
+    items = list(statuses.items())
+    async with redis_conn.pipeline(transaction=True) as pipe:
+        if replace:
+            pipe.delete(STATUS_KEY)
+        for offset in range(0, len(items), STATUS_WRITE_CHUNK_SIZE):
+            pipe.hset(STATUS_KEY, mapping=dict(items[offset:offset + STATUS_WRITE_CHUNK_SIZE]))
+        await pipe.execute()
+
+
+# Grava as transições detectadas e as publica para as conexões de `GET /health/stream`
+async def publish_transitions(transitions: List[Tuple[str, str]]):
+    if not transitions:
+        return
+    await write_statuses(dict(transitions))
+
+    servers = await get_servers(server_ulid for server_ulid, _ in transitions)
+    at = datetime.utcnow().isoformat()
+    redis_conn = await get_redis()
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for server_ulid, status in transitions:
+            info = servers.get(server_ulid)
+            if info is None:
+                continue  # Servidor removido
+            pipe.publish(HEALTH_EVENTS_CHANNEL, json.dumps({
+                "user_id": info.user_id,
+                "server_ulid": server_ulid,
+                "server_name": info.name,
+                "status": status,
+                "at": at,
+            }))
+        await pipe.execute()
+
+
+# -------------------------------
+# 🔹 Distribuição local: uma assinatura pub/sub por worker, uma fila por conexão
+# -------------------------------
+
+# Conexões abertas de `GET /health/stream` neste worker, por usuário
+_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+# Evento enfileirado quando a fila da conexão transborda: o stream é encerrado
+OVERFLOW = object()
+
+
+def subscribe(user_id: str) -> asyncio.Queue:
+    queue = asyncio.Queue(maxsize=HEALTH_STREAM_QUEUE_SIZE)
+    _subscribers.setdefault(user_id, set()).add(queue)
+    return queue
+
+def unsubscribe(user_id: str, queue: asyncio.Queue):
+    queues = _subscribers.get(user_id)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del _subscribers[user_id]
+
+def subscriber_count() -> int:
+    return sum(len(queues) for queues in _subscribers.values())
+
+
+def _dispatch(data: str):
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return
+    for queue in list(_subscribers.get(event.pop("user_id", None), ())):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Cliente não acompanha: esvazia a fila e sinaliza o encerramento da conexão
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(OVERFLOW)
+
+
+# Escuta o canal de transições e repassa os eventos às conexões locais do dono do servidor
+async def listen_for_health_events():
+    redis_conn = await get_redis()
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(HEALTH_EVENTS_CHANNEL)
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None:
+                _dispatch(message["data"])
+    finally:
+        await pubsub.close()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import Server, SensorData
+
+
+# Subconsulta correlacionada com a última leitura de cada servidor.
+# Com o índice único (server_ulid, timestamp) cada servidor custa uma busca no índice (varredura reversa).
+def last_reading_timestamp():
+    return (
+        select(SensorData.timestamp)
+        .where(SensorData.server_ulid == Server.ulid)
+        .order_by(SensorData.timestamp.desc())
+        .limit(1)
+        .correlate(Server)
+        .scalar_subquery()
+    )
+
+
+# Atualiza `last_seen_at` dos servidores na mesma transação da ingestão.
+# Nunca regride o valor: leituras atrasadas não sobrescrevem uma mais recente.
+_touch_last_seen = (
+    update(Server.__table__)
+    .where(
+        Server.__table__.c.ulid == bindparam("b_ulid"),
+        or_(
+            Server.__table__.c.last_seen_at.is_(None),
+            Server.__table__.c.last_seen_at < bindparam("b_last_seen"),
+        ),
+    )
+    .values(last_seen_at=bindparam("b_last_seen"))
+)
+
+async def touch_last_seen(db: AsyncSession, last_seen_by_server: Dict[str, datetime]):
+    if not last_seen_by_server:
+        return
+    await db.execute(
+        _touch_last_seen,
+        # Ordenado por ULID para que lotes concorrentes travem as linhas na mesma ordem (sem deadlock)
+        [{"b_ulid": server_ulid, "b_last_seen": last_seen} for server_ulid, last_seen in sorted(last_seen_by_server.items())],
+    )
+
+
+# Reconstrói `last_seen_at` de todos os servidores a partir de `sensor_data` (ex.: após um restore)
+def reconcile_last_seen(db: Session) -> int:
+    result = db.execute(update(Server).values(last_seen_at=last_reading_timestamp()))
+    db.commit()
+    return result.rowcount
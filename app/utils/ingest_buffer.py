@@ -0,0 +1,262 @@
+import json
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from app.database import AsyncSessionLocal
+from app.models import METRICS, SensorData
+from app.utils.cache import get_redis
+from app.utils.heartbeat import touch_last_seen
+from app.utils.health_events import report_activity
+from app.utils.metrics import INGEST_ROWS_BUFFERED, INGEST_ROWS_WRITTEN
+from app.utils.rollups import mark_late_readings
+from app.utils.sensor_cache import invalidate_servers
+from app.utils.server_registry import forget_servers, get_servers
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Modo de ingestão de `POST /data` e `POST /data/batch`
+# - "sync": grava no PostgreSQL dentro da requisição (201)
+# - "buffered": grava no Redis Stream e responde 202; um consumidor grava no banco em lotes
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+
+if INGEST_MODE not in ("sync", "buffered"):
+    raise ValueError("INGEST_MODE must be 'sync' or 'buffered'")
+
+# Tolerância para o relógio do coletor: leituras com timestamp mais à frente que isso são recusadas
+# (avançariam `last_seen_at` e os prazos do detector de offline até o timestamp chegar)
+INGEST_MAX_CLOCK_SKEW = timedelta(seconds=int(os.getenv("INGEST_MAX_CLOCK_SKEW", "60")))
+
+INGEST_STREAM = os.getenv("INGEST_STREAM", "sensor_data:ingest")
+INGEST_GROUP = os.getenv("INGEST_GROUP", "sensor_data_writers")
+
+# Leituras aguardando gravação acima das quais a ingestão responde 503 (back-pressure)
+INGEST_BUFFER_MAX_LEN = int(os.getenv("INGEST_BUFFER_MAX_LEN", "1000000"))
+# Um lote é gravado ao atingir INGEST_FLUSH_SIZE leituras ou INGEST_FLUSH_INTERVAL segundos
+INGEST_FLUSH_SIZE = int(os.getenv("INGEST_FLUSH_SIZE", "5000"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1"))
+# Leituras entregues a um consumidor que não confirmou em INGEST_CLAIM_IDLE segundos são reassumidas
+INGEST_CLAIM_IDLE = float(os.getenv("INGEST_CLAIM_IDLE", "60"))
+
+# Inicia o consumidor no lifespan da aplicação (desative para rodar consumidores à parte)
+INGEST_CONSUMER_ENABLED = os.getenv("INGEST_CONSUMER_ENABLED", "true").lower() == "true"
+
+# Nome deste consumidor no grupo (um por processo)
+CONSUMER_NAME = f"{socket.gethostname()}-{os.getpid()}"
+
+# Contadores do consumidor deste processo
+consumer_stats = {
+    "rows_flushed": 0,
+    "rows_dropped": 0,
+    "flushes": 0,
+    "last_flush_at": None,
+    "last_flush_seconds": None,
+}
+
+
+def is_buffered() -> bool:
+    return INGEST_MODE == "buffered"
+
+
+# INSERT ... ON CONFLICT (server_ulid, timestamp) DO UPDATE, usado nos dois modos de ingestão: um reenvio
+# da mesma leitura atualiza as métricas (vale a última escrita) e mantém o id original, sem SELECT de
+# duplicidade antes da escrita. `returning`: colunas devolvidas pelo comando.
+def upsert_readings(returning: Sequence[str] = ()):
+    table = SensorData.__table__
+    stmt = pg_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["server_ulid", "timestamp"],
+        set_={metric: stmt.excluded[metric] for metric in METRICS},
+    )
+    return stmt.returning(*(table.c[column] for column in returning)) if returning else stmt
+
+
+# -------------------------------
+# 🔹 Produtor (rotas de ingestão)
+# -------------------------------
+
+# Enfileira as leituras no stream (uma ida ao Redis). O id (ULID) e o timestamp já vêm definidos,
+# então reprocessar uma leitura após uma falha não a duplica, e um reenvio do coletor a atualiza (upsert_readings).
+async def enqueue_readings(rows: List[dict]):
+    redis_conn = await get_redis()
+
+    # Back-pressure: com o consumidor atrasado, recusa em vez de crescer o buffer sem limite
+    if await redis_conn.xlen(INGEST_STREAM) + len(rows) > INGEST_BUFFER_MAX_LEN:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest buffer is full, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for row in rows:
+            pipe.xadd(INGEST_STREAM, {"reading": json.dumps(row, default=datetime.isoformat)})
+        await pipe.execute()
+    INGEST_ROWS_BUFFERED.inc(len(rows))
+
+
+# -------------------------------
+# 🔹 Consumidor (grava o buffer no PostgreSQL em lotes)
+# -------------------------------
+
+async def ensure_consumer_group():
+    redis_conn = await get_redis()
+    try:
+        await redis_conn.xgroup_create(INGEST_STREAM, INGEST_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _decode(entries) -> List[Tuple[str, dict]]:
+    decoded = []
+    for entry_id, fields in entries:
+        if not fields:
+            continue  # Entrada removida do stream enquanto estava pendente
+        row = json.loads(fields["reading"])
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        decoded.append((entry_id, row))
+    return decoded
+
+
+# Lê até INGEST_FLUSH_SIZE leituras, esperando no máximo INGEST_FLUSH_INTERVAL segundos para completar o lote
+async def _read_batch() -> List[Tuple[str, dict]]:
+    redis_conn = await get_redis()
+    batch = []
+
+    # Primeiro reassume leituras de consumidores que caíram sem confirmar
+    _, claimed, *_ = await redis_conn.xautoclaim(
+        INGEST_STREAM, INGEST_GROUP, CONSUMER_NAME,
+        min_idle_time=int(INGEST_CLAIM_IDLE * 1000), start_id="0-0", count=INGEST_FLUSH_SIZE,
+    )
+    batch += _decode(claimed)
+
+    deadline = time.monotonic() + INGEST_FLUSH_INTERVAL
+    while len(batch) < INGEST_FLUSH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        response = await redis_conn.xreadgroup(
+            INGEST_GROUP, CONSUMER_NAME, {INGEST_STREAM: ">"},
+            count=INGEST_FLUSH_SIZE - len(batch), block=max(1, int(remaining * 1000)),
+        )
+        for _, entries in response or []:
+            batch += _decode(entries)
+
+    return batch
+
+
+# Leituras de servidores existentes: servidores removidos depois do enfileiramento violariam a FK
+async def _rows_of_known_servers(rows: List[dict]) -> List[dict]:
+    known_ulids = await get_servers(row["server_ulid"] for row in rows)
+    return [row for row in rows if row["server_ulid"] in known_ulids]
+
+
+# Grava as leituras em uma transação. Retorna as leituras gravadas e, por servidor, o timestamp mais recente e o mais antigo.
+async def _write_rows(rows: List[dict]) -> Tuple[List[dict], Dict[str, datetime], Dict[str, datetime]]:
+    # Uma leitura por (server_ulid, timestamp), a mais recente do stream: como no modo síncrono, vale a última escrita
+    valid_rows = list({(row["server_ulid"], row["timestamp"]): row for row in rows}.values())
+
+    last_seen: Dict[str, datetime] = {}
+    oldest: Dict[str, datetime] = {}
+    for row in valid_rows:
+        server_ulid, timestamp = row["server_ulid"], row["timestamp"]
+        last_seen[server_ulid] = max(timestamp, last_seen.get(server_ulid, timestamp))
+        oldest[server_ulid] = min(timestamp, oldest.get(server_ulid, timestamp))
+
+    if valid_rows:
+        async with AsyncSessionLocal() as db:
+            await db.execute(upsert_readings(), valid_rows)
+            await mark_late_readings(db, valid_rows)
+            await touch_last_seen(db, last_seen)
+            await db.commit()
+    return valid_rows, last_seen, oldest
+
+
+# Grava o lote em uma transação e só então confirma (XACK) e remove as entradas do stream
+async def flush_batch(batch: List[Tuple[str, dict]]) -> int:
+    if not batch:
+        return 0
+
+    started = time.perf_counter()
+    rows = [row for _, row in batch]
+
+    known_rows = await _rows_of_known_servers(rows)
+    try:
+        valid_rows, last_seen, oldest = await _write_rows(known_rows)
+    except IntegrityError:
+        # Servidor removido e ainda presente no registro: descarta as entradas desatualizadas, revalida os
+        # servidores do lote no banco e grava sem as leituras dos removidos (senão o lote falharia para sempre)
+        await forget_servers(*{row["server_ulid"] for row in known_rows})
+        known_rows = await _rows_of_known_servers(rows)
+        valid_rows, last_seen, oldest = await _write_rows(known_rows)
+
+    await invalidate_servers(oldest)
+    await report_activity(last_seen)
+
+    entry_ids = [entry_id for entry_id, _ in batch]
+    redis_conn = await get_redis()
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.xack(INGEST_STREAM, INGEST_GROUP, *entry_ids)
+        pipe.xdel(INGEST_STREAM, *entry_ids)
+        await pipe.execute()
+
+    consumer_stats["rows_flushed"] += len(valid_rows)
+    INGEST_ROWS_WRITTEN.inc(len(valid_rows))
+    consumer_stats["rows_dropped"] += len(rows) - len(known_rows)
+    consumer_stats["flushes"] += 1
+    consumer_stats["last_flush_at"] = datetime.utcnow()
+    consumer_stats["last_flush_seconds"] = time.perf_counter() - started
+    return len(valid_rows)
+
+
+# Uma rodada do consumidor: lê um lote e grava
+async def flush_once() -> int:
+    await ensure_consumer_group()
+    return await flush_batch(await _read_batch())
+
+
+# Loop do consumidor: iniciado no lifespan (modo "buffered") ou por `python -m app.jobs.flush_ingest_buffer`.
+# Em caso de falha ao gravar, as entradas ficam pendentes e são reassumidas após INGEST_CLAIM_IDLE.
+async def consume_forever():
+    await ensure_consumer_group()
+    while True:
+        await flush_batch(await _read_batch())
+
+
+# -------------------------------
+# 🔹 Métricas de atraso do buffer
+# -------------------------------
+
+def _entry_time(entry_id: str) -> datetime:
+    return datetime.utcfromtimestamp(int(entry_id.split("-", 1)[0]) / 1000)
+
+async def buffer_stats() -> dict:
+    redis_conn = await get_redis()
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.xlen(INGEST_STREAM)
+        pipe.xrange(INGEST_STREAM, count=1)
+        pipe.xpending(INGEST_STREAM, INGEST_GROUP)
+        length, oldest, pending = await pipe.execute(raise_on_error=False)
+
+    if isinstance(length, Exception):
+        length = 0
+    oldest_at: Optional[datetime] = _entry_time(oldest[0][0]) if isinstance(oldest, list) and oldest else None
+    pending_count = pending["pending"] if isinstance(pending, dict) else 0
+
+    return {
+        "mode": INGEST_MODE,
+        "buffered": length,
+        "pending": pending_count,
+        "max_length": INGEST_BUFFER_MAX_LEN,
+        # Atraso: idade da leitura mais antiga ainda não gravada no PostgreSQL
+        "lag_seconds": (datetime.utcnow() - oldest_at).total_seconds() if oldest_at else 0.0,
+        "consumer": dict(consumer_stats, name=CONSUMER_NAME),
+    }
@@ -0,0 +1,93 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Logs estruturados da aplicação
+# Nível mínimo registrado (DEBUG em desenvolvimento; em produção, mensagens de debug nem chegam a ser formatadas)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Formato da saída: "json" (uma linha por evento, para agregadores de log) ou "text" (leitura no terminal)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Atributos padrão de um LogRecord; os demais vieram de `extra=` e entram como campos do evento
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada evento como um objeto JSON em uma linha, com os campos passados em `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exception"] = record.exc_text
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enfileira o evento com a mensagem já resolvida, mantendo a exceção num campo à parte."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(stream=None):
+    """
+    Configura o logger `app` uma única vez por processo (`stream`: destino dos logs, stdout por padrão).
+    - Quem loga só enfileira o evento (QueueHandler); a escrita em stdout acontece numa thread
+      à parte (QueueListener), então um stdout lento nunca bloqueia o event loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(
+        JsonFormatter() if LOG_FORMAT == "json"
+        else logging.Formatter("%(asctime)s %(levelname)s %(name)s - %(message)s")
+    )
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    handler = _QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter())
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Esvazia a fila antes de o processo terminar
+    atexit.register(_listener.stop)
+
+
+# Logger de um módulo (use `get_logger(__name__)`; scripts rodados com `python -m` passam o nome do módulo,
+# já que lá __name__ é "__main__"). Mensagens com argumentos %-style só são formatadas se o nível estiver
+# habilitado: `logger.debug("Servidores: %d", total)`.
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(name)
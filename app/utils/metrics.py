@@ -0,0 +1,200 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from app.utils.profiling import current_profile, record_redis, record_sql
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Métricas Prometheus expostas em `GET /metrics`
+# Registra as métricas por requisição (latência, banco, Redis) no middleware da aplicação
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Rótulos limitados: rota pelo template (`/health/{server_ulid}`, nunca o caminho real), método e classe do status
+UNMATCHED_ROUTE = "unmatched"
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being processed (includes open streams)")
+
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Duration of each SQL statement", buckets=LATENCY_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ["route"], buckets=COUNT_BUCKETS,
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per HTTP request", ["route"], buckets=LATENCY_BUCKETS,
+)
+
+REDIS_ROUND_TRIPS = Counter("redis_round_trips", "Redis round trips (a pipeline counts as one)")
+REDIS_ROUND_TRIPS_PER_REQUEST = Histogram(
+    "redis_round_trips_per_request", "Redis round trips per HTTP request", ["route"], buckets=COUNT_BUCKETS,
+)
+
+# Leituras de sensores: "written" gravadas em sensor_data, "buffered" aceitas no buffer (INGEST_MODE=buffered)
+INGEST_ROWS = Counter("ingest_rows", "Sensor readings ingested", ["stage"])
+INGEST_ROWS_WRITTEN = INGEST_ROWS.labels("written")
+INGEST_ROWS_BUFFERED = INGEST_ROWS.labels("buffered")
+
+
+class RequestStats:
+    """Contadores da requisição em andamento, acumulados pelos eventos do banco e do Redis."""
+
+    __slots__ = ("db_queries", "db_time", "redis_round_trips")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.redis_round_trips = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Séries já rotuladas por (método, rota, status): `labels()` custa mais que a própria observação
+_request_series: Dict[Tuple[str, str, str], tuple] = {}
+
+
+def _series(method: str, route: str, status: str) -> tuple:
+    key = (method, route, status)
+    series = _request_series.get(key)
+    if series is None:
+        series = _request_series[key] = (
+            REQUEST_LATENCY.labels(method, route, status),
+            DB_QUERIES_PER_REQUEST.labels(route),
+            DB_TIME_PER_REQUEST.labels(route),
+            REDIS_ROUND_TRIPS_PER_REQUEST.labels(route),
+        )
+    return series
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (sem BaseHTTPMiddleware, que cria uma task por requisição): mede a latência por
+    template de rota e publica os contadores de banco e Redis acumulados durante a requisição.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.dec()
+            _request_stats.reset(token)
+
+            # O roteador grava a rota encontrada no próprio scope
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+            latency, db_queries, db_time, redis_round_trips = _series(method, route, f"{status_code // 100}xx")
+            latency.observe(elapsed)
+            db_queries.observe(stats.db_queries)
+            db_time.observe(stats.db_time)
+            redis_round_trips.observe(stats.redis_round_trips)
+
+
+# -------------------------------
+# 🔹 Banco: eventos do SQLAlchemy
+# -------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += elapsed
+    record_sql(statement, elapsed)
+
+# Mede cada comando SQL do engine (para o engine assíncrono, passe `async_engine.sync_engine`)
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# -------------------------------
+# 🔹 Redis: idas e voltas e cache
+# -------------------------------
+
+# Subclasse da classe de conexão do pool que conta cada envio ao Redis (comando avulso ou pipeline inteiro)
+# e, em requisições perfiladas, mede a ida e volta até a primeira resposta
+def instrumented_connection_class(connection_class):
+    class InstrumentedConnection(connection_class):
+        _command_name = None
+        _sent_at = None
+
+        async def send_command(self, *args, **kwargs):
+            self._command_name = str(args[0]) if args else None
+            await super().send_command(*args, **kwargs)
+
+        async def send_packed_command(self, command, check_health: bool = True):
+            REDIS_ROUND_TRIPS.inc()
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.redis_round_trips += 1
+            self._sent_at = time.perf_counter() if current_profile() is not None else None
+            await super().send_packed_command(command, check_health)
+
+        async def read_response(self, *args, **kwargs):
+            response = await super().read_response(*args, **kwargs)
+            if self._sent_at is not None:
+                record_redis(self._command_name or "PIPELINE", time.perf_counter() - self._sent_at)
+                self._sent_at = self._command_name = None
+            return response
+
+    InstrumentedConnection.__name__ = f"Instrumented{connection_class.__name__}"
+    return InstrumentedConnection
+
+
+class CacheCollector:
+    """Expõe os contadores de acerto/erro do cache (`get_cache_stats`) no momento da coleta, sem custo por requisição."""
+
+    def __init__(self, get_stats: Callable[[], dict]):
+        self.get_stats = get_stats
+
+    def collect(self):
+        stats = self.get_stats()
+        requests = CounterMetricFamily("cache_requests", "Cache lookups by tier and result", labels=["tier", "result"])
+        for tier in ("l1", "l2"):
+            requests.add_metric([tier, "hit"], stats[tier]["hits"])
+            requests.add_metric([tier, "miss"], stats[tier]["misses"])
+        yield requests
+        yield CounterMetricFamily("cache_l1_evictions", "L1 cache evictions", value=stats["l1"]["evictions"])
+        yield GaugeMetricFamily("cache_l1_entries", "Entries in the L1 cache", value=stats["l1"]["size"])
+
+
+def register_cache_collector(get_stats: Callable[[], dict]):
+    REGISTRY.register(CacheCollector(get_stats))
@@ -0,0 +1,233 @@
+import asyncio
+import math
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import select
+from app.database import AsyncSessionLocal
+from app.models import Server
+from app.utils.cache import get_redis
+from app.utils.health_events import (
+    ACTIVITY_STREAM, OFFLINE_THRESHOLD, epoch, publish_transitions, write_statuses
+)
+from app.utils.server_registry import get_servers
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Detector de servidores offline
+# Mantém o prazo de cada servidor (última leitura + limite) numa roda de timers e publica as transições
+# online/offline. Roda em um único processo por vez (lease no Redis); os demais workers ficam de reserva.
+
+# Resolução da roda: prazos são arredondados para cima em ticks de OFFLINE_DETECTOR_TICK segundos
+OFFLINE_DETECTOR_TICK = float(os.getenv("OFFLINE_DETECTOR_TICK", "1"))
+# Slots da roda (uma volta = slots x tick); prazos além de uma volta esperam a volta seguinte no mesmo slot
+OFFLINE_DETECTOR_SLOTS = int(os.getenv("OFFLINE_DETECTOR_SLOTS", "4096"))
+# Inicia o detector no lifespan da aplicação (desative para rodá-lo à parte)
+OFFLINE_DETECTOR_ENABLED = os.getenv("OFFLINE_DETECTOR_ENABLED", "true").lower() == "true"
+
+LEADER_KEY = "health:detector:leader"
+LEADER_LEASE = 10.0  # segundos; renovado a cada volta do loop
+ACTIVITY_BATCH_SIZE = 10000
+BOOTSTRAP_CHUNK_SIZE = 10000
+
+ONLINE = "online"
+OFFLINE = "offline"
+
+# Renova (ou libera) o lease apenas se ele ainda pertence a este processo
+_RENEW_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class OfflineDetector:
+    """
+    Roda de timers (hashed timing wheel) com os prazos dos servidores online.
+
+    - Uma leitura custa O(1): só atualiza o prazo do servidor. A entrada na roda não é movida;
+      quando o slot antigo dispara, o servidor é reagendado para o prazo novo (no máximo uma vez
+      por período de limite, qualquer que seja a taxa de leituras).
+    - Cada tick processa um slot. Memória: uma entrada por servidor conhecido e uma na roda por servidor online.
+    """
+
+    def __init__(self, tick: float = OFFLINE_DETECTOR_TICK, slots: int = OFFLINE_DETECTOR_SLOTS,
+                 default_threshold: float = OFFLINE_THRESHOLD.total_seconds(), now: Optional[float] = None):
+        self.tick = tick
+        self.default_threshold = default_threshold
+        self._wheel: List[List[str]] = [[] for _ in range(slots)]
+        self._current = self._tick_of(time.time() if now is None else now)
+        self._deadlines: Dict[str, int] = {}  # servidor -> tick do prazo (só servidores online)
+        self._offline: Set[str] = set()
+        self._thresholds: Dict[str, float] = {}  # só limites diferentes do padrão
+        self._transitions: List[Tuple[str, str]] = []
+
+    def _tick_of(self, moment: float) -> int:
+        return math.floor(moment / self.tick)
+
+    def knows(self, server_ulid: str) -> bool:
+        return server_ulid in self._deadlines or server_ulid in self._offline or server_ulid in self._thresholds
+
+    def set_threshold(self, server_ulid: str, threshold: Optional[float]):
+        if threshold is None or threshold == self.default_threshold:
+            self._thresholds.pop(server_ulid, None)
+        else:
+            self._thresholds[server_ulid] = threshold
+
+    def _schedule(self, server_ulid: str, deadline: int):
+        self._wheel[deadline % len(self._wheel)].append(server_ulid)
+
+    # Leitura recebida: renova o prazo e, se o servidor estava offline, registra a transição para online
+    def record(self, server_ulid: str, last_seen: float, emit: bool = True) -> Optional[str]:
+        threshold = self._thresholds.get(server_ulid, self.default_threshold)
+        deadline = math.ceil((last_seen + threshold) / self.tick)
+        if deadline <= self._current:
+            # Leitura antiga demais para deixar o servidor online
+            if server_ulid not in self._deadlines and server_ulid not in self._offline:
+                self._offline.add(server_ulid)
+                if emit:
+                    self._transitions.append((server_ulid, OFFLINE))
+                return OFFLINE
+            return None
+
+        previous = self._deadlines.get(server_ulid)
+        if previous is not None:
+            if deadline > previous:
+                self._deadlines[server_ulid] = deadline
+            return None
+
+        self._deadlines[server_ulid] = deadline
+        self._offline.discard(server_ulid)
+        self._schedule(server_ulid, deadline)
+        if emit:
+            self._transitions.append((server_ulid, ONLINE))
+        return ONLINE
+
+    # Avança a roda até `now`, marcando como offline os servidores com prazo vencido
+    def advance(self, now: float):
+        target = self._tick_of(now)
+        # Uma volta completa já passa por todos os slots
+        ticks = min(target - self._current, len(self._wheel))
+        self._current = target
+        for step in range(ticks, 0, -1):
+            index = (target - step + 1) % len(self._wheel)
+            expiring, self._wheel[index] = self._wheel[index], []
+            for server_ulid in expiring:
+                deadline = self._deadlines.get(server_ulid)
+                if deadline is None:
+                    continue
+                if deadline > target:
+                    self._schedule(server_ulid, deadline)  # Prazo renovado depois do agendamento
+                    continue
+                del self._deadlines[server_ulid]
+                self._offline.add(server_ulid)
+                self._transitions.append((server_ulid, OFFLINE))
+
+    def drain_transitions(self) -> List[Tuple[str, str]]:
+        transitions, self._transitions = self._transitions, []
+        return transitions
+
+    def statuses(self) -> Dict[str, str]:
+        statuses = dict.fromkeys(self._offline, OFFLINE)
+        statuses.update(dict.fromkeys(self._deadlines, ONLINE))
+        return statuses
+
+
+# -------------------------------
+# 🔹 Execução: lease, carga inicial e consumo das leituras
+# -------------------------------
+
+# Renova o lease por mais LEADER_LEASE segundos; False se ele já pertence a outro processo
+async def _renew_lease(lease_token: str) -> bool:
+    redis_conn = await get_redis()
+    return bool(await redis_conn.eval(_RENEW_LEASE_SCRIPT, 1, LEADER_KEY, lease_token, int(LEADER_LEASE * 1000)))
+
+
+# Carrega o último contato e o limite de todos os servidores e grava o status inicial no Redis.
+# Retorna o id do stream de atividade a partir do qual continuar (capturado antes da consulta), ou None
+# se o lease foi perdido durante a carga: o lease é renovado a cada bloco e antes de gravar os status,
+# então uma carga mais longa que LEADER_LEASE nunca sobrescreve os status de outro detector.
+async def _bootstrap(detector: OfflineDetector, lease_token: str) -> Optional[str]:
+    redis_conn = await get_redis()
+    last_entry = await redis_conn.xrevrange(ACTIVITY_STREAM, count=1)
+    last_id = last_entry[0][0] if last_entry else "0-0"
+
+    query = (
+        select(Server.ulid, Server.last_seen_at, Server.offline_threshold_seconds)
+        .execution_options(yield_per=BOOTSTRAP_CHUNK_SIZE)
+    )
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            for server_ulid, last_seen_at, threshold in partition:
+                detector.set_threshold(server_ulid, threshold)
+                # Servidores que nunca enviaram leituras não têm prazo (status ausente -> online)
+                if last_seen_at is not None:
+                    detector.record(server_ulid, epoch(last_seen_at), emit=False)
+            if not await _renew_lease(lease_token):
+                return None
+
+    if not await _renew_lease(lease_token):
+        return None
+    await write_statuses(detector.statuses(), replace=True)
+    return last_id
+
+
+# Servidores criados depois da carga inicial: o limite vem do registro
+async def _load_thresholds(detector: OfflineDetector, server_ulids: Set[str]):
+    unknown = [server_ulid for server_ulid in server_ulids if not detector.knows(server_ulid)]
+    if unknown:
+        for server_ulid, info in (await get_servers(unknown)).items():
+            detector.set_threshold(server_ulid, info.offline_threshold)
+
+
+async def _run_detector(lease_token: str):
+    redis_conn = await get_redis()
+    detector = OfflineDetector()
+    last_id = await _bootstrap(detector, lease_token)
+    if last_id is None:
+        return  # Lease perdido durante a carga inicial
+
+    while True:
+        response = await redis_conn.xread(
+            {ACTIVITY_STREAM: last_id}, count=ACTIVITY_BATCH_SIZE, block=max(1, int(OFFLINE_DETECTOR_TICK * 1000))
+        )
+        activity: List[Tuple[str, float]] = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                activity += [(server_ulid, float(last_seen)) for server_ulid, last_seen in fields.items()]
+
+        await _load_thresholds(detector, {server_ulid for server_ulid, _ in activity})
+        for server_ulid, last_seen in activity:
+            detector.record(server_ulid, last_seen)
+        detector.advance(time.time())
+        await publish_transitions(detector.drain_transitions())
+
+        if not await _renew_lease(lease_token):
+            return  # Lease perdido (pausa longa): outro processo assumiu
+
+
+# Loop do detector: iniciado no lifespan (OFFLINE_DETECTOR_ENABLED) ou por `python -m app.jobs.offline_detector`.
+# Só o processo que detém o lease no Redis processa; os demais aguardam para assumir se ele cair.
+async def detect_forever():
+    redis_conn = await get_redis()
+    lease_token = uuid.uuid4().hex
+    while True:
+        if await redis_conn.set(LEADER_KEY, lease_token, nx=True, px=int(LEADER_LEASE * 1000)):
+            try:
+                await _run_detector(lease_token)
+            finally:
+                await redis_conn.eval(_RELEASE_LEASE_SCRIPT, 1, LEADER_KEY, lease_token)
+        await asyncio.sleep(LEADER_LEASE / 3)
+
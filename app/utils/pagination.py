@@ -0,0 +1,20 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+from fastapi import HTTPException
+
+
+# Cursor opaco para paginação por keyset em (timestamp, id).
+# O id é um ULID, ordenável e único, e desempata leituras com o mesmo timestamp.
+def encode_cursor(timestamp: datetime, reading_id: str) -> str:
+    raw = f"{timestamp.isoformat()}|{reading_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, reading_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), reading_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,136 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Configuração do particionamento de `sensor_data` por `timestamp`
+PARTITION_INTERVAL = os.getenv("SENSOR_DATA_PARTITION_INTERVAL", "month")  # "day" ou "month"
+PARTITIONS_AHEAD = int(os.getenv("SENSOR_DATA_PARTITIONS_AHEAD", "3"))  # Partições futuras criadas antecipadamente
+RETENTION_DAYS = int(os.getenv("SENSOR_DATA_RETENTION_DAYS", "0"))  # 0 = manter todo o histórico
+MAINTENANCE_INTERVAL = int(os.getenv("SENSOR_DATA_PARTITION_MAINTENANCE_INTERVAL", "3600"))  # segundos
+
+if PARTITION_INTERVAL not in ("day", "month"):
+    raise ValueError("SENSOR_DATA_PARTITION_INTERVAL must be 'day' or 'month'")
+
+PARENT_TABLE = "sensor_data"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+# Chave do advisory lock: evita que vários workers mantenham as partições ao mesmo tempo
+MAINTENANCE_LOCK_ID = 720_251_001
+
+_PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_p(\d{{6}}|\d{{8}})$")
+
+
+# Início e fim (exclusivo) da partição que contém `moment`
+def partition_bounds(moment: datetime, interval: str = PARTITION_INTERVAL) -> Tuple[datetime, datetime]:
+    if interval == "day":
+        start = datetime(moment.year, moment.month, moment.day)
+        return start, start + timedelta(days=1)
+
+    start = datetime(moment.year, moment.month, 1)
+    end = datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
+    return start, end
+
+# Nome da partição: sensor_data_p202610 (mensal) ou sensor_data_p20261018 (diária)
+def partition_name(start: datetime, interval: str = PARTITION_INTERVAL) -> str:
+    return f"{PARENT_TABLE}_p{start.strftime('%Y%m%d' if interval == 'day' else '%Y%m')}"
+
+# Intervalo coberto por uma partição criada por este módulo, a partir do nome
+def parse_partition_name(name: str) -> Optional[Tuple[datetime, datetime]]:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 8:
+        return partition_bounds(datetime.strptime(suffix, "%Y%m%d"), "day")
+    return partition_bounds(datetime.strptime(suffix, "%Y%m"), "month")
+
+
+def is_partitioned(connection: Connection) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).first() is not None
+
+def existing_partitions(connection: Connection) -> Dict[str, Tuple[datetime, datetime]]:
+    rows = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalars().all()
+    return {name: bounds for name in rows if (bounds := parse_partition_name(name))}
+
+
+# Cria a partição [start, end). Linhas que já caíram na partição default para esse
+# intervalo são movidas antes do ATTACH, que exige a default livre desse intervalo.
+def create_partition(connection: Connection, start: datetime, end: datetime, name: str):
+    bounds = {"start": start, "end": end}
+    connection.execute(text(
+        f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    connection.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    ))
+
+
+# Garante a partição default, a partição atual e as próximas `PARTITIONS_AHEAD`
+def ensure_partitions(connection: Connection, now: Optional[datetime] = None) -> list:
+    now = now or datetime.utcnow()
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+    ))
+
+    existing = existing_partitions(connection)
+    created = []
+    start, end = partition_bounds(now)
+
+    for _ in range(PARTITIONS_AHEAD + 1):
+        name = partition_name(start)
+        # Pula intervalos já cobertos (inclusive por partições de outro PARTITION_INTERVAL)
+        overlaps = any(start < other_end and other_start < end for other_start, other_end in existing.values())
+        if name not in existing and not overlaps:
+            create_partition(connection, start, end, name)
+            existing[name] = (start, end)
+            created.append(name)
+        start, end = partition_bounds(end)
+
+    return created
+
+
+# Remove partições inteiras fora da janela de retenção (DROP em vez de DELETE)
+def drop_expired_partitions(connection: Connection, now: Optional[datetime] = None) -> list:
+    if RETENTION_DAYS <= 0:
+        return []
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=RETENTION_DAYS)
+    dropped = []
+    for name, (_, end) in sorted(existing_partitions(connection).items()):
+        if end <= cutoff:
+            connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+
+    connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff})
+    return dropped
+
+
+# Manutenção completa: criação antecipada + retenção, em uma transação e com advisory lock
+def maintain_partitions(connection: Connection) -> Tuple[list, list]:
+    if not is_partitioned(connection):
+        return [], []
+
+    locked = connection.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID}).scalar()
+    if not locked:
+        return [], []
+
+    return ensure_partitions(connection), drop_expired_partitions(connection)
@@ -0,0 +1,226 @@
+import os
+import random
+import re
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import fastapi.routing
+import ulid
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Profiling por requisição (opt-in): SQL, Redis, cache, hash de senha e serialização de cada requisição perfilada
+# Perfila as requisições com o header `X-Profile: 1` e, por amostragem, uma fração das demais
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Perfis mantidos em memória por worker (os mais antigos são descartados)
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "200"))
+# Comandos SQL mais lentos que isso são destacados no perfil
+PROFILE_SLOW_QUERY_MS = float(os.getenv("PROFILE_SLOW_QUERY_MS", "100"))
+# Comandos com o mesmo formato repetidos a partir dessa quantidade são candidatos a N+1
+PROFILE_N_PLUS_ONE_THRESHOLD = int(os.getenv("PROFILE_N_PLUS_ONE_THRESHOLD", "5"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+# Limite de eventos guardados por perfil (uma requisição patológica não ocupa memória sem limite)
+MAX_EVENTS_PER_PROFILE = 1000
+
+# Formato do comando: literais e parâmetros viram `?` e listas de parâmetros viram `(?)`
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETERS = re.compile(r"\$\d+|%\(\w+\)s|%s")
+_PARAMETER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _PARAMETERS.sub("?", _LITERALS.sub("?", statement))
+    return _WHITESPACE.sub(" ", _PARAMETER_LISTS.sub("(?)", shape)).strip()
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class RequestProfile:
+    """Eventos de uma requisição perfilada; o relatório só é montado quando consultado."""
+
+    __slots__ = ("id", "method", "path", "route", "trigger", "started_at", "status", "duration",
+                 "sql", "redis", "cache", "spans", "dropped_events")
+
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = str(ulid.new())
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self.status: Optional[int] = None
+        self.duration = 0.0
+        self.sql: List[Tuple[str, float]] = []
+        self.redis: List[Tuple[str, float]] = []
+        self.cache: List[Tuple[str, str]] = []
+        self.spans: Dict[str, float] = {}
+        self.dropped_events = 0
+
+    def _append(self, events: list, event: tuple):
+        if len(events) < MAX_EVENTS_PER_PROFILE:
+            events.append(event)
+        else:
+            self.dropped_events += 1
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "status": self.status,
+            "duration_ms": _ms(self.duration),
+            "sql_count": len(self.sql),
+            "sql_ms": _ms(sum(duration for _, duration in self.sql)),
+            "redis_round_trips": len(self.redis),
+            "redis_ms": _ms(sum(duration for _, duration in self.redis)),
+            "n_plus_one": bool(self.n_plus_one_candidates()),
+        }
+
+    def n_plus_one_candidates(self) -> List[dict]:
+        shapes = Counter(statement_shape(statement) for statement, _ in self.sql)
+        totals: Dict[str, float] = {}
+        for statement, duration in self.sql:
+            shape = statement_shape(statement)
+            if shapes[shape] >= PROFILE_N_PLUS_ONE_THRESHOLD:
+                totals[shape] = totals.get(shape, 0.0) + duration
+        return [
+            {"shape": shape, "count": shapes[shape], "total_ms": _ms(total)}
+            for shape, total in sorted(totals.items(), key=lambda item: -shapes[item[0]])
+        ]
+
+    def report(self) -> dict:
+        slow_threshold = PROFILE_SLOW_QUERY_MS / 1000
+        return dict(
+            self.summary(),
+            spans={name: _ms(duration) for name, duration in self.spans.items()},
+            sql=[{"statement": statement, "duration_ms": _ms(duration)} for statement, duration in self.sql],
+            slow_queries=[
+                {"statement": statement, "duration_ms": _ms(duration)}
+                for statement, duration in self.sql if duration >= slow_threshold
+            ],
+            n_plus_one_candidates=self.n_plus_one_candidates(),
+            redis=[{"command": command, "duration_ms": _ms(duration)} for command, duration in self.redis],
+            cache=[{"key": key, "result": result} for key, result in self.cache],
+            dropped_events=self.dropped_events,
+        )
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+# Perfis recentes deste worker (anel: os mais antigos saem quando chega um novo)
+_profiles: Deque[RequestProfile] = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+def recent_profiles() -> List[RequestProfile]:
+    return list(reversed(_profiles))
+
+def find_profile(profile_id: str) -> Optional[RequestProfile]:
+    return next((profile for profile in _profiles if profile.id == profile_id), None)
+
+
+# -------------------------------
+# 🔹 Registro de eventos (sem custo fora de uma requisição perfilada)
+# -------------------------------
+
+def record_sql(statement: str, duration: float):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile._append(profile.sql, (statement, duration))
+
+def record_redis(command: str, duration: float):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile._append(profile.redis, (command, duration))
+
+# `result`: "l1_hit", "l2_hit" ou "miss"
+def record_cache_lookup(key: str, result: str):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile._append(profile.cache, (key, result))
+
+# Soma o tempo do bloco no trecho `name` do perfil (ex.: "serialization", "password_hash")
+@contextmanager
+def profile_span(name: str):
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] = profile.spans.get(name, 0.0) + time.perf_counter() - started
+
+
+# Mede a validação/serialização do `response_model` feita pelo FastAPI (Pydantic + jsonable_encoder)
+def instrument_response_serialization():
+    serialize_response = fastapi.routing.serialize_response
+    if getattr(serialize_response, "profiled", False):
+        return
+
+    async def profiled_serialize_response(**kwargs):
+        with profile_span("serialization"):
+            return await serialize_response(**kwargs)
+
+    profiled_serialize_response.profiled = True
+    fastapi.routing.serialize_response = profiled_serialize_response
+
+
+def _should_profile(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return "header" if value in (b"1", b"true") else None
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: perfila as requisições com `X-Profile: 1` ou sorteadas por PROFILE_SAMPLE_RATE,
+    responde com `X-Profile-Id` e guarda o perfil no anel consultado por `GET /admin/profiles`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        trigger = _should_profile(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], trigger)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = dict(message, headers=[*message.get("headers", []), (PROFILE_ID_HEADER, profile.id.encode())])
+            await send(message)
+
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - started
+            _current_profile.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            _profiles.append(profile)
@@ -0,0 +1,288 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete, func, not_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import (
+    METRICS, SensorData, SensorDataRollupMinute, SensorDataRollupHour, SensorDataRollupDay, RollupWatermark,
+    RollupDirtyBucket
+)
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Configuração da atualização dos rollups
+REFRESH_INTERVAL = int(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))  # segundos
+# Janela recalculada antes do watermark, para absorver leituras que chegam atrasadas
+LATE_DATA_WINDOW = timedelta(seconds=int(os.getenv("ROLLUP_LATE_DATA_WINDOW", "300")))
+
+GRANULARITIES = ("minute", "hour", "day")
+BUCKET_WIDTHS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+ROLLUP_MODELS = {
+    "minute": SensorDataRollupMinute,
+    "hour": SensorDataRollupHour,
+    "day": SensorDataRollupDay,
+}
+
+# Cada nível é consolidado a partir do nível anterior (bruto -> minuto -> hora -> dia)
+ROLLUP_SOURCES = {"minute": None, "hour": "minute", "day": "hour"}
+
+STATS = ("count", "sum", "min", "max")
+VALUE_COLUMNS = ["count"] + [f"{metric}_{stat}" for metric in METRICS for stat in STATS]
+
+# Chave do advisory lock: evita que vários workers atualizem os rollups ao mesmo tempo
+REFRESH_LOCK_ID = 720_251_002
+
+
+# Início do bucket que contém `moment` (equivalente ao date_trunc do PostgreSQL)
+def truncate(moment: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+# Início do primeiro bucket que começa em `moment` ou depois
+def ceil_bucket(moment: datetime, granularity: str) -> datetime:
+    start = truncate(moment, granularity)
+    if start == moment:
+        return start
+    return start + BUCKET_WIDTHS[granularity]
+
+
+# -------------------------------
+# 🔹 Atualização incremental (job em segundo plano)
+# -------------------------------
+
+def _aggregate_columns(granularity: str):
+    source = ROLLUP_SOURCES[granularity]
+
+    if source is None:
+        table = SensorData.__table__
+        timestamp = table.c.timestamp
+        columns = [func.count().label("count")]
+        for metric in METRICS:
+            column = table.c[metric]
+            columns += [
+                func.count(column).label(f"{metric}_count"),
+                func.sum(column).label(f"{metric}_sum"),
+                func.min(column).label(f"{metric}_min"),
+                func.max(column).label(f"{metric}_max"),
+            ]
+    else:
+        table = ROLLUP_MODELS[source].__table__
+        timestamp = table.c.bucket
+        columns = [func.sum(table.c["count"]).label("count")]
+        for metric in METRICS:
+            columns += [
+                func.sum(table.c[f"{metric}_count"]).label(f"{metric}_count"),
+                func.sum(table.c[f"{metric}_sum"]).label(f"{metric}_sum"),
+                func.min(table.c[f"{metric}_min"]).label(f"{metric}_min"),
+                func.max(table.c[f"{metric}_max"]).label(f"{metric}_max"),
+            ]
+
+    return table, timestamp, columns
+
+
+def _get_watermark(connection: Connection, granularity: str) -> Optional[datetime]:
+    return connection.execute(
+        select(RollupWatermark.refreshed_until).where(RollupWatermark.granularity == granularity)
+    ).scalar()
+
+def _set_watermark(connection: Connection, granularity: str, refreshed_until: datetime):
+    stmt = pg_insert(RollupWatermark.__table__).values(granularity=granularity, refreshed_until=refreshed_until)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=["granularity"], set_={"refreshed_until": stmt.excluded.refreshed_until}
+    ))
+
+
+# Recalcula os buckets de [watermark - janela de atraso, cutoff) e avança o watermark.
+# Os buckets são substituídos (não somados), então recalcular uma janela é idempotente.
+def refresh_rollup(connection: Connection, granularity: str, now: datetime) -> Optional[Tuple[datetime, datetime]]:
+    table, timestamp, columns = _aggregate_columns(granularity)
+    source = ROLLUP_SOURCES[granularity]
+
+    # Buckets fechados; níveis superiores não passam do watermark do nível de origem
+    cutoff = truncate(now, granularity)
+    if source is not None:
+        source_watermark = _get_watermark(connection, source)
+        if source_watermark is None:
+            return None
+        cutoff = min(cutoff, truncate(source_watermark, granularity))
+
+    watermark = _get_watermark(connection, granularity)
+    if watermark is None:
+        first = connection.execute(select(func.min(timestamp))).scalar()
+        if first is None:
+            return None
+        start = truncate(first, granularity)
+    else:
+        start = truncate(watermark - LATE_DATA_WINDOW, granularity)
+
+    if start >= cutoff:
+        return None
+
+    _upsert_buckets(connection, granularity, timestamp >= start, timestamp < cutoff)
+    _set_watermark(connection, granularity, max(cutoff, watermark or cutoff))
+    return start, cutoff
+
+
+# Agrega as linhas de origem que atendem `conditions` e substitui os buckets correspondentes
+def _upsert_buckets(connection: Connection, granularity: str, *conditions):
+    table, timestamp, columns = _aggregate_columns(granularity)
+    bucket = func.date_trunc(granularity, timestamp)
+    aggregated = (
+        select(table.c.server_ulid, bucket.label("bucket"), *columns)
+        .where(*conditions)
+        .group_by(table.c.server_ulid, bucket)
+    )
+
+    target = ROLLUP_MODELS[granularity].__table__
+    stmt = pg_insert(target).from_select(["server_ulid", "bucket"] + VALUE_COLUMNS, aggregated)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=["server_ulid", "bucket"],
+        set_={column: stmt.excluded[column] for column in VALUE_COLUMNS},
+    ))
+
+
+# Recalcula os buckets de `granularity` que contêm minutos marcados como sujos. Buckets a partir do
+# watermark ficam para a atualização incremental, que ainda vai passar por eles.
+def refresh_dirty_buckets(connection: Connection, granularity: str, dirty: Iterable[Tuple[str, datetime]]) -> int:
+    watermark = _get_watermark(connection, granularity)
+    if watermark is None:
+        return 0
+
+    table, timestamp, _ = _aggregate_columns(granularity)
+    width = BUCKET_WIDTHS[granularity]
+    buckets = {(server_ulid, truncate(minute, granularity)) for server_ulid, minute in dirty}
+    refreshed = 0
+    for server_ulid, start in sorted(buckets):
+        if start >= watermark:
+            continue
+        _upsert_buckets(
+            connection, granularity,
+            table.c.server_ulid == server_ulid, timestamp >= start, timestamp < start + width,
+        )
+        refreshed += 1
+    return refreshed
+
+
+# Atualiza minuto, hora e dia, nessa ordem, em uma transação e com advisory lock.
+# Os minutos marcados por `mark_late_readings` são recalculados em cada nível e a marcação é removida.
+# Retorna a janela recalculada de cada nível e os servidores com buckets sujos recalculados
+# (as consultas em cache desses servidores devem ser invalidadas depois do commit).
+def refresh_rollups(connection: Connection, now: Optional[datetime] = None
+                    ) -> Tuple[Dict[str, Optional[Tuple[datetime, datetime]]], Set[str]]:
+    locked = connection.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": REFRESH_LOCK_ID}).scalar()
+    if not locked:
+        return {}, set()
+
+    now = now or datetime.utcnow()
+    dirty_table = RollupDirtyBucket.__table__
+    dirty = connection.execute(delete(dirty_table).returning(dirty_table.c.server_ulid, dirty_table.c.bucket)).all()
+
+    windows = {}
+    for granularity in GRANULARITIES:
+        windows[granularity] = refresh_rollup(connection, granularity, now)
+        refresh_dirty_buckets(connection, granularity, dirty)
+    return windows, {server_ulid for server_ulid, _ in dirty}
+
+
+# Marca os minutos das leituras gravadas depois da janela de atraso para serem recalculados em todos os níveis
+# (`refresh_rollups`), na mesma transação da escrita. O watermark nunca passa do relógio, então uma leitura
+# ainda dentro da janela (`LATE_DATA_WINDOW` antes de agora) será coberta pela atualização incremental.
+async def mark_late_readings(db: AsyncSession, rows: Iterable[Mapping]):
+    threshold = datetime.utcnow() - LATE_DATA_WINDOW
+    buckets: Set[Tuple[str, datetime]] = {
+        (row["server_ulid"], truncate(row["timestamp"], "minute")) for row in rows if row["timestamp"] < threshold
+    }
+    if buckets:
+        await db.execute(
+            pg_insert(RollupDirtyBucket.__table__).on_conflict_do_nothing(),
+            [{"server_ulid": server_ulid, "bucket": bucket} for server_ulid, bucket in buckets],
+        )
+
+
+# -------------------------------
+# 🔹 Consulta: rollups consolidados + "cauda" de dados brutos
+# -------------------------------
+
+class AggregatedBucket:
+    """Bucket agregado, combinando count/sum/min/max por métrica."""
+
+    __slots__ = ("server_ulid", "timestamp", "count", "stats")
+
+    def __init__(self, values: Mapping):
+        self.server_ulid = values["server_ulid"]
+        self.timestamp = values["bucket"]
+        self.count = values["count"]
+        self.stats = {
+            metric: {stat: values[f"{metric}_{stat}"] for stat in STATS} for metric in METRICS
+        }
+
+    def average(self, metric: str) -> Optional[float]:
+        stats = self.stats[metric]
+        return stats["sum"] / stats["count"] if stats["count"] else None
+
+
+async def fetch_aggregates(
+    db: AsyncSession,
+    granularity: str,
+    server_ulid: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> List[AggregatedBucket]:
+    """
+    Agrega as leituras em buckets de `granularity`.
+    - Buckets inteiramente dentro do intervalo e anteriores ao watermark vêm da tabela de rollup.
+    - O restante (bordas do intervalo e a cauda após o watermark) é agregado a partir de `sensor_data`.
+    """
+    # Mesma regra de `GET /data`: o filtro de tempo só vale com início e fim informados
+    if not (start_time and end_time):
+        start_time = end_time = None
+
+    rollup = ROLLUP_MODELS[granularity]
+    result = await db.execute(
+        select(RollupWatermark.refreshed_until).where(RollupWatermark.granularity == granularity)
+    )
+    watermark = result.scalar()
+
+    # Intervalo [low, high) de buckets servidos pelo rollup
+    low = ceil_bucket(start_time, granularity) if start_time else None
+    high = watermark
+    if high is not None and end_time:
+        high = min(high, truncate(end_time, granularity))
+    use_rollup = high is not None and (low is None or low < high)
+
+    buckets = []
+
+    if use_rollup:
+        query = select(*rollup.__table__.columns).where(rollup.bucket < high)
+        if low is not None:
+            query = query.where(rollup.bucket >= low)
+        if server_ulid:
+            query = query.where(rollup.server_ulid == server_ulid)
+        result = await db.execute(query)
+        buckets += [AggregatedBucket(row) for row in result.mappings().all()]
+
+    _, timestamp, columns = _aggregate_columns("minute")
+    bucket = func.date_trunc(granularity, timestamp)
+    query = select(SensorData.server_ulid, bucket.label("bucket"), *columns).group_by(SensorData.server_ulid, bucket)
+    if server_ulid:
+        query = query.where(SensorData.server_ulid == server_ulid)
+    if start_time:
+        query = query.where(SensorData.timestamp.between(start_time, end_time))
+    if use_rollup:
+        covered = SensorData.timestamp < high
+        if low is not None:
+            covered = and_(SensorData.timestamp >= low, covered)
+        query = query.where(not_(covered))
+    result = await db.execute(query)
+    buckets += [AggregatedBucket(row) for row in result.mappings().all()]
+
+    buckets.sort(key=lambda item: (item.timestamp, item.server_ulid))
+    return buckets
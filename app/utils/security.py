@@ -1,21 +1,42 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+import asyncio
+import hmac
 import jwt as pyjwt
 import os
-from fastapi import Depends, HTTPException, status
+import uuid
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from app.database import AsyncSessionLocal
 from app.models import User
+from app.utils.cache import create_local_cache, get_cache_key, set_cache_key, invalidate_local
+from app.utils.profiling import profile_span
 
 # 🔹 Configuração do hash de senha
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Custo do bcrypt (2^rounds iterações). Hashes com outro custo são regravados no próximo login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Pool dedicado ao bcrypt: a biblioteca libera o GIL durante o hash, então threads bastam
+# e o event loop continua atendendo as outras rotas durante uma onda de logins.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Operações aguardando uma thread livre; acima disso a requisição recebe 503 em vez de enfileirar
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_tasks_pending = 0
 
 # 🔹 Configuração do JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "mysecret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# 🔹 Token das rotas administrativas (`/admin/...`, `/cache/set` e `/cache/get`); sem ele configurado, essas rotas respondem 403
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 # 🔐 Função que gera hash da senha
 def hash_password(password: str):
     return pwd_context.hash(password)   
@@ -24,6 +45,33 @@ def hash_password(password: str):
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)  
 
+# Executa a operação de senha no pool dedicado, recusando com 503 quando a fila está cheia
+async def _run_password_task(fn: Callable, *args):
+    global _password_tasks_pending
+    if _password_tasks_pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    _password_tasks_pending += 1
+    try:
+        # Inclui a espera por uma thread livre: é o tempo que a requisição perde com o bcrypt
+        with profile_span("password_hash"):
+            return await asyncio.get_running_loop().run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_tasks_pending -= 1
+
+# 🔐 Gera o hash da senha fora do event loop
+async def hash_password_async(password: str) -> str:
+    return await _run_password_task(hash_password, password)
+
+# 🔐 Verifica a senha fora do event loop. Retorna também o novo hash quando o atual
+# usa outro custo (BCRYPT_ROUNDS mudou) e deve ser regravado.
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run_password_task(pwd_context.verify_and_update, plain_password, hashed_password)
+
 # 🔑 Função que gera o token JWT
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -31,33 +79,111 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return pyjwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# 🔑 Token de acesso do usuário: `sub` é o id do usuário; `jti` identifica o token para revogação
+def create_user_access_token(user: User, expires_delta: timedelta = None):
+    return create_access_token(
+        {"sub": user.id, "username": user.username, "jti": uuid.uuid4().hex},
+        expires_delta=expires_delta,
+    )
+
 # 🔒 Configuração do esquema OAuth2 para autenticação por token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-# 🔍 Função para validar usuário autenticado
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """ Decodifica o token JWT e retorna o usuário autenticado """
-    try:
-        payload = pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
 
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
+# -------------------------------
+# 🔹 Usuário autenticado a partir das claims do token (sem consulta ao banco)
+# -------------------------------
+
+# Principais já validados ficam em memória por até PRINCIPAL_CACHE_TTL segundos (nunca além do `exp` do token)
+PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+principal_cache = create_local_cache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL)
+
+
+class Principal:
+    """Usuário autenticado, com as claims necessárias para autorização."""
+
+    __slots__ = ("id", "username", "jti", "expires_at")
+
+    def __init__(self, id: str, username: str, jti: Optional[str], expires_at: datetime):
+        self.id = id
+        self.username = username
+        self.jti = jti
+        self.expires_at = expires_at
 
-        user = db.query(User).filter(User.username == username).first()
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
 
-        return user  # Retorna o usuário autenticado
+def _principal_cache_key(jti: str) -> str:
+    return f"principal:{jti}"
 
+# Deny-list de tokens revogados no Redis; a chave expira junto com o token
+def _revoked_key(jti: str) -> str:
+    return f"revoked_jti:{jti}"
+
+
+# Revoga o token (logout): entra na deny-list e sai do cache de principais de todos os workers
+async def revoke_token(principal: Principal):
+    if principal.jti is None:
+        return  # Token legado, sem `jti`: expira sozinho em até ACCESS_TOKEN_EXPIRE_MINUTES
+    ttl = max(1, int((principal.expires_at - datetime.utcnow()).total_seconds()) + 1)
+    await set_cache_key(_revoked_key(principal.jti), "1", expire=ttl)
+    await invalidate_local(_principal_cache_key(principal.jti))
+
+
+# Tokens emitidos antes do `jti` têm o username em `sub`: mantém a busca no banco até expirarem
+async def _legacy_principal(username: str, expires_at: datetime) -> Principal:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id, User.username).where(User.username == username))
+        user = result.first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    return Principal(user.id, user.username, None, expires_at)
+
+
+# 🔍 Função para validar usuário autenticado
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Decodifica o token JWT e retorna o usuário autenticado.
+    - Caminho rápido: principal em cache (sem Redis nem SQL).
+    - Cache miss: consulta apenas a deny-list no Redis; o usuário vem das claims do token.
+    """
+    try:
+        payload = pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except pyjwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-
     except pyjwt.PyJWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    subject = payload.get("sub")
+    if subject is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+
+    expires_at = datetime.utcfromtimestamp(payload["exp"])
+    jti = payload.get("jti")
+    if jti is None:
+        return await _legacy_principal(subject, expires_at)
+
+    cache_key = _principal_cache_key(jti)
+    found, principal = principal_cache.get(cache_key)
+    if found:
+        return principal
+
+    if await get_cache_key(_revoked_key(jti)) is not None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+
+    principal = Principal(subject, payload.get("username"), jti, expires_at)
+    ttl = min(PRINCIPAL_CACHE_TTL, (expires_at - datetime.utcnow()).total_seconds())
+    principal_cache.set(cache_key, principal, ttl=ttl)
+    return principal
+
+
+# 🔐 Rotas administrativas: exige o header `X-Admin-Token` igual a ADMIN_TOKEN
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
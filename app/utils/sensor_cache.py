@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from app.utils.cache import get_cache_key, get_redis
+from app.utils.profiling import profile_span
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Cache de leitura de `GET /data`
+# Versão do formato armazenado: mudar invalida todas as entradas antigas de uma vez
+CACHE_FORMAT_VERSION = "v2"
+
+# Janelas que incluem "agora" mudam a cada leitura: TTL curto
+OPEN_WINDOW_TTL = int(os.getenv("SENSOR_DATA_CACHE_TTL", "5"))
+# Janelas históricas fechadas só mudam com leituras atrasadas: TTL longo
+CLOSED_WINDOW_TTL = int(os.getenv("SENSOR_DATA_CLOSED_WINDOW_CACHE_TTL", "86400"))
+# Uma janela é considerada fechada quando termina antes de `agora - CLOSED_WINDOW_GRACE`
+CLOSED_WINDOW_GRACE = timedelta(seconds=int(os.getenv("SENSOR_DATA_CLOSED_WINDOW_GRACE", "60")))
+
+ALL_SERVERS = "*"
+
+
+# Contadores de geração por servidor. As chaves de consulta incluem a geração atual,
+# então incrementar o contador invalida todas as consultas do servidor sem varrer chaves.
+# - "live": incrementado a cada ingestão (janelas abertas)
+# - "hist": incrementado só por leituras atrasadas, anteriores a agora - CLOSED_WINDOW_GRACE (janelas fechadas)
+def _generation_key(scope: str, server_ulid: str) -> str:
+    return f"sensor_data_gen:{scope}:{server_ulid}"
+
+def is_closed_window(start_time: Optional[datetime], end_time: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    # Mesma regra de `GET /data`: o filtro de tempo só vale com início e fim informados
+    return bool(start_time and end_time) and end_time <= (now or datetime.utcnow()) - CLOSED_WINDOW_GRACE
+
+
+# Monta a chave de cache de uma consulta e o TTL adequado à janela
+async def query_cache_key(server_ulid: Optional[str], start_time: Optional[datetime], end_time: Optional[datetime],
+                          *params) -> Tuple[str, int]:
+    closed = is_closed_window(start_time, end_time)
+    scope = "hist" if closed else "live"
+    server = server_ulid or ALL_SERVERS
+    generation = await get_cache_key(_generation_key(scope, server)) or "0"
+
+    key = ":".join(str(part) for part in (
+        "sensor_data", CACHE_FORMAT_VERSION, server, f"{scope}{generation}", start_time, end_time, *params
+    ))
+    return key, CLOSED_WINDOW_TTL if closed else OPEN_WINDOW_TTL
+
+
+# Invalida as consultas dos servidores que receberam leituras (uma ida ao Redis).
+# `oldest_by_server` mapeia cada servidor para o timestamp mais antigo recebido.
+async def invalidate_servers(oldest_by_server: Dict[str, datetime]):
+    if not oldest_by_server:
+        return
+
+    late_threshold = datetime.utcnow() - CLOSED_WINDOW_GRACE
+    late = any(timestamp < late_threshold for timestamp in oldest_by_server.values())
+
+    redis_conn = await get_redis()
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for server in list(oldest_by_server) + [ALL_SERVERS]:
+            pipe.incr(_generation_key("live", server))
+        for server, timestamp in oldest_by_server.items():
+            if timestamp < late_threshold:
+                pipe.incr(_generation_key("hist", server))
+        if late:
+            pipe.incr(_generation_key("hist", ALL_SERVERS))
+        await pipe.execute()
+
+
+# Invalida todas as consultas (janelas abertas e fechadas) dos servidores cujos rollups foram recalculados
+# por leituras atrasadas: uma agregação pedida entre a ingestão e o recálculo veio do rollup antigo.
+async def invalidate_rollup_servers(server_ulids: Iterable[str]):
+    server_ulids = list(server_ulids)
+    if not server_ulids:
+        return
+
+    redis_conn = await get_redis()
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for server in server_ulids + [ALL_SERVERS]:
+            pipe.incr(_generation_key("live", server))
+            pipe.incr(_generation_key("hist", server))
+        await pipe.execute()
+
+
+# Serializa a resposta uma única vez: o mesmo corpo JSON é gravado no cache e devolvido ao cliente.
+# Formato armazenado: "<next_cursor>\n<corpo JSON>"
+# Com `exclude_unset`, campos não preenchidos dos modelos (ex.: estatísticas não pedidas) ficam fora do corpo.
+def serialize_page(items: List, next_cursor: Optional[str] = None, exclude_unset: bool = False) -> str:
+    with profile_span("serialization"):
+        return f"{next_cursor or ''}\n{json.dumps(jsonable_encoder(items, exclude_unset=exclude_unset))}"
+
+def cached_json_response(value: str) -> Response:
+    next_cursor, body = value.split("\n", 1)
+    return json_response(body, next_cursor or None)
+
+def json_response(body: str, next_cursor: Optional[str] = None) -> Response:
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,121 @@
+import json
+import os
+from typing import Dict, Iterable, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select
+from app.database import AsyncSessionLocal
+from app.models import Server
+from app.utils.cache import create_local_cache, get_redis, invalidate_local
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# 🔹 Registro de servidores: ULID -> (nome, dono, limite de offline)
+# Servidores mudam raramente: ingestão, saúde e consultas de dados verificam existência e
+# dono aqui, em memória, em vez de consultar `servers` a cada requisição.
+# Camadas: memória do worker -> hash no Redis (compartilhado) -> PostgreSQL.
+REGISTRY_KEY = "server_registry"
+SERVER_REGISTRY_MAX_ENTRIES = int(os.getenv("SERVER_REGISTRY_MAX_ENTRIES", "100000"))
+SERVER_REGISTRY_TTL = float(os.getenv("SERVER_REGISTRY_TTL", "300"))  # segundos; limita entradas obsoletas
+
+_servers = create_local_cache(SERVER_REGISTRY_MAX_ENTRIES, SERVER_REGISTRY_TTL)
+
+
+class ServerInfo:
+    """Dados do servidor usados para validar ingestão e autorização."""
+
+    __slots__ = ("ulid", "name", "user_id", "offline_threshold")
+
+    def __init__(self, ulid: str, name: str, user_id: str, offline_threshold: Optional[int] = None):
+        self.ulid = ulid
+        self.name = name
+        self.user_id = user_id
+        self.offline_threshold = offline_threshold  # segundos; None usa o limite padrão
+
+    def to_json(self) -> str:
+        return json.dumps({"name": self.name, "user_id": self.user_id, "offline_threshold": self.offline_threshold})
+
+    @classmethod
+    def from_json(cls, ulid: str, value: str) -> "ServerInfo":
+        data = json.loads(value)
+        return cls(ulid, data["name"], data["user_id"], data.get("offline_threshold"))
+
+    @classmethod
+    def from_row(cls, row) -> "ServerInfo":
+        return cls(row.ulid, row.name, row.user_id, row.offline_threshold_seconds)
+
+
+SERVER_INFO_COLUMNS = (Server.ulid, Server.name, Server.user_id, Server.offline_threshold_seconds)
+
+
+def _local_key(server_ulid: str) -> str:
+    return f"server:{server_ulid}"
+
+
+async def _store(servers: Iterable[ServerInfo]):
+    mapping = {}
+    for info in servers:
+        _servers.set(_local_key(info.ulid), info)
+        mapping[info.ulid] = info.to_json()
+    if mapping:
+        redis_conn = await get_redis()
+        await redis_conn.hset(REGISTRY_KEY, mapping=mapping)
+
+
+# Carrega todos os servidores na memória e no Redis (startup da aplicação)
+async def warm_registry() -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(*SERVER_INFO_COLUMNS))
+        servers = [ServerInfo.from_row(row) for row in result.all()]
+    await _store(servers)
+    return len(servers)
+
+
+# Busca vários servidores: memória, depois um HMGET no Redis e, só para o que faltar, uma consulta ao banco
+async def get_servers(server_ulids: Iterable[str]) -> Dict[str, ServerInfo]:
+    found = {}
+    missing = []
+    for server_ulid in set(server_ulids):
+        hit, info = _servers.get(_local_key(server_ulid))
+        if hit:
+            found[server_ulid] = info
+        else:
+            missing.append(server_ulid)
+
+    if missing:
+        redis_conn = await get_redis()
+        values = await redis_conn.hmget(REGISTRY_KEY, missing)
+        not_in_redis = []
+        for server_ulid, value in zip(missing, values):
+            if value is None:
+                not_in_redis.append(server_ulid)
+            else:
+                found[server_ulid] = ServerInfo.from_json(server_ulid, value)
+                _servers.set(_local_key(server_ulid), found[server_ulid])
+        missing = not_in_redis
+
+    if missing:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(*SERVER_INFO_COLUMNS).where(Server.ulid.in_(missing)))
+            loaded = [ServerInfo.from_row(row) for row in result.all()]
+        await _store(loaded)
+        found.update((info.ulid, info) for info in loaded)
+
+    return found
+
+async def get_server(server_ulid: str) -> Optional[ServerInfo]:
+    return (await get_servers([server_ulid])).get(server_ulid)
+
+
+# Servidor criado ou alterado: grava no Redis e descarta a cópia em memória dos outros workers
+async def register_server(info: ServerInfo):
+    await _store([info])
+    await invalidate_local(_local_key(info.ulid))
+
+# Servidor removido (ou registro desatualizado): sai do Redis e da memória de todos os workers
+async def forget_servers(*server_ulids: str):
+    if not server_ulids:
+        return
+    redis_conn = await get_redis()
+    await redis_conn.hdel(REGISTRY_KEY, *server_ulids)
+    await invalidate_local(*(_local_key(server_ulid) for server_ulid in server_ulids))
@@ -0,0 +1,69 @@
+"""
+Benchmark da autenticação por request: compara a vazão de `get_current_user` com
+- token legado (`sub` = username): uma consulta ao banco por request (comportamento anterior);
+- token atual sem cache (principal descartado a cada chamada): só a deny-list no Redis;
+- token atual com o principal em cache: sem Redis e sem SQL.
+
+Cria um usuário no banco apontado por DATABASE_URL (Redis em REDIS_URL) e o apaga ao final.
+
+Uso:
+    python benchmarks/bench_auth.py --requests 20000 --concurrency 100
+"""
+import argparse
+import asyncio
+import time
+
+import ulid
+from sqlalchemy import delete
+
+from app.database import SessionLocal, close_async_db, init_db
+from app.models import User
+from app.utils.cache import close_redis, init_redis
+from app.utils.security import create_access_token, create_user_access_token, get_current_user, principal_cache
+
+
+async def measure(label: str, token: str, requests: int, concurrency: int, clear_cache: bool = False):
+    async def worker(count: int):
+        for _ in range(count):
+            if clear_cache:
+                principal_cache.clear()
+            await get_current_user(token)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    total = requests // concurrency * concurrency
+    print(f"{label:<28} {total} requests in {elapsed:.2f}s ({total / elapsed:,.0f} req/s)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    init_db()
+    user = User(id=str(ulid.new()), username=f"bench_{ulid.new()}", password_hash="-")
+    with SessionLocal() as db:
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+    await init_redis()
+    try:
+        legacy_token = create_access_token({"sub": user.username})
+        token = create_user_access_token(user)
+
+        await measure("legacy (SQL per request)", legacy_token, args.requests, args.concurrency)
+        await measure("jti, cache miss (Redis)", token, args.requests, args.concurrency, clear_cache=True)
+        await measure("jti, cached principal", token, args.requests, args.concurrency)
+    finally:
+        await close_redis()
+        await close_async_db()
+        with SessionLocal() as db:
+            db.execute(delete(User).where(User.id == user.id))
+            db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Benchmark de formato de resposta de `GET /data`: compara JSON com Arrow IPC e
+Parquet em bytes trafegados e tempo total (requisição + decodificação no cliente).
+
+Requer a API rodando (ex.: `docker-compose up`).
+
+Uso:
+    python benchmarks/bench_columnar.py --base-url http://localhost:8000 --readings 10000
+"""
+import argparse
+import io
+import json
+import random
+import time
+
+import httpx
+import pyarrow as pa
+import pyarrow.parquet as pq
+import ulid
+
+
+def seed(client: httpx.Client, readings: int) -> str:
+    username = f"bench_{ulid.new()}"
+    password = "benchpassword123"
+    client.post("/auth/register", json={"username": username, "password": password}).raise_for_status()
+    token = client.post("/auth/login", json={"username": username, "password": password}).json()["access_token"]
+    response = client.post("/servers/", json={"name": f"bench_server_{ulid.new()}"},
+                           headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    server_ulid = response.json()["ulid"]
+
+    for offset in range(0, readings, 5000):
+        items = [
+            {"server_ulid": server_ulid, "temperature": random.uniform(20, 30), "humidity": random.uniform(50, 80),
+             "voltage": random.uniform(210, 240), "current": random.uniform(0.5, 2.0)}
+            for _ in range(min(5000, readings - offset))
+        ]
+        client.post("/data/batch", json={"items": items}).raise_for_status()
+    return server_ulid
+
+
+def fetch(client: httpx.Client, server_ulid: str, limit: int, accept: str, decode) -> tuple:
+    start = time.perf_counter()
+    response = client.get("/data/", params={"server_ulid": server_ulid, "limit": limit}, headers={"Accept": accept})
+    response.raise_for_status()
+    rows = decode(response.content)
+    return len(response.content), time.perf_counter() - start, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--readings", type=int, default=10000, help="Readings per response (JSON is capped at 10000)")
+    args = parser.parse_args()
+
+    formats = [
+        ("json", "application/json", lambda body: len(json.loads(body))),
+        ("arrow", "application/vnd.apache.arrow.stream", lambda body: pa.ipc.open_stream(body).read_all().num_rows),
+        ("parquet", "application/vnd.apache.parquet", lambda body: pq.read_table(io.BytesIO(body)).num_rows),
+    ]
+
+    with httpx.Client(base_url=args.base_url, timeout=120) as client:
+        server_ulid = seed(client, args.readings)
+        for name, accept, decode in formats:
+            size, elapsed, rows = fetch(client, server_ulid, args.readings, accept, decode)
+            print(f"{name:>8}: {rows} rows | {size / 1024:10.1f} KiB | {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
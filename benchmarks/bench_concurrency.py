@@ -0,0 +1,76 @@
+"""
+Benchmark de concorrência: dispara N clientes paralelos contra rotas autenticadas
+e reporta a latência p50/p95/p99.
+
+Rode uma vez contra a versão anterior (sessão síncrona) e outra contra a atual
+(sessão assíncrona) para comparar o efeito de bloquear o event loop.
+
+Uso:
+    python benchmarks/bench_concurrency.py --base-url http://localhost:8000 --clients 500 --requests 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+import ulid
+
+
+async def prepare(client: httpx.AsyncClient) -> str:
+    username = f"bench_{ulid.new()}"
+    password = "benchpassword123"
+    (await client.post("/auth/register", json={"username": username, "password": password})).raise_for_status()
+    token = (await client.post("/auth/login", json={"username": username, "password": password})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.post("/servers/", json={"name": f"bench_server_{ulid.new()}"}, headers=headers)
+    response.raise_for_status()
+    server_ulid = response.json()["ulid"]
+    (await client.post("/data/", json={"server_ulid": server_ulid, "temperature": 25.0})).raise_for_status()
+    return token
+
+
+async def worker(client: httpx.AsyncClient, path: str, headers: dict, requests: int, latencies: list):
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/health/all")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        token = await prepare(client)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, args.path, headers, args.requests, latencies) for _ in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - start
+
+    print(f"{len(latencies)} requests to {args.path} with {args.clients} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.1f} req/s)")
+    print(f"p50={percentile(latencies, 0.50) * 1000:.1f}ms "
+          f"p95={percentile(latencies, 0.95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f}ms "
+          f"mean={statistics.mean(latencies) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
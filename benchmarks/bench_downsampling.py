@@ -0,0 +1,130 @@
+"""
+Benchmark da redução de séries de `GET /data?points=N`: mede o tempo do LTTB e do
+min/max por bucket sobre uma série sintética (1 Hz, ruído, tendência diária e picos
+isolados) e compara o tamanho do JSON bruto com o da série reduzida.
+
+Sem `--base-url`, não usa banco nem API: isola o custo da redução vetorizada em NumPy.
+Com `--base-url`, mede a rota inteira (cursor do servidor, arrays por bloco, redução e
+JSON): grava a série direto no banco apontado por DATABASE_URL (o mesmo da API) e chama
+`GET /data?points=N` uma vez por método, com o cache frio. Os dados são apagados ao final.
+
+Uso:
+    python benchmarks/bench_downsampling.py --rows 10000000 --points 1500
+    python benchmarks/bench_downsampling.py --rows 10000000 --points 1500 --base-url http://localhost:8000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+import ulid
+from sqlalchemy import text
+
+from app.utils.downsampling import downsample_series
+
+# Linhas serializadas de verdade para estimar o tamanho do JSON bruto
+JSON_SAMPLE_ROWS = 100000
+
+
+def synthetic_series(rows: int, spikes: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    timestamps = np.datetime64("2024-01-01T00:00:00", "us") + np.arange(rows) * np.timedelta64(1, "s")
+    seconds = np.arange(rows, dtype=np.float64)
+    values = 25 + 3 * np.sin(2 * np.pi * seconds / 86400) + rng.normal(0, 0.2, rows)
+    spike_positions = rng.choice(rows, size=spikes, replace=False)
+    values[spike_positions] += rng.choice([-15.0, 15.0], size=spikes)
+    return timestamps, values, spike_positions
+
+
+def raw_json_bytes(timestamps: np.ndarray, values: np.ndarray) -> int:
+    sample = min(JSON_SAMPLE_ROWS, len(values))
+    body = json.dumps([
+        {"timestamp": timestamp.isoformat(), "temperature": value}
+        for timestamp, value in zip(timestamps[:sample].tolist(), values[:sample].tolist())
+    ])
+    return int(len(body) * len(values) / sample)
+
+
+# Mesma série sintética, gerada no próprio PostgreSQL (sem trafegar 10 milhões de linhas pela API)
+SEED_SQL = text(
+    "INSERT INTO sensor_data (id, server_ulid, timestamp, temperature) "
+    "SELECT md5(:server_ulid || n), :server_ulid, CAST(:start AS timestamp) + n * interval '1 second', "
+    "25 + 3 * sin(2 * pi() * n / 86400) + (random() - 0.5) * 0.4 "
+    "+ CASE WHEN n % :spike_every = 0 THEN 15 ELSE 0 END "
+    "FROM generate_series(0, :rows - 1) AS n"
+)
+SEED_START = datetime(2024, 1, 1)
+
+
+def create_server(client: httpx.Client) -> str:
+    username = f"bench_{ulid.new()}"
+    password = "benchpassword123"
+    client.post("/auth/register", json={"username": username, "password": password}).raise_for_status()
+    token = client.post("/auth/login", json={"username": username, "password": password}).json()["access_token"]
+    response = client.post("/servers/", json={"name": f"bench_server_{ulid.new()}"},
+                           headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()["ulid"]
+
+
+def bench_endpoint(base_url: str, rows: int, points: int, spikes: int):
+    from app.database import engine
+
+    with httpx.Client(base_url=base_url, timeout=600) as client:
+        server_ulid = create_server(client)
+        try:
+            start = time.perf_counter()
+            with engine.begin() as connection:
+                connection.execute(SEED_SQL, {"server_ulid": server_ulid, "start": SEED_START, "rows": rows,
+                                              "spike_every": max(rows // max(spikes, 1), 1)})
+            print(f"seeded {rows:,} rows in {time.perf_counter() - start:.1f} s")
+
+            for method in ("lttb", "minmax"):
+                start = time.perf_counter()
+                response = client.get("/data", params={"server_ulid": server_ulid, "points": points, "downsample": method})
+                elapsed = time.perf_counter() - start
+                response.raise_for_status()
+                series = {item["metric"]: item for item in response.json()}["temperature"]
+                print(f"{method:<7} {elapsed * 1000:8.1f} ms  {len(series['values']):>6} points  "
+                      f"from {series['source_points']:,} readings  {len(response.content) / 1e3:8.1f} KB  "
+                      f"max {max(series['values']):.1f}")
+        finally:
+            with engine.begin() as connection:
+                connection.execute(text("DELETE FROM sensor_data WHERE server_ulid = :server_ulid"), {"server_ulid": server_ulid})
+                connection.execute(text("DELETE FROM servers WHERE ulid = :server_ulid"), {"server_ulid": server_ulid})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--points", type=int, default=1500)
+    parser.add_argument("--spikes", type=int, default=20)
+    parser.add_argument("--base-url", help="API URL: benchmark GET /data?points=N instead of the reduction alone")
+    args = parser.parse_args()
+
+    if args.base_url:
+        bench_endpoint(args.base_url, args.rows, args.points, args.spikes)
+        return
+
+    timestamps, values, spike_positions = synthetic_series(args.rows, args.spikes)
+    spike_values = set(values[spike_positions].tolist())
+    raw_bytes = raw_json_bytes(timestamps, values)
+    print(f"{args.rows:,} rows, raw JSON ~{raw_bytes / 1e6:,.1f} MB")
+
+    for method in ("lttb", "minmax"):
+        start = time.perf_counter()
+        series = downsample_series(timestamps, {"temperature": values}, args.points, method)
+        elapsed = time.perf_counter() - start
+
+        _, series_timestamps, series_values = series["temperature"]
+        body = json.dumps({"timestamps": [timestamp.isoformat() for timestamp in series_timestamps],
+                           "values": series_values})
+        kept = len(spike_values.intersection(series_values))
+        print(f"{method:<7} {elapsed * 1000:8.1f} ms  {len(series_values):>6} points  "
+              f"{len(body) / 1e3:8.1f} KB ({raw_bytes / len(body):,.0f}x smaller)  spikes kept {kept}/{args.spikes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark do custo dos logs em `GET /health/all`: compara a latência de uma rota que
+imprime com print() a cada servidor (e despeja o payload inteiro, como a versão antiga
+de app/routes/health.py) com a mesma rota usando o logger da aplicação (app/utils/log.py),
+com debug desabilitado (produção) e habilitado (escrita numa thread à parte).
+
+Não usa banco nem Redis: os servidores ficam em memória, isolando o custo dos logs.
+A saída dos logs vai para `--sink`, com buffer de linha (como num terminal ou com
+PYTHONUNBUFFERED=1): cada linha é uma escrita.
+
+Uso:
+    python benchmarks/bench_health_logging.py --servers 5000 --requests 200
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.schemas import ServerHealthResponse
+from app.utils.log import get_logger, setup_logging
+
+
+def build_app(servers):
+    app = FastAPI()
+    logger = get_logger("app.benchmarks.health_logging")
+
+    # Payload montado e serializado uma vez: a única diferença entre as rotas são os logs
+    payload = [
+        ServerHealthResponse(server_ulid=ulid, status="online", server_name=name).dict()
+        for ulid, name in servers
+    ]
+    body = json.dumps(payload)
+
+    @app.get("/print")
+    async def with_print():
+        print("🔍 DEBUG - Buscando servidores do usuário bench")
+        print(f"🔍 DEBUG - Servidores encontrados: {len(servers)}")
+        for ulid, name in servers:
+            print(f"🖥️ Servidor encontrado -> ULID: {ulid}, Nome: {name}")
+        print("✅ DEBUG - Todos os servidores processados com sucesso!")
+        print(f"✅ DEBUG - Dados do cache recuperados para bench: {payload}")
+        return Response(body, media_type="application/json")
+
+    @app.get("/logger")
+    async def with_logger():
+        logger.debug("Servidores encontrados para o usuário %s: %d", "bench", len(servers))
+        return Response(body, media_type="application/json")
+
+    return app
+
+
+def measure(client: TestClient, path: str, requests: int):
+    client.get(path)  # aquecimento
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        assert client.get(path).status_code == 200
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--sink", default="/tmp/bench_health_logging.log")
+    args = parser.parse_args()
+
+    servers = [(f"01H{index:023d}", f"server-{index}") for index in range(args.servers)]
+    results = {}
+    with open(args.sink, "w", buffering=1) as sink:
+        # print() e o logger escrevem no mesmo arquivo
+        setup_logging(stream=sink)
+        client = TestClient(build_app(servers))
+        app_logger = logging.getLogger("app")
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            results["print()"] = measure(client, "/print", args.requests)
+            app_logger.setLevel(logging.INFO)
+            results["logger (INFO)"] = measure(client, "/logger", args.requests)
+            app_logger.setLevel(logging.DEBUG)
+            results["logger (DEBUG)"] = measure(client, "/logger", args.requests)
+        finally:
+            sys.stdout = stdout
+
+    print(f"{args.servers:,} servers, {args.requests} requests per variant")
+    baseline = results["print()"][0]
+    for name, (mean, p95) in results.items():
+        print(f"{name:<15} mean {mean:8.2f} ms  p95 {p95:8.2f} ms  ({baseline / mean:4.1f}x vs print)")
+
+
+if __name__ == "__main__":
+    main()
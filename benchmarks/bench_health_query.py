@@ -0,0 +1,106 @@
+"""
+Benchmark da busca da última leitura de cada servidor: compara o padrão N+1
+(uma consulta por servidor) com a consulta única de `last_reading_timestamp`,
+usada por `reconcile_last_seen` para reconstruir `servers.last_seen_at`.
+
+`GET /health/all` não executa mais essa consulta: o status vem do estado do
+detector de offline no Redis (hash `health:status`).
+
+Popula o banco apontado por DATABASE_URL com um usuário, N servidores e algumas
+leituras por servidor, mede as duas abordagens e apaga os dados ao final.
+
+Uso:
+    python benchmarks/bench_health_query.py --servers 1000 10000 100000 --readings 5
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import ulid
+from sqlalchemy import delete, insert, select
+
+from app.database import SessionLocal, init_db
+from app.models import SensorData, Server, User
+from app.utils.heartbeat import last_reading_timestamp
+
+
+def seed(db, servers: int, readings: int) -> str:
+    user_id = str(ulid.new())
+    db.execute(insert(User), [{"id": user_id, "username": f"bench_{user_id}", "password_hash": "-"}])
+
+    server_ulids = [str(ulid.new()) for _ in range(servers)]
+    db.execute(insert(Server), [
+        {"ulid": server_ulid, "name": f"bench_{server_ulid}", "user_id": user_id} for server_ulid in server_ulids
+    ])
+
+    now = datetime.utcnow()
+    rows = [
+        {"id": str(ulid.new()), "server_ulid": server_ulid, "timestamp": now - timedelta(seconds=offset), "temperature": 25.0}
+        for server_ulid in server_ulids
+        for offset in range(readings)
+    ]
+    for start in range(0, len(rows), 50_000):
+        db.execute(insert(SensorData), rows[start:start + 50_000])
+    db.commit()
+    return user_id
+
+
+def cleanup(db, user_id: str):
+    server_ulids = select(Server.ulid).where(Server.user_id == user_id)
+    db.execute(delete(SensorData).where(SensorData.server_ulid.in_(server_ulids)))
+    db.execute(delete(Server).where(Server.user_id == user_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+
+
+def n_plus_one(db, user_id: str) -> int:
+    servers = db.execute(select(Server.ulid).where(Server.user_id == user_id)).all()
+    for server in servers:
+        db.execute(
+            select(SensorData.timestamp)
+            .where(SensorData.server_ulid == server.ulid)
+            .order_by(SensorData.timestamp.desc())
+            .limit(1)
+        ).first()
+    return len(servers)
+
+
+def single_query(db, user_id: str) -> int:
+    rows = db.execute(
+        select(Server.ulid, Server.name, last_reading_timestamp().label("last_seen"))
+        .where(Server.user_id == user_id)
+    ).all()
+    return len(rows)
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--readings", type=int, default=5, help="Readings per server")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        for servers in args.servers:
+            user_id = seed(db, servers, args.readings)
+            try:
+                db.execute(select(1))  # Aquece a conexão
+                slow = timed(n_plus_one, db, user_id)
+                fast = timed(single_query, db, user_id)
+                print(f"{servers:>7} servers | N+1: {slow * 1000:9.1f}ms ({servers + 1} queries) "
+                      f"| single query: {fast * 1000:8.1f}ms | {slow / fast:6.1f}x")
+            finally:
+                cleanup(db, user_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
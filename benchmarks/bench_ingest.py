@@ -0,0 +1,74 @@
+"""
+Benchmark de ingestão: compara `POST /data/` (uma leitura por requisição)
+com `POST /data/batch` (várias leituras por requisição).
+
+Requer a API rodando (ex.: `docker-compose up`).
+
+Uso:
+    python benchmarks/bench_ingest.py --base-url http://localhost:8000 --readings 5000 --batch-size 500
+"""
+import argparse
+import random
+import time
+
+import httpx
+import ulid
+
+
+def create_server(client: httpx.Client) -> str:
+    username = f"bench_{ulid.new()}"
+    password = "benchpassword123"
+    client.post("/auth/register", json={"username": username, "password": password}).raise_for_status()
+    token = client.post("/auth/login", json={"username": username, "password": password}).json()["access_token"]
+
+    response = client.post("/servers/", json={"name": f"bench_server_{ulid.new()}"},
+                           headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()["ulid"]
+
+
+def random_reading(server_ulid: str) -> dict:
+    return {
+        "server_ulid": server_ulid,
+        "temperature": random.uniform(20.0, 30.0),
+        "humidity": random.uniform(50.0, 80.0),
+        "voltage": random.uniform(210.0, 240.0),
+        "current": random.uniform(0.5, 2.0),
+    }
+
+
+def bench_single(client: httpx.Client, server_ulid: str, readings: int) -> float:
+    start = time.perf_counter()
+    for _ in range(readings):
+        client.post("/data/", json=random_reading(server_ulid)).raise_for_status()
+    return time.perf_counter() - start
+
+
+def bench_batch(client: httpx.Client, server_ulid: str, readings: int, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, readings, batch_size):
+        items = [random_reading(server_ulid) for _ in range(min(batch_size, readings - offset))]
+        client.post("/data/batch", json={"items": items}).raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.base_url, timeout=60) as client:
+        server_ulid = create_server(client)
+
+        single = bench_single(client, server_ulid, args.readings)
+        batch = bench_batch(client, server_ulid, args.readings, args.batch_size)
+
+    print(f"POST /data/       : {args.readings / single:10.1f} readings/s ({single:.2f}s)")
+    print(f"POST /data/batch  : {args.readings / batch:10.1f} readings/s ({batch:.2f}s, batch={args.batch_size})")
+    print(f"speedup           : {single / batch:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
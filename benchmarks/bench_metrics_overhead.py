@@ -0,0 +1,71 @@
+"""
+Benchmark do custo do middleware de métricas (app/utils/metrics.py): chama uma rota
+vazia direto pela interface ASGI, com e sem o MetricsMiddleware, e compara a média
+por requisição. Sem servidor HTTP nem cliente, a diferença é só o custo das métricas.
+
+Uso:
+    python benchmarks/bench_metrics_overhead.py --requests 50000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from app.utils.metrics import MetricsMiddleware
+
+SCOPE = {
+    "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+    "path": "/items/42", "raw_path": b"/items/42", "root_path": "", "query_string": b"", "headers": [],
+    "server": ("bench", 80), "client": ("bench", 1234),
+}
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"item_id": item_id}
+
+    return app
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+async def send(message):
+    pass
+
+
+async def measure(app, requests: int) -> float:
+    for _ in range(1000):  # aquecimento
+        await app(dict(SCOPE), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def run(requests: int, rounds: int):
+    bare, instrumented = build_app(), MetricsMiddleware(build_app())
+    overheads = []
+    for _ in range(rounds):
+        bare_us = await measure(bare, requests)
+        instrumented_us = await measure(instrumented, requests)
+        overheads.append(instrumented_us - bare_us)
+        print(f"without metrics {bare_us:7.1f} us  with metrics {instrumented_us:7.1f} us  "
+              f"overhead {instrumented_us - bare_us:5.1f} us")
+    print(f"median overhead {sorted(overheads)[len(overheads) // 2]:.1f} us per request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import asyncio
+import pytest
+import pytest_asyncio
+import ulid
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from app.main import app
+from app.database import async_engine, AsyncSessionLocal, close_async_db
+from app.models import Server
+from app.utils import cache, health_events, metrics, security, server_registry
+from app.utils.server_registry import ServerInfo
+
+
+# Cliente Redis criado no loop de cada teste e fechado ao final
+@pytest_asyncio.fixture
+async def redis_client():
+    client = await cache.init_redis()
+    yield client
+    await cache.close_redis()
+
+# Conta as consultas enviadas ao banco pelo engine assíncrono
+@pytest_asyncio.fixture
+async def query_counter():
+    queries = []
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_query)
+    yield queries
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count_query)
+    # As conexões do pool pertencem ao loop deste teste
+    await close_async_db()
+
+# Conta as idas ao Redis feitas pelas conexões instrumentadas do pool (um pipeline conta como uma)
+@contextmanager
+def count_round_trips():
+    stats = metrics.RequestStats()
+    token = metrics._request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        metrics._request_stats.reset(token)
+
+
+# Teste: 1000 requisições concorrentes numa chave fria disparam uma única consulta ao banco
+@pytest.mark.asyncio
+async def test_get_or_compute_single_flight(redis_client, query_counter):
+    key = f"test_single_flight:{ulid.new()}"
+
+    async def compute():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Server.ulid).limit(1))
+            result.all()
+        await asyncio.sleep(0.1)  # mantém a recomputação em andamento enquanto as outras chegam
+        return {"value": 42}
+
+    try:
+        results = await asyncio.gather(*(cache.get_or_compute(key, compute, expire=60) for _ in range(1000)))
+        assert results == [{"value": 42}] * 1000
+        assert len(query_counter) == 1
+    finally:
+        await cache.invalidate_cached_objects(key)
+
+
+# Teste: enquanto outro worker detém o lock da chave, o resultado dele é aguardado em vez de recalculado
+@pytest.mark.asyncio
+async def test_get_or_compute_waits_for_other_worker(redis_client):
+    key = f"test_single_flight:{ulid.new()}"
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return "computed here"
+
+    async def other_worker():
+        await asyncio.sleep(0.2)
+        await cache.set_cache_key(key, '"computed elsewhere"', expire=60)
+
+    await redis_client.set(f"lock:{key}", "other-worker", px=5000)
+    try:
+        result, _ = await asyncio.gather(cache.get_or_compute(key, compute, expire=60), other_worker())
+        assert result == "computed elsewhere"
+        assert calls == 0
+    finally:
+        await redis_client.delete(f"lock:{key}")
+        await cache.invalidate_cached_objects(key)
+
+
+# Teste: N servidores fora da memória do worker são lidos do registro no Redis com um único HMGET
+@pytest.mark.asyncio
+async def test_get_servers_single_round_trip(redis_client):
+    servers = [ServerInfo(str(ulid.new()), f"server_{index}", "user", None) for index in range(100)]
+    await redis_client.hset(server_registry.REGISTRY_KEY, mapping={info.ulid: info.to_json() for info in servers})
+    try:
+        with count_round_trips() as stats:
+            found = await server_registry.get_servers(info.ulid for info in servers)
+        assert stats.redis_round_trips == 1
+        assert {server_ulid: info.name for server_ulid, info in found.items()} == {info.ulid: info.name for info in servers}
+    finally:
+        await server_registry.forget_servers(*(info.ulid for info in servers))
+
+
+# Teste: gravar e ler o status de N servidores custa uma ida ao Redis cada (pipeline e HMGET)
+@pytest.mark.asyncio
+async def test_statuses_single_round_trip(redis_client):
+    statuses = {str(ulid.new()): "online" if index % 2 else "offline" for index in range(100)}
+    try:
+        with count_round_trips() as stats:
+            await health_events.write_statuses(statuses)
+        assert stats.redis_round_trips == 1
+
+        with count_round_trips() as stats:
+            assert await health_events.get_statuses(list(statuses)) == statuses
+        assert stats.redis_round_trips == 1
+    finally:
+        await redis_client.hdel(health_events.STATUS_KEY, *statuses)
+
+
+# Teste: o cliente compartilhado é único até ser fechado; fechar desconecta o pool e permite recriá-lo
+@pytest.mark.asyncio
+async def test_redis_client_reused_until_closed():
+    client = await cache.init_redis()
+    try:
+        assert await cache.init_redis() is client
+        assert await cache.get_redis() is client
+        assert await client.ping()
+        assert client.connection_pool.max_connections == cache.REDIS_MAX_CONNECTIONS
+        assert client.connection_pool.connection_class.__name__.startswith("Instrumented")
+    finally:
+        await cache.close_redis()
+
+    assert cache._redis_client is None
+    assert not any(connection.is_connected for connection in client.connection_pool._connections)
+
+    recreated = await cache.init_redis()
+    try:
+        assert recreated is not client
+        assert await recreated.ping()
+    finally:
+        await cache.close_redis()
+
+
+# Teste: o lifespan da aplicação cria o pool de conexões Redis no startup e o fecha no shutdown
+def test_redis_pool_lifespan():
+    with TestClient(app) as client:
+        redis_client = cache._redis_client
+        assert redis_client is not None
+        assert client.portal.call(redis_client.ping)
+
+    assert cache._redis_client is None
+    assert not any(connection.is_connected for connection in redis_client.connection_pool._connections)
+
+
+# Teste: `/cache/set` e `/cache/get` só aceitam o token de admin (sem ele, nenhuma chave do Redis é lida ou gravada)
+def test_cache_routes_require_admin(monkeypatch):
+    key = f"test_cache_route:{ulid.new()}"
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "test-admin-token")
+    admin_headers = {"X-Admin-Token": "test-admin-token"}
+
+    with TestClient(app) as client:
+        assert client.post("/cache/set", params={"key": key, "value": "x"}).status_code == 403
+        assert client.post("/cache/set", params={"key": key, "value": "x"}, headers={"X-Admin-Token": "wrong"}).status_code == 403
+        assert client.get(f"/cache/get/{key}", headers=admin_headers).status_code == 404
+
+        assert client.post("/cache/set", params={"key": key, "value": "x"}, headers=admin_headers).status_code == 200
+        assert client.get(f"/cache/get/{key}").status_code == 403
+        response = client.get(f"/cache/get/{key}", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json() == {"key": key, "value": "x"}
+
+        # Sem ADMIN_TOKEN configurado, as rotas ficam fechadas
+        monkeypatch.setattr(security, "ADMIN_TOKEN", None)
+        assert client.get(f"/cache/get/{key}", headers=admin_headers).status_code == 403
+
+        client.portal.call(cache.invalidate_cached_objects, key)
@@ -6,9 +6,16 @@ from app.main import app
 from app.models import User
 from app.database import get_db
 from sqlalchemy.orm import Session
+from app.utils import security
+from app.utils.security import pwd_context, BCRYPT_ROUNDS
 
 
-client = TestClient(app)
+# Fixture para o TestClient - Escopo de módulo
+@pytest.fixture(scope="module")
+def client():
+    # O context manager executa o lifespan e mantém um único event loop para o pool assíncrono
+    with TestClient(app) as test_client:
+        yield test_client
 
 # Função para gerar nome de usuário aleatório
 def generate_random_username():
@@ -20,7 +27,7 @@ def generate_random_password():
 
 # Test for POST /auth/register - Success
 @pytest.fixture
-def create_user():
+def create_user(client):
     # Gerar usuário e senha aleatórios
     username = generate_random_username()
     password = generate_random_password()
@@ -51,7 +58,7 @@ def test_register_user_success(create_user):
     assert response_data["username"] == username
 
 # Test for POST /auth/register - Conflict (username already exists)
-def test_register_user_conflict(create_user):
+def test_register_user_conflict(client, create_user):
     response, username, password = create_user
 
     # Tenta criar o mesmo usuário novamente
@@ -63,7 +70,7 @@ def test_register_user_conflict(create_user):
     assert response.json()["detail"] == "Username already registered"
 
 # Test for POST /auth/register - Password too short
-def test_register_user_short_password():
+def test_register_user_short_password(client):
     username = generate_random_username()
     data = {
         "username": username,
@@ -75,3 +82,34 @@ def test_register_user_short_password():
     # Verifica se o status code é 400 (Bad Request)
     assert response.status_code == 400
     assert response.json()["detail"] == "Password must be at least 8 characters long"
+
+# Test for POST /auth/login - Hash upgraded when the bcrypt work factor changes
+def test_login_upgrades_password_hash(client, create_user):
+    response, username, password = create_user
+    assert response.status_code == 201
+
+    # Simula um hash antigo, gerado com custo menor
+    db: Session = next(get_db())
+    user = db.query(User).filter(User.username == username).first()
+    user.password_hash = pwd_context.hash(password, rounds=4)
+    db.commit()
+
+    response = client.post("/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200
+
+    db.refresh(user)
+    assert pwd_context.identify(user.password_hash) == "bcrypt"
+    assert f"${BCRYPT_ROUNDS:02d}$" in user.password_hash
+    assert pwd_context.verify(password, user.password_hash)
+    db.close()
+
+# Test for POST /auth/login - Password pool saturated
+def test_login_password_pool_full(client, create_user, monkeypatch):
+    response, username, password = create_user
+
+    monkeypatch.setattr(security, "_password_tasks_pending", security.PASSWORD_HASH_WORKERS + security.PASSWORD_HASH_MAX_QUEUE)
+    response = client.post("/auth/login", json={"username": username, "password": password})
+
+    # Verifica se o status code é 503 (Service Unavailable) em vez de enfileirar o bcrypt
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -1,8 +1,12 @@
+import asyncio
+import jwt
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.models import User, Server, SensorData
 from app.database import get_db
+from app.utils import health_events, security
+from app.utils.heartbeat import reconcile_last_seen
 from sqlalchemy.orm import Session
 import ulid
 from datetime import datetime, timedelta
@@ -10,7 +14,9 @@ from datetime import datetime, timedelta
 # Definindo a fixture para o TestClient
 @pytest.fixture
 def client():
-    return TestClient(app)
+    # O context manager executa o lifespan e mantém um único event loop para o pool assíncrono
+    with TestClient(app) as test_client:
+        yield test_client
 
 # Função para gerar um nome de usuário aleatório
 def generate_random_username():
@@ -111,3 +117,232 @@ def test_get_all_servers_health(client, login_user):
     # Verificar o status de todos os servidores
     response = client.get("/health/all", headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200  # Espera 200 para a verificação de status dos servidores
+
+# Teste 4: O cache de /health/all é invalidado quando o usuário registra um novo servidor
+def test_get_all_servers_health_cache_invalidation(client, login_user):
+    token, username = login_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    server_ulids = []
+    for _ in range(2):
+        response = client.post("/servers/", json={"name": generate_random_server_name()}, headers=headers)
+        assert response.status_code == 201
+        server_ulids.append(response.json()["ulid"])
+
+        # Popula o cache (L1 + Redis) e confere que o novo servidor já aparece
+        response = client.get("/health/all", headers=headers)
+        assert response.status_code == 200
+        assert {item["server_ulid"] for item in response.json()} == set(server_ulids)
+
+    stats = client.get("/cache/stats").json()
+    assert set(stats) == {"l1", "l2"}
+
+    # Cleanup
+    db: Session = next(get_db())
+    for server in db.query(Server).filter(Server.ulid.in_(server_ulids)).all():
+        db.delete(server)
+    db.commit()
+
+# Teste 5: O status de um servidor só é visível para o dono (404 para os demais usuários)
+def test_get_server_health_other_user(client, login_user):
+    token, username = login_user
+
+    response = client.post("/servers/", json={"name": generate_random_server_name()}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+    server_ulid = response.json()["ulid"]
+
+    response = client.get(f"/health/{server_ulid}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["server_ulid"] == server_ulid
+
+    # Outro usuário não enxerga a saúde do servidor (as consultas de dados em `/data` são abertas)
+    other = {"username": generate_random_username(), "password": generate_random_password()}
+    assert client.post("/auth/register", json=other).status_code == 201
+    other_token = client.post("/auth/login", json=other).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {other_token}"}
+
+    response = client.get(f"/health/{server_ulid}", headers=other_headers)
+    assert response.status_code == 404
+
+    # Cleanup
+    db: Session = next(get_db())
+    server = db.query(Server).filter(Server.ulid == server_ulid).first()
+    if server:
+        db.delete(server)
+    other_user = db.query(User).filter(User.username == other["username"]).first()
+    if other_user:
+        db.delete(other_user)
+    db.commit()
+
+# Teste 6: A ingestão publica a transição para online às conexões de /health/stream do dono
+def test_health_events_on_ingest(client, login_user):
+    token, username = login_user
+    user_id = jwt.decode(token, options={"verify_signature": False})["sub"]
+
+    response = client.post("/servers/", json={"name": generate_random_server_name()}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+    server_ulid = response.json()["ulid"]
+
+    async def subscribe():
+        return health_events.subscribe(user_id)
+
+    async def next_event(queue, timeout=5):
+        return await asyncio.wait_for(queue.get(), timeout)
+
+    queue = client.portal.call(subscribe)
+    try:
+        response = client.post("/data", json=generate_random_sensor_data(server_ulid))
+        assert response.status_code == 201
+
+        event = client.portal.call(next_event, queue)
+        assert (event["server_ulid"], event["status"]) == (server_ulid, "online")
+        assert "user_id" not in event
+
+        # Leituras seguintes só renovam o prazo: nenhuma nova transição
+        response = client.post("/data", json=generate_random_sensor_data(server_ulid))
+        assert response.status_code == 201
+        with pytest.raises(asyncio.TimeoutError):
+            client.portal.call(next_event, queue, 0.5)
+    finally:
+        health_events.unsubscribe(user_id, queue)
+
+    # Cleanup
+    db: Session = next(get_db())
+    server = db.query(Server).filter(Server.ulid == server_ulid).first()
+    if server:
+        db.delete(server)
+        db.commit()
+
+
+# Teste 7: Um servidor com limite próprio (`offline_threshold_seconds`) fica offline depois desse limite
+def test_health_custom_offline_threshold(client, login_user):
+    token, _ = login_user
+    user_id = jwt.decode(token, options={"verify_signature": False})["sub"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    server_data = {"name": generate_random_server_name(), "offline_threshold_seconds": 1}
+    response = client.post("/servers/", json=server_data, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["offline_threshold_seconds"] == 1
+    server_ulid = response.json()["ulid"]
+
+    async def subscribe():
+        return health_events.subscribe(user_id)
+
+    async def next_event(queue, timeout=5):
+        return await asyncio.wait_for(queue.get(), timeout)
+
+    queue = client.portal.call(subscribe)
+    try:
+        response = client.post("/data", json=generate_random_sensor_data(server_ulid))
+        assert response.status_code == 201
+
+        event = client.portal.call(next_event, queue)
+        assert (event["server_ulid"], event["status"]) == (server_ulid, "online")
+
+        # Sem novas leituras, o detector marca o servidor como offline após ~1s
+        event = client.portal.call(next_event, queue)
+        assert (event["server_ulid"], event["status"]) == (server_ulid, "offline")
+    finally:
+        health_events.unsubscribe(user_id, queue)
+
+    response = client.get(f"/health/{server_ulid}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "offline"
+
+    # Cleanup
+    db: Session = next(get_db())
+    server = db.query(Server).filter(Server.ulid == server_ulid).first()
+    if server:
+        db.delete(server)
+        db.commit()
+
+# Teste 8: `/metrics` rotula as requisições pelo template da rota (nunca pelo ULID do servidor)
+def test_metrics_by_route_template(client, login_user):
+    token, _ = login_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post("/servers/", json={"name": generate_random_server_name()}, headers=headers)
+    assert response.status_code == 201
+    server_ulid = response.json()["ulid"]
+
+    assert client.get(f"/health/{server_ulid}", headers=headers).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    metrics = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/health/{server_ulid}",status="2xx"}' in metrics
+    assert 'db_queries_per_request_count{route="/servers/"}' in metrics
+    assert "redis_round_trips_total" in metrics
+    assert 'cache_requests_total{result="hit",tier="l1"}' in metrics
+    assert server_ulid not in metrics
+
+    # Cleanup
+    db: Session = next(get_db())
+    server = db.query(Server).filter(Server.ulid == server_ulid).first()
+    if server:
+        db.delete(server)
+        db.commit()
+
+# Teste 9: Requisição com `X-Profile: 1` gera um perfil consultável apenas com o token de admin
+def test_profile_request(client, login_user, monkeypatch):
+    token, _ = login_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/health/all", headers={**headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    # Sem ADMIN_TOKEN configurado (ou com outro token) as rotas administrativas ficam fechadas
+    monkeypatch.setattr(security, "ADMIN_TOKEN", None)
+    assert client.get(f"/admin/profiles/{profile_id}").status_code == 403
+
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "test-admin-token")
+    admin_headers = {"X-Admin-Token": "test-admin-token"}
+    assert client.get(f"/admin/profiles/{profile_id}", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    response = client.get(f"/admin/profiles/{profile_id}", headers=admin_headers)
+    assert response.status_code == 200
+    profile = response.json()
+    assert profile["route"] == "/health/all"
+    assert profile["status"] == 200
+    assert profile["redis_round_trips"] > 0
+    assert "serialization" in profile["spans"]
+
+    response = client.get("/admin/profiles", params={"route": "/health/all"}, headers=admin_headers)
+    assert profile_id in [summary["id"] for summary in response.json()]
+
+# Teste 10: `reconcile_last_seen` reconstrói `servers.last_seen_at` a partir de `sensor_data`
+def test_reconcile_last_seen(client, login_user):
+    token, _ = login_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    server_ulids = []
+    for _ in range(2):
+        response = client.post("/servers/", json={"name": generate_random_server_name()}, headers=headers)
+        assert response.status_code == 201
+        server_ulids.append(response.json()["ulid"])
+    with_readings, without_readings = server_ulids
+
+    # Leituras gravadas por fora da API (como num restore) e `last_seen_at` desatualizado
+    latest = datetime(2024, 5, 1, 12, 0, 0)
+    db: Session = next(get_db())
+    for offset in (0, 30, 60):
+        db.add(SensorData(server_ulid=with_readings, timestamp=latest - timedelta(seconds=offset), temperature=20.0))
+    db.query(Server).filter(Server.ulid.in_(server_ulids)).update(
+        {Server.last_seen_at: datetime(2020, 1, 1)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert reconcile_last_seen(db) >= 2
+
+    db.expire_all()
+    last_seen = dict(db.query(Server.ulid, Server.last_seen_at).filter(Server.ulid.in_(server_ulids)).all())
+    assert last_seen[with_readings] == latest
+    assert last_seen[without_readings] is None
+
+    # Cleanup
+    for server in db.query(Server).filter(Server.ulid.in_(server_ulids)).all():
+        db.delete(server)
+    db.commit()
+    db.close()
@@ -0,0 +1,136 @@
+import pytest
+import random
+import string
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.main import app
+from app.database import engine, get_db
+from app.models import Server
+from app.utils import partitions
+import ulid
+
+
+# Instante dos testes: bem antes de qualquer dado real, então nenhuma partição cobre esses intervalos
+NOW = datetime(2001, 1, 15)
+
+
+def generate_random_password():
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=12))
+
+@pytest.fixture(scope="function")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+# Servidor de um usuário novo (as leituras precisam de um `server_ulid` existente)
+@pytest.fixture(scope="function")
+def server_ulid(client):
+    user = {"username": f"user_{ulid.new()}", "password": generate_random_password()}
+    assert client.post("/auth/register", json=user).status_code == 201
+    token = client.post("/auth/login", json=user).json()["access_token"]
+    response = client.post("/servers/", json={"name": f"server_{ulid.new()}"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+    server_ulid = response.json()["ulid"]
+    yield server_ulid
+
+    db: Session = next(get_db())
+    db.query(Server).filter(Server.ulid == server_ulid).delete()
+    db.commit()
+    db.close()
+
+# Conexão numa transação desfeita ao final: partições criadas/removidas pelo teste não sobrevivem
+@pytest.fixture(scope="function")
+def connection():
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        if not partitions.is_partitioned(connection):
+            transaction.rollback()
+            pytest.skip("sensor_data não é particionada neste banco")
+        yield connection
+        transaction.rollback()
+
+
+# Partições esperadas a partir de `now`: a atual e as `PARTITIONS_AHEAD` seguintes
+def expected_partitions(now):
+    names, bounds = [], []
+    start, end = partitions.partition_bounds(now)
+    for _ in range(partitions.PARTITIONS_AHEAD + 1):
+        names.append(partitions.partition_name(start))
+        bounds.append((start, end))
+        start, end = partitions.partition_bounds(end)
+    return names, bounds
+
+def insert_reading(connection, server_ulid, timestamp):
+    connection.execute(text(
+        "INSERT INTO sensor_data (id, server_ulid, timestamp, temperature) VALUES (:id, :server_ulid, :timestamp, 1.0)"
+    ), {"id": str(ulid.new()), "server_ulid": server_ulid, "timestamp": timestamp})
+
+def count_rows(connection, table, server_ulid):
+    return connection.execute(
+        text(f"SELECT count(*) FROM {table} WHERE server_ulid = :server_ulid"), {"server_ulid": server_ulid}
+    ).scalar()
+
+
+# Teste de criação: partição atual e futuras, com os intervalos do nome; a segunda chamada não recria nada
+def test_ensure_partitions_creates_ahead(connection):
+    names, bounds = expected_partitions(NOW)
+
+    assert partitions.ensure_partitions(connection, now=NOW) == names
+
+    existing = partitions.existing_partitions(connection)
+    for name, (start, end) in zip(names, bounds):
+        assert existing[name] == (start, end)
+        assert partitions.parse_partition_name(name) == (start, end)
+
+    assert partitions.ensure_partitions(connection, now=NOW) == []
+
+# Teste de ATTACH sobre linhas já existentes na partição default: são movidas para a nova partição
+def test_ensure_partitions_moves_rows_from_default(server_ulid, connection):
+    names, bounds = expected_partitions(NOW)
+    first_start, first_end = bounds[0]
+    inside = [first_start, first_start + (first_end - first_start) / 2, first_end - timedelta(microseconds=1)]
+    outside = bounds[-1][1] + timedelta(days=1)
+
+    for timestamp in inside + [outside]:
+        insert_reading(connection, server_ulid, timestamp)
+    assert count_rows(connection, partitions.DEFAULT_PARTITION, server_ulid) == len(inside) + 1
+
+    assert names[0] in partitions.ensure_partitions(connection, now=NOW)
+
+    assert count_rows(connection, names[0], server_ulid) == len(inside)
+    # Fora de todos os intervalos criados: continua na default
+    assert count_rows(connection, partitions.DEFAULT_PARTITION, server_ulid) == 1
+    # Pela tabela pai nada se perdeu
+    assert count_rows(connection, partitions.PARENT_TABLE, server_ulid) == len(inside) + 1
+
+# Teste de retenção: só as partições que terminam antes do corte são removidas (e as linhas antigas da default)
+def test_drop_expired_partitions_keeps_recent(server_ulid, connection, monkeypatch):
+    names, bounds = expected_partitions(NOW)
+    partitions.ensure_partitions(connection, now=NOW)
+    insert_reading(connection, server_ulid, bounds[0][0] - timedelta(days=1))  # Default, antes do corte
+    insert_reading(connection, server_ulid, bounds[2][0])  # Partição mantida
+
+    # Corte exatamente no fim da segunda partição
+    monkeypatch.setattr(partitions, "RETENTION_DAYS", 1)
+    dropped = partitions.drop_expired_partitions(connection, now=bounds[1][1] + timedelta(days=1))
+
+    assert names[0] in dropped and names[1] in dropped
+    assert not set(names[2:]) & set(dropped)
+
+    existing = partitions.existing_partitions(connection)
+    assert names[0] not in existing and names[1] not in existing
+    assert all(name in existing for name in names[2:])
+
+    assert count_rows(connection, partitions.DEFAULT_PARTITION, server_ulid) == 0
+    assert count_rows(connection, names[2], server_ulid) == 1
+
+# Teste de retenção desativada (SENSOR_DATA_RETENTION_DAYS=0): nada é removido
+def test_drop_expired_partitions_disabled(connection, monkeypatch):
+    names, _ = expected_partitions(NOW)
+    partitions.ensure_partitions(connection, now=NOW)
+
+    monkeypatch.setattr(partitions, "RETENTION_DAYS", 0)
+    assert partitions.drop_expired_partitions(connection, now=datetime.utcnow()) == []
+    assert all(name in partitions.existing_partitions(connection) for name in names)
@@ -1,3 +1,7 @@
+import io
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 import random
 import string
@@ -5,6 +9,7 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.models import User, Server, SensorData
 from app.database import get_db
+from app.utils import ingest_buffer
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import ulid
@@ -35,7 +40,9 @@ def generate_random_sensor_data(server_ulid):
 # Fixture para o TestClient - Escopo de função (será executada a cada teste)
 @pytest.fixture(scope="function")
 def client():
-    return TestClient(app)
+    # O context manager executa o lifespan e mantém um único event loop para o pool assíncrono
+    with TestClient(app) as test_client:
+        yield test_client
 
 # Fixture para criar e autenticar o usuário - Escopo de função
 @pytest.fixture(scope="function")
@@ -98,6 +105,309 @@ def test_register_and_get_sensor_data(client, create_server, create_sensor_data)
     assert response.status_code == 200
     assert len(response.json()) > 0  # Deve retornar dados agregados
 
+# Teste para verificar limites de tempo com fuso (sufixo "Z"), convertidos para UTC sem fuso
+def test_get_sensor_data_timezone_aware_range(client, create_server, create_sensor_data):
+    server_ulid = create_server["ulid"]
+    start_time = (datetime.utcnow() - timedelta(hours=1)).isoformat() + "Z"
+    end_time = (datetime.utcnow() + timedelta(minutes=1)).isoformat() + "Z"
+    window = f"start_time={start_time}&end_time={end_time}"
+
+    response = client.get(f"/data?server_ulid={server_ulid}&{window}")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [create_sensor_data["id"]]
+
+    response = client.get(f"/data?server_ulid={server_ulid}&{window}&aggregation=minute")
+    assert response.status_code == 200
+    assert sum(item["count"] for item in response.json()) == 1
+
+    response = client.get(f"/data/export?server_ulid={server_ulid}&{window}")
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 1
+
+# Teste para verificar o registro de leituras em lote
+def test_register_sensor_data_batch(client, login_user, create_server):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+
+    items = [generate_random_sensor_data(server_ulid) for _ in range(3)]
+    items.append(generate_random_sensor_data(str(ulid.new())))  # Servidor inexistente
+
+    response = client.post("/data/batch", json={"items": items}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+    body = response.json()
+    assert body["created"] == 3
+    assert body["rejected"] == 1
+    assert [result["status"] for result in body["results"]] == ["created", "created", "created", "rejected"]
+    assert body["results"][3]["detail"] == "Server not found"
+
+    response = client.get(f"/data?server_ulid={server_ulid}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert len(response.json()) >= 3
+
+# Teste para verificar que reenvios com o mesmo timestamp do coletor são idempotentes
+def test_register_sensor_data_idempotent_retry(client, login_user, create_server):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+    timestamp = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+
+    reading = dict(generate_random_sensor_data(server_ulid), timestamp=timestamp)
+    first = client.post("/data", json=reading, headers=headers)
+    assert first.status_code == 201
+
+    # Reenvio do mesmo (server_ulid, timestamp): mesma leitura, com as métricas atualizadas
+    retry = client.post("/data", json=dict(reading, temperature=99.0), headers=headers)
+    assert retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.json()["temperature"] == 99.0
+
+    # No lote: a leitura existente é atualizada e a repetição dentro do lote prevalece pela última
+    new_timestamp = (datetime.utcnow() - timedelta(seconds=30)).isoformat()
+    items = [
+        reading,
+        dict(generate_random_sensor_data(server_ulid), timestamp=new_timestamp),
+        dict(generate_random_sensor_data(server_ulid), timestamp=new_timestamp),
+    ]
+    response = client.post("/data/batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["updated", "duplicate", "created"]
+    assert body["results"][0]["id"] == first.json()["id"]
+    assert (body["created"], body["updated"]) == (1, 1)
+
+    db: Session = next(get_db())
+    assert db.query(SensorData).filter(SensorData.server_ulid == server_ulid).count() == 2
+    db.close()
+
+# Teste para verificar que leituras com timestamp no futuro são recusadas
+def test_register_sensor_data_future_timestamp(client, login_user, create_server):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+    future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+
+    response = client.post("/data", json=dict(generate_random_sensor_data(server_ulid), timestamp=future), headers=headers)
+    assert response.status_code == 422
+
+    # No lote, só a leitura do futuro é rejeitada
+    items = [dict(generate_random_sensor_data(server_ulid), timestamp=future), generate_random_sensor_data(server_ulid)]
+    response = client.post("/data/batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["rejected", "created"]
+    assert (body["created"], body["rejected"]) == (1, 1)
+
+# Teste para verificar a paginação por cursor de `GET /data`
+def test_get_sensor_data_pagination(client, login_user, create_server, create_sensor_data):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    items = [generate_random_sensor_data(server_ulid) for _ in range(5)]
+    response = client.post("/data/batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+
+    seen_ids = []
+    cursor = None
+    while True:
+        url = f"/data?server_ulid={server_ulid}&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen_ids += [item["id"] for item in page]
+
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    # 5 leituras do lote + 1 da fixture, sem repetição
+    assert len(seen_ids) == 6
+    assert len(set(seen_ids)) == 6
+
+    # Limite acima do máximo e cursor inválido são rejeitados
+    assert client.get(f"/data?server_ulid={server_ulid}&limit=100000", headers=headers).status_code == 422
+    assert client.get(f"/data?server_ulid={server_ulid}&cursor=invalid", headers=headers).status_code == 400
+
+# Teste para verificar a exportação em streaming (NDJSON e CSV)
+def test_export_sensor_data(client, login_user, create_server, create_sensor_data):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get(f"/data/export?server_ulid={server_ulid}", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [create_sensor_data["id"]]
+
+    response = client.get(f"/data/export?server_ulid={server_ulid}&format=csv", headers=headers)
+    assert response.status_code == 200
+    rows = response.text.splitlines()
+    assert rows[0] == "id,server_ulid,timestamp,temperature,humidity,voltage,current"
+    assert len(rows) == 2
+
+# Teste para verificar que as rotas de consulta continuam abertas: sem token, com ou sem `server_ulid`
+def test_get_sensor_data_without_token(client, create_server, create_sensor_data):
+    server_ulid = create_server["ulid"]
+
+    response = client.get(f"/data?server_ulid={server_ulid}")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [create_sensor_data["id"]]
+
+    response = client.get(f"/data/export?server_ulid={server_ulid}")
+    assert response.status_code == 200
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [create_sensor_data["id"]]
+
+    assert client.get("/data?limit=1").status_code == 200
+
+# Teste para verificar a resposta colunar (Arrow IPC e Parquet) de `GET /data`
+def test_get_sensor_data_arrow(client, login_user, create_server, create_sensor_data):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.apache.arrow.stream"}
+    response = client.get(f"/data?server_ulid={server_ulid}", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("id").to_pylist() == [create_sensor_data["id"]]
+
+    response = client.get(f"/data?server_ulid={server_ulid}&aggregation=hour&format=parquet",
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert pq.read_table(io.BytesIO(response.content)).num_rows == 1
+
+# Teste para verificar a agregação com largura arbitrária e estatísticas por métrica
+def test_get_sensor_data_bucket_statistics(client, login_user, create_server):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    items = [dict(generate_random_sensor_data(server_ulid), timestamp=(start + timedelta(seconds=i)).isoformat(), temperature=float(i))
+             for i in range(10)]
+    response = client.post("/data/batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+
+    window = f"start_time={start.isoformat()}&end_time={(start + timedelta(minutes=1)).isoformat()}"
+    response = client.get(f"/data?server_ulid={server_ulid}&{window}&bucket=5s&stats=min,max,count,p50", headers=headers)
+    assert response.status_code == 200
+    buckets = response.json()
+    assert [item["bucket"] for item in buckets] == ["2024-01-01T12:00:00", "2024-01-01T12:00:05"]
+    assert buckets[0]["count"] == 5
+    assert buckets[0]["temperature"] == {"min": 0.0, "max": 4.0, "count": 5, "p50": 2.0}
+    assert "id" not in buckets[0]
+
+    # Todos os servidores filtrados em um único bucket
+    response = client.get(f"/data?server_ulid={server_ulid}&{window}&bucket=1m&stats=avg&group_by=none", headers=headers)
+    assert response.status_code == 200
+    [bucket] = response.json()
+    assert (bucket["server_ulid"], bucket["bucket"], bucket["count"]) == (None, "2024-01-01T12:00:00", 10)
+    assert bucket["temperature"] == {"avg": 4.5}
+
+    assert client.get(f"/data?server_ulid={server_ulid}&bucket=5x", headers=headers).status_code == 400
+    assert client.get(f"/data?server_ulid={server_ulid}&bucket=5s&stats=median", headers=headers).status_code == 400
+
+    # Sem intervalo de tempo, o limite de buckets vale para o período ocupado pelas leituras (aqui, 60 dias em buckets de 1s)
+    late = dict(generate_random_sensor_data(server_ulid), timestamp=(start + timedelta(days=60)).isoformat())
+    assert client.post("/data", json=late, headers=headers).status_code == 201
+    assert client.get(f"/data?server_ulid={server_ulid}&bucket=1s", headers=headers).status_code == 400
+    assert client.get(f"/data?server_ulid={server_ulid}&bucket=1d", headers=headers).status_code == 200
+
+# Teste para verificar a redução de séries de `GET /data?points=N` (LTTB e min/max)
+def test_get_sensor_data_downsampled(client, login_user, create_server):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    start = datetime.utcnow() - timedelta(hours=1)
+    items = [dict(generate_random_sensor_data(server_ulid), timestamp=(start + timedelta(seconds=i)).isoformat())
+             for i in range(200)]
+    items[100]["temperature"] = 99.0  # Pico que precisa aparecer na série reduzida
+    response = client.post("/data/batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+
+    for method in ("lttb", "minmax"):
+        response = client.get(f"/data?server_ulid={server_ulid}&points=20&downsample={method}", headers=headers)
+        assert response.status_code == 200
+        series = {item["metric"]: item for item in response.json()}
+        assert set(series) == {"temperature", "humidity", "voltage", "current"}
+        temperature = series["temperature"]
+        assert temperature["source_points"] == 200
+        assert len(temperature["values"]) <= 20
+        assert len(temperature["timestamps"]) == len(temperature["values"])
+        assert 99.0 in temperature["values"]
+
+    assert client.get(f"/data?server_ulid={server_ulid}&points=20&aggregation=hour", headers=headers).status_code == 400
+    assert client.get("/data?points=20", headers=headers).status_code == 400
+
+# Teste para verificar que o cache de `GET /data` é invalidado pela ingestão
+def test_get_sensor_data_cache_invalidation(client, login_user, create_server, create_sensor_data):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.get(f"/data?server_ulid={server_ulid}", headers=headers)
+    cached = client.get(f"/data?server_ulid={server_ulid}", headers=headers)
+    assert first.status_code == cached.status_code == 200
+    assert first.json() == cached.json()
+
+    response = client.post("/data", json=generate_random_sensor_data(server_ulid), headers=headers)
+    assert response.status_code == 201
+
+    response = client.get(f"/data?server_ulid={server_ulid}", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == len(first.json()) + 1
+
+# Teste do modo de ingestão com buffer de escrita (INGEST_MODE=buffered)
+def test_register_sensor_data_buffered(client, login_user, create_server, monkeypatch):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+    monkeypatch.setattr(ingest_buffer, "INGEST_MODE", "buffered")
+
+    response = client.post("/data", json=generate_random_sensor_data(server_ulid), headers=headers)
+    assert response.status_code == 202
+    reading_id = response.json()["id"]
+
+    response = client.post("/data/batch", json={"items": [generate_random_sensor_data(server_ulid)]}, headers=headers)
+    assert response.status_code == 202
+    assert response.json()["accepted"] == 1
+    assert response.json()["results"][0]["status"] == "accepted"
+
+    stats = client.get("/data/ingest/stats").json()
+    assert stats["mode"] == "buffered"
+    assert stats["buffered"] >= 2
+
+    # Ainda não gravadas no banco; o consumidor grava o lote e confirma as entradas
+    db: Session = next(get_db())
+    assert db.query(SensorData).filter(SensorData.id == reading_id).first() is None
+    client.portal.call(ingest_buffer.flush_once)
+    assert db.query(SensorData).filter(SensorData.server_ulid == server_ulid).count() == 2
+    db.close()
+
+# Teste do buffer de escrita com um servidor removido depois do enfileiramento (ainda presente no registro)
+def test_flush_buffer_with_deleted_server(client, login_user, create_server, monkeypatch):
+    token, _ = login_user
+    server_ulid = create_server["ulid"]
+    headers = {"Authorization": f"Bearer {token}"}
+    monkeypatch.setattr(ingest_buffer, "INGEST_MODE", "buffered")
+
+    response = client.post("/data", json=generate_random_sensor_data(server_ulid), headers=headers)
+    assert response.status_code == 202
+
+    db: Session = next(get_db())
+    db.query(Server).filter(Server.ulid == server_ulid).delete()
+    db.commit()
+
+    # A violação da FK não trava o consumidor: a leitura do servidor removido é descartada e confirmada
+    client.portal.call(ingest_buffer.flush_once)
+    assert db.query(SensorData).filter(SensorData.server_ulid == server_ulid).count() == 0
+    assert client.get("/data/ingest/stats").json()["buffered"] == 0
+    db.close()
+
 # Teste para verificar a resposta quando não há dados de sensores
 def test_get_no_sensor_data(client, login_user):
     token, _ = login_user
@@ -35,7 +35,9 @@ def generate_random_sensor_data(server_ulid):
 # Fixture para o TestClient - Escopo de módulo (será executada uma vez por módulo de teste)
 @pytest.fixture(scope="module")
 def client():
-    return TestClient(app)
+    # O context manager executa o lifespan e mantém um único event loop para o pool assíncrono
+    with TestClient(app) as test_client:
+        yield test_client
 
 # Fixture para criar e autenticar o usuário - Escopo de função
 @pytest.fixture(scope="function")
@@ -124,6 +126,22 @@ def test_get_no_sensor_data(client, login_user):
     assert response.json()["detail"] == "No sensor data found"
 
 
+# Teste para verificar que o logout revoga o token
+def test_logout_revokes_token(client, login_user):
+    token, _ = login_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/health/all", headers=headers)
+    assert response.status_code == 200
+
+    response = client.post("/auth/logout", headers=headers)
+    assert response.status_code == 204
+
+    # O token revogado deixa de ser aceito, mesmo com o principal já em cache
+    response = client.get("/health/all", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token revoked"
+
 # Cleanup: Apagar os dados criados após os testes
 @pytest.fixture(scope="function", autouse=True)
 def cleanup_data(client, login_user, create_server, create_sensor_data):